@@ -1,22 +1,76 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from .config import Config
+from .services.compaction import Compactor
+from .services.export_cache import ExportCache
+from .services.export_jobs import ExportJobRunner
+from .services.http_client import HTTPClient
+from .services.metrics import Metrics
+from .services.prefetch import Prefetcher
+from .services.profiler import RequestProfiler
+from .services.render_pool import RenderPool
+from .services.response_cache import ResponseCache
+from .sqlite_tuning import apply_pragmas, configure_engines
 
 db = SQLAlchemy()
+http_client = HTTPClient()
+response_cache = ResponseCache()
+export_cache = ExportCache()
+render_pool = RenderPool()
+export_jobs = ExportJobRunner()
+compactor = Compactor()
+prefetcher = Prefetcher()
+metrics = Metrics()
+profiler = RequestProfiler()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
     # Initialize extensions
+    configure_engines(app.config)
     db.init_app(app)
+    with app.app_context():
+        apply_pragmas(db.engines[None], app.config['SQLITE_PRAGMAS'])
+        if 'readonly' in db.engines:
+            apply_pragmas(db.engines['readonly'], app.config['SQLITE_PRAGMAS'], read_only=True)
+    metrics.init_app(app)
+    profiler.init_app(app)
+    http_client.init_app(app)
+    response_cache.init_app(app)
+    export_cache.init_app(app)
+    if app.config['PRELOAD_EXPORT_LIBS']:
+        # Before the fork below, so the render workers share the loaded modules
+        from app.warmup import preload
+        preload()
+    # Forks the PDF render workers, so it runs before any database connection is opened
+    render_pool.init_app(app)
+    export_jobs.init_app(app)
+    compactor.init_app(app)
+    prefetcher.init_app(app)
+    
+    # App-scoped upstream client shared by all requests
+    from app.services.weather_service import WeatherService
+    app.extensions['weather_service'] = WeatherService(
+        http_client=http_client,
+        base_url=app.config['WEATHER_API_BASE_URL'],
+        cache=response_cache,
+        metrics=metrics,
+        provisional_hours=app.config['INGEST_PROVISIONAL_HOURS']
+    )
     
     # Register blueprints
     from app.routes import main_bp
     app.register_blueprint(main_bp)
     
-    # Create database tables
+    # Migrate existing databases, then create missing tables
     with app.app_context():
-        db.create_all()
+        from app.migrations import upgrade
+        upgrade(db.engine, app.config['COORDINATE_GRID'])
+        db.create_all(bind_key=None)
+        # Resume export jobs interrupted by the last shutdown
+        export_jobs.start()
+    compactor.start()
+    prefetcher.start()
     
     return app
\ No newline at end of file
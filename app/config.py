@@ -6,3 +6,132 @@ DB_PATH = os.path.join(BASE_DIR, "instance", "weather.db")
 class Config:
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{DB_PATH}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Upstream Open-Meteo API
+    WEATHER_API_BASE_URL = os.environ.get("WEATHER_API_BASE_URL", "https://api.open-meteo.com/v1/forecast")
+
+    # Shared HTTP client (connection pool, retries, timeouts in seconds)
+    HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 10))
+    HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 10))
+    HTTP_POOL_BLOCK = False
+    HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 3))
+    HTTP_BACKOFF_FACTOR = float(os.environ.get("HTTP_BACKOFF_FACTOR", 0.5))
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05))
+    HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 30))
+
+    # Upstream response cache, one entry per local day; finished days are immutable and cached for long
+    COORDINATE_GRID = float(os.environ.get("COORDINATE_GRID", 0.01))
+    RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    RESPONSE_CACHE_DIR = (
+        os.path.join(BASE_DIR, "instance", "cache", "openmeteo")
+        if os.environ.get("RESPONSE_CACHE_DISK", "0") == "1" else None
+    )
+    RESPONSE_CACHE_PAST_TTL = int(os.environ.get("RESPONSE_CACHE_PAST_TTL", 30 * 24 * 3600))
+    RESPONSE_CACHE_CURRENT_TTL = int(os.environ.get("RESPONSE_CACHE_CURRENT_TTL", 600))
+
+    # Bulk ingest (POST /weather-report/batch)
+    BATCH_MAX_LOCATIONS = int(os.environ.get("BATCH_MAX_LOCATIONS", 5000))
+    BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", 50))
+    BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", 4))
+
+    # Incremental ingest: fetch only hours not yet stored as final; the last
+    # INGEST_PROVISIONAL_HOURS before now stay provisional and are fetched again
+    INGEST_INCREMENTAL = os.environ.get("INGEST_INCREMENTAL", "1") == "1"
+    INGEST_PROVISIONAL_HOURS = int(os.environ.get("INGEST_PROVISIONAL_HOURS", 6))
+
+    # Background refresh of watched locations (/watched); /weather-report serves
+    # a watched location from the store while its last refresh is under PREFETCH_MAX_AGE
+    PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "1") == "1"
+    PREFETCH_INTERVAL = int(os.environ.get("PREFETCH_INTERVAL", 600))
+    PREFETCH_MAX_AGE = int(os.environ.get("PREFETCH_MAX_AGE", 900))
+    PREFETCH_JITTER = float(os.environ.get("PREFETCH_JITTER", 0.1))
+    PREFETCH_MAX_CONCURRENCY = int(os.environ.get("PREFETCH_MAX_CONCURRENCY", 4))
+    PREFETCH_RATE_PER_MINUTE = float(os.environ.get("PREFETCH_RATE_PER_MINUTE", 60))
+    PREFETCH_RATE_BURST = int(os.environ.get("PREFETCH_RATE_BURST", 5))
+    PREFETCH_CHUNK_SIZE = int(os.environ.get("PREFETCH_CHUNK_SIZE", 50))
+    PREFETCH_POLL = float(os.environ.get("PREFETCH_POLL", 5))
+    PREFETCH_RETRY = int(os.environ.get("PREFETCH_RETRY", 60))
+    PREFETCH_MAX_WATCHED = int(os.environ.get("PREFETCH_MAX_WATCHED", 1000))
+
+    # SQLite engine profile, applied to every new connection
+    SQLITE_PRAGMAS = {
+        "auto_vacuum": os.environ.get("SQLITE_AUTO_VACUUM", "INCREMENTAL"),
+        "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+        "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -64000)),
+        "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "temp_store": os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+    }
+    
+    # Connection pools; exports read through a separate read-only engine
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+    SQLITE_READONLY_EXPORTS = os.environ.get("SQLITE_READONLY_EXPORTS", "1") == "1"
+    DB_READONLY_POOL_SIZE = int(os.environ.get("DB_READONLY_POOL_SIZE", 5))
+    DB_READONLY_MAX_OVERFLOW = int(os.environ.get("DB_READONLY_MAX_OVERFLOW", 10))
+
+    # Exports: rows fetched per cursor batch and response chunk size in bytes
+    EXPORT_YIELD_PER = int(os.environ.get("EXPORT_YIELD_PER", 1000))
+    EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 64 * 1024))
+
+    # Generated Excel/PDF exports, keyed on parameters and data version
+    EXPORT_CACHE_ENABLED = os.environ.get("EXPORT_CACHE_ENABLED", "1") == "1"
+    EXPORT_CACHE_MAX_ENTRIES = int(os.environ.get("EXPORT_CACHE_MAX_ENTRIES", 256))
+    EXPORT_CACHE_MAX_BYTES = int(os.environ.get("EXPORT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    EXPORT_CACHE_MAX_ARTIFACT_BYTES = int(os.environ.get("EXPORT_CACHE_MAX_ARTIFACT_BYTES", 16 * 1024 * 1024))
+
+    # PDF rendering process pool; 0 workers renders on the request thread
+    RENDER_POOL_WORKERS = int(os.environ.get("RENDER_POOL_WORKERS", 2))
+    RENDER_QUEUE_DEPTH = int(os.environ.get("RENDER_QUEUE_DEPTH", 8))
+    RENDER_JOB_TIMEOUT = float(os.environ.get("RENDER_JOB_TIMEOUT", 60))
+    # Import the export libraries at startup, before the render pool (and, via gunicorn.conf.py,
+    # the gunicorn workers) fork, so forked processes share them instead of importing their own
+    PRELOAD_EXPORT_LIBS = os.environ.get("PRELOAD_EXPORT_LIBS", "1") == "1"
+
+    # Points per PDF chart series after LTTB downsampling; 0 plots every row
+    CHART_MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", 500))
+
+    # Retention: raw hourly rows are kept RETENTION_RAW_DAYS, then folded into
+    # COMPACTION_BUCKET_HOURS aggregates kept RETENTION_COMPACTED_DAYS; daily
+    # rollups are kept RETENTION_ROLLUP_DAYS. 0 keeps a tier forever
+    RETENTION_RAW_DAYS = int(os.environ.get("RETENTION_RAW_DAYS", 90))
+    RETENTION_COMPACTED_DAYS = int(os.environ.get("RETENTION_COMPACTED_DAYS", 730))
+    RETENTION_ROLLUP_DAYS = int(os.environ.get("RETENTION_ROLLUP_DAYS", 0))
+    COMPACTION_BUCKET_HOURS = int(os.environ.get("COMPACTION_BUCKET_HOURS", 6))
+    COMPACTION_INTERVAL = int(os.environ.get("COMPACTION_INTERVAL", 6 * 3600))
+    COMPACTION_BATCH_ROWS = int(os.environ.get("COMPACTION_BATCH_ROWS", 5000))
+    COMPACTION_PAUSE = float(os.environ.get("COMPACTION_PAUSE", 0.05))
+    COMPACTION_VACUUM_PAGES = int(os.environ.get("COMPACTION_VACUUM_PAGES", 1000))
+    # One-off full VACUUM, needed to switch databases created before auto_vacuum to incremental
+    COMPACTION_FULL_VACUUM = os.environ.get("COMPACTION_FULL_VACUUM", "0") == "1"
+
+    # Background export jobs (POST /exports); files are kept for EXPORT_JOB_RETENTION seconds
+    EXPORT_JOBS_DIR = os.environ.get("EXPORT_JOBS_DIR", os.path.join(BASE_DIR, "instance", "exports"))
+    EXPORT_JOB_WORKERS = int(os.environ.get("EXPORT_JOB_WORKERS", 2))
+    EXPORT_JOB_RETENTION = int(os.environ.get("EXPORT_JOB_RETENTION", 24 * 3600))
+    EXPORT_JOB_SWEEP_INTERVAL = int(os.environ.get("EXPORT_JOB_SWEEP_INTERVAL", 3600))
+
+    # GET /metrics: request latency per route and per-stage timings, in seconds
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+    METRICS_BUCKETS = tuple(
+        float(bound) for bound in os.environ.get(
+            "METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30"
+        ).split(",")
+    )
+
+    # Opt-in request profiling: a PROFILING_SAMPLE_RATE fraction of requests under
+    # PROFILING_PATHS, plus with PROFILING_SLOW_CAPTURE (sample mode, samples every
+    # matching request) any slower than PROFILING_SLOW_THRESHOLD seconds
+    PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+    PROFILING_MODE = os.environ.get("PROFILING_MODE", "sample")
+    PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0.01))
+    PROFILING_SLOW_CAPTURE = os.environ.get("PROFILING_SLOW_CAPTURE", "0") == "1"
+    PROFILING_SLOW_THRESHOLD = float(os.environ.get("PROFILING_SLOW_THRESHOLD", 2.0))
+    PROFILING_INTERVAL = float(os.environ.get("PROFILING_INTERVAL", 0.005))
+    PROFILING_PATHS = tuple(os.environ.get("PROFILING_PATHS", "/export/excel,/export/pdf").split(","))
+    PROFILING_DIR = os.environ.get("PROFILING_DIR", os.path.join(BASE_DIR, "instance", "profiles"))
+    PROFILING_MAX_FILES = int(os.environ.get("PROFILING_MAX_FILES", 200))
@@ -0,0 +1,147 @@
+"""Schema migrations for existing instance/weather.db files.
+
+Run automatically by ``create_app`` before ``db.create_all``; can also be
+run by hand against a database file::
+
+    python -m app.migrations instance/weather.db
+"""
+import logging
+import sys
+
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import Session
+
+from app.services.geo import snap_coordinates
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade_to_locations(engine, grid):
+    """Move per-row latitude/longitude into the locations dimension table.
+
+    Legacy ``weather_data`` rows are re-keyed on the grid-snapped location
+    id; when snapping merges two raw coordinates into one cell, the most
+    recently inserted row wins for each hour. ``created_at`` collapses into
+    the location's ``created_at``/``updated_at``. Returns True if the
+    database was migrated.
+    """
+    from app.models import Location, WeatherData
+
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+    resuming = 'weather_data_legacy' in tables
+    if not resuming:
+        if 'weather_data' not in tables:
+            return False
+        columns = {column['name'] for column in inspector.get_columns('weather_data')}
+        if 'location_id' in columns:
+            return False
+        legacy_indexes = [index['name'] for index in inspector.get_indexes('weather_data')]
+
+    # pysqlite runs DDL outside the transaction, so an interrupted run is
+    # resumed from weather_data_legacy rather than rolled back
+    with engine.begin() as conn:
+        if resuming:
+            WeatherData.__table__.drop(conn, checkfirst=True)
+        else:
+            # Indexes keep their names across a rename, so drop them before recreating the table
+            for name in legacy_indexes:
+                conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+            conn.exec_driver_sql('ALTER TABLE weather_data RENAME TO weather_data_legacy')
+        Location.__table__.create(conn, checkfirst=True)
+        WeatherData.__table__.create(conn)
+
+        # Snap in Python so legacy coordinates land in the same cells as new ingests
+        conn.exec_driver_sql(
+            'CREATE TEMP TABLE IF NOT EXISTS location_map (latitude FLOAT, longitude FLOAT, '
+            'snapped_latitude FLOAT, snapped_longitude FLOAT)'
+        )
+        legacy_coordinates = conn.exec_driver_sql(
+            'SELECT DISTINCT latitude, longitude FROM weather_data_legacy'
+        ).all()
+        if legacy_coordinates:
+            conn.exec_driver_sql(
+                'INSERT INTO location_map VALUES (?, ?, ?, ?)',
+                [(lat, lon) + snap_coordinates(lat, lon, grid) for lat, lon in legacy_coordinates]
+            )
+
+        conn.exec_driver_sql(
+            'INSERT INTO locations (latitude, longitude, created_at, updated_at) '
+            'SELECT m.snapped_latitude, m.snapped_longitude, MIN(l.created_at), MAX(l.created_at) '
+            'FROM weather_data_legacy l JOIN location_map m '
+            'ON l.latitude = m.latitude AND l.longitude = m.longitude '
+            'WHERE true GROUP BY m.snapped_latitude, m.snapped_longitude '
+            'ON CONFLICT (latitude, longitude) DO NOTHING'
+        )
+        result = conn.exec_driver_sql(
+            'INSERT INTO weather_data (location_id, timestamp, temperature, humidity, is_forecast) '
+            'SELECT loc.id, l.timestamp, l.temperature, l.humidity, l.is_forecast '
+            'FROM weather_data_legacy l '
+            'JOIN location_map m ON l.latitude = m.latitude AND l.longitude = m.longitude '
+            'JOIN locations loc ON loc.latitude = m.snapped_latitude AND loc.longitude = m.snapped_longitude '
+            'WHERE true ORDER BY l.id '
+            'ON CONFLICT (location_id, timestamp) DO UPDATE SET '
+            'temperature = excluded.temperature, humidity = excluded.humidity, is_forecast = excluded.is_forecast'
+        )
+        conn.exec_driver_sql('DROP TABLE location_map')
+        conn.exec_driver_sql('DROP TABLE weather_data_legacy')
+
+    logger.info(f"Migrated weather_data to location ids ({result.rowcount} rows, {len(legacy_coordinates)} legacy coordinates)")
+    return True
+
+
+def create_daily_rollups(engine):
+    """Create weather_daily_rollups and fill it from existing weather_data rows.
+
+    An empty rollup table next to a non-empty weather_data (e.g. a run
+    interrupted after the CREATE) is filled as well. Returns True if
+    rollups were built.
+    """
+    from app.models import WeatherDailyRollup, WeatherData
+    from app.services.rollups import rebuild_daily_rollups
+
+    tables = inspect(engine).get_table_names()
+    if 'weather_data' not in tables:
+        return False
+
+    with Session(engine) as session:
+        if WeatherDailyRollup.__tablename__ not in tables:
+            WeatherDailyRollup.__table__.create(session.connection())
+        elif session.scalar(select(WeatherDailyRollup.day).limit(1)) is not None:
+            return False
+        if session.scalar(select(WeatherData.id).limit(1)) is None:
+            session.commit()
+            return False
+        written = rebuild_daily_rollups(session)
+        session.commit()
+    logger.info(f"Built weather_daily_rollups ({written} location-days)")
+    return True
+
+
+def add_location_utc_offset(engine):
+    """Add locations.utc_offset_seconds; filled in by the next ingest of each location"""
+    tables = inspect(engine).get_table_names()
+    if 'locations' not in tables:
+        return False
+    columns = {column['name'] for column in inspect(engine).get_columns('locations')}
+    if 'utc_offset_seconds' in columns:
+        return False
+    with engine.begin() as conn:
+        conn.exec_driver_sql('ALTER TABLE locations ADD COLUMN utc_offset_seconds INTEGER')
+    logger.info("Added locations.utc_offset_seconds")
+    return True
+
+
+def upgrade(engine, grid):
+    """Apply all pending migrations"""
+    upgrade_to_locations(engine, grid)
+    create_daily_rollups(engine)
+    add_location_utc_offset(engine)
+
+
+if __name__ == '__main__':
+    from app.config import Config, DB_PATH
+
+    logging.basicConfig(level=logging.INFO)
+    path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    upgrade(create_engine(f"sqlite:///{path}"), Config.COORDINATE_GRID)
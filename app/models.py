@@ -1,26 +1,192 @@
+import json
 from app import db
 from datetime import datetime
 
+class Location(db.Model):
+    __tablename__ = 'locations'
+    __table_args__ = (
+        db.Index('uq_locations_coordinates', 'latitude', 'longitude', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Canonical coordinates, snapped to Config.COORDINATE_GRID
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    # Upstream's offset of the location's local time, which stored timestamps use; set on ingest
+    utc_offset_seconds = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'utc_offset_seconds': self.utc_offset_seconds,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+
 class WeatherData(db.Model):
     __tablename__ = 'weather_data'
+    __table_args__ = (
+        # Upsert key: one row per location and hour
+        db.Index('uq_weather_data_location_time', 'location_id', 'timestamp', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, index=True)
-    temperature = db.Column(db.Float, nullable=True)  
+    temperature = db.Column(db.Float, nullable=True)
     humidity = db.Column(db.Float, nullable=True)
-    latitude = db.Column(db.Float, nullable=False)
-    longitude = db.Column(db.Float, nullable=False)
+    # True while the hour may still change upstream (forecast or recent past); re-fetched until final
     is_forecast = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    location = db.relationship(Location)
+    
+    # Columns that make up the upsert key and the values an upsert may change
+    UPSERT_KEY = ('location_id', 'timestamp')
+    UPSERT_VALUES = ('temperature', 'humidity', 'is_forecast')
+    
+    @property
+    def latitude(self):
+        return self.location.latitude
+    
+    @property
+    def longitude(self):
+        return self.location.longitude
     
     def to_dict(self):
         return {
             'id': self.id,
+            'location_id': self.location_id,
             'timestamp': self.timestamp.isoformat(),
             'temperature': self.temperature,
             'humidity': self.humidity,
             'latitude': self.latitude,
             'longitude': self.longitude,
-            'is_forecast': self.is_forecast,
-            'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+            'is_forecast': self.is_forecast
+        }
+
+
+class WeatherDailyRollup(db.Model):
+    """Per-location, per-day aggregates of weather_data, refreshed by ingest"""
+    __tablename__ = 'weather_daily_rollups'
+    __table_args__ = (
+        # Unscoped summaries scan a day range across all locations
+        db.Index('ix_weather_daily_rollups_day', 'day'),
+    )
+    
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), primary_key=True)
+    # Calendar day of the stored (location-local) timestamps
+    day = db.Column(db.Date, primary_key=True)
+    records = db.Column(db.Integer, nullable=False)
+    temperature_count = db.Column(db.Integer, nullable=False)
+    temperature_sum = db.Column(db.Float, nullable=True)
+    temperature_min = db.Column(db.Float, nullable=True)
+    temperature_max = db.Column(db.Float, nullable=True)
+    humidity_count = db.Column(db.Integer, nullable=False)
+    humidity_sum = db.Column(db.Float, nullable=True)
+    humidity_min = db.Column(db.Float, nullable=True)
+    humidity_max = db.Column(db.Float, nullable=True)
+    
+    # Aggregate columns in the order rollups.aggregate_columns() produces them
+    AGGREGATES = (
+        'records',
+        'temperature_count', 'temperature_sum', 'temperature_min', 'temperature_max',
+        'humidity_count', 'humidity_sum', 'humidity_min', 'humidity_max',
+    )
+
+
+class WeatherDataCompacted(db.Model):
+    """Aggregates of hourly rows older than the raw retention period, one row per bucket"""
+    __tablename__ = 'weather_data_compacted'
+    __table_args__ = (
+        db.Index('ix_weather_data_compacted_bucket_start', 'bucket_start'),
+    )
+    
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    bucket_hours = db.Column(db.Integer, nullable=False)
+    records = db.Column(db.Integer, nullable=False)
+    temperature_count = db.Column(db.Integer, nullable=False)
+    temperature_sum = db.Column(db.Float, nullable=True)
+    temperature_min = db.Column(db.Float, nullable=True)
+    temperature_max = db.Column(db.Float, nullable=True)
+    humidity_count = db.Column(db.Integer, nullable=False)
+    humidity_sum = db.Column(db.Float, nullable=True)
+    humidity_min = db.Column(db.Float, nullable=True)
+    humidity_max = db.Column(db.Float, nullable=True)
+
+
+class ExportJob(db.Model):
+    """A background export (POST /exports) and the file it produced"""
+    __tablename__ = 'export_jobs'
+    __table_args__ = (
+        db.Index('ix_export_jobs_status_created', 'status', 'created_at'),
+    )
+    
+    STATUSES = ('queued', 'running', 'succeeded', 'failed')
+    
+    id = db.Column(db.String(32), primary_key=True)
+    format = db.Column(db.String(16), nullable=False)
+    # JSON-encoded export filters: hours, lat, lon, location_id
+    params = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    rows_total = db.Column(db.Integer, nullable=True)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    file_path = db.Column(db.String(512), nullable=True)
+    size = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'format': self.format,
+            'params': json.loads(self.params),
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'rows_total': self.rows_total,
+            'rows_done': self.rows_done,
+            'size': self.size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class WatchedLocation(db.Model):
+    """A location the prefetcher refreshes ahead of requests (see services.prefetch)"""
+    __tablename__ = 'watched_locations'
+    __table_args__ = (
+        # The dispatcher polls for the next due refreshes
+        db.Index('ix_watched_locations_next_refresh_at', 'next_refresh_at'),
+    )
+    
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_refresh_at = db.Column(db.DateTime, nullable=False)
+    last_refreshed_at = db.Column(db.DateTime, nullable=True)
+    last_duration_ms = db.Column(db.Float, nullable=True)
+    # Consecutive failed refreshes; drives the retry backoff
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    
+    location = db.relationship(Location)
+    
+    def to_dict(self):
+        return {
+            'location': self.location.to_dict(),
+            'created_at': self.created_at.isoformat(),
+            'next_refresh_at': self.next_refresh_at.isoformat(),
+            'last_refreshed_at': self.last_refreshed_at.isoformat() if self.last_refreshed_at else None,
+            'last_duration_ms': self.last_duration_ms,
+            'failures': self.failures,
+            'last_error': self.last_error
+        }
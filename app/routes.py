@@ -1,11 +1,132 @@
-from flask import Blueprint, request, jsonify, send_file
-from app import db
-from app.models import WeatherData
-from app.services.weather_service import WeatherService
-from app.services.excel_service import ExcelService
-from app.services.pdf_service import PDFService
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Blueprint, Response, current_app, g, request, jsonify, send_file, stream_with_context, url_for
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app import (
+    compactor, db, export_cache, export_jobs, http_client, metrics, prefetcher, profiler, render_pool, response_cache
+)
+from app.models import ExportJob, WatchedLocation, WeatherData
+from app.services.weather_service import get_weather_service
+from app.services.report_columns import ReportColumns
+from app.services.rollups import WindowStats, daily_stats, summarize_window
+from app.services.render_pool import RenderQueueFull, RenderTimeout
+from app.services.geo import snap_coordinates
+from app.services.singleflight import SingleFlight
+from app.services.storage import (
+    build_export_query, build_flat_export_query, export_data_version, export_generated_at, export_window_start,
+    find_locations, ingest_window, location_local_now, resolve_export_location
+)
+from app.services.ingest import plan_windows, store_batch_chunk, store_location_rows
+from app.services import stream_export
+from app.services.export_jobs import DOCUMENT_FORMATS, JOB_FORMATS, job_file_info
 
 main_bp = Blueprint('main', __name__)
+ingest_flight = SingleFlight()
+
+
+@main_bp.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    # None unless PROFILING_ENABLED and the path is profiled
+    g.request_profile = profiler.begin(request.path)
+
+
+@main_bp.after_request
+def _record_request_duration(response):
+    """Observe the request's latency under its route pattern; streamed bodies are timed to the first byte"""
+    started = g.get('request_started')
+    if started is not None and request.url_rule is not None:
+        metrics.observe_request(request.method, request.url_rule.rule, response.status_code, time.perf_counter() - started)
+    return response
+
+
+@main_bp.teardown_request
+def _finish_request_profile(exc):
+    # At teardown rather than after_request so failed requests still release the sampler
+    request_profile = g.pop('request_profile', None)
+    if request_profile is not None:
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        profiler.finish(request_profile, route, time.perf_counter() - g.request_started)
+
+
+def _prefetched_report(lat, lon):
+    """Response from the store for a watched location the prefetcher refreshed recently, else None"""
+    location = find_locations(db.session, [(lat, lon)], current_app.config['COORDINATE_GRID'])[0]
+    if location is None or not prefetcher.is_fresh(db.session, location.id):
+        return None
+    first, last = ingest_window(location_local_now(location))
+    records, start, end = db.session.execute(
+        select(func.count(), func.min(WeatherData.timestamp), func.max(WeatherData.timestamp)).where(
+            WeatherData.location_id == location.id,
+            WeatherData.timestamp.between(first, last)
+        )
+    ).one()
+    db.session.rollback()
+    if not records:
+        return None
+    return {
+        'message': 'Weather data served from prefetched store',
+        'records_processed': records,
+        'records_written': 0,
+        'latitude': lat,
+        'longitude': lon,
+        'data_type': 'historical_past_2_days',
+        'time_range': f"{start.strftime('%Y-%m-%d %H:%M')} to {end.strftime('%Y-%m-%d %H:%M')}"
+    }
+
+
+def _ingest_location(lat, lon):
+    """Fetch, process and store the past 2 days for one location
+    
+    Watched locations refreshed by the prefetcher are answered from the
+    store. With INGEST_INCREMENTAL only the hours not yet stored as final
+    are requested from upstream.
+    """
+    report = _prefetched_report(lat, lon)
+    if report is not None:
+        return report
+    
+    weather_service = get_weather_service()
+    window = None
+    if current_app.config['INGEST_INCREMENTAL']:
+        window = plan_windows([(lat, lon)])[0]
+        if window is None:
+            return {
+                'message': 'Weather data already up to date',
+                'records_processed': 0,
+                'records_written': 0,
+                'latitude': lat,
+                'longitude': lon,
+                'data_type': 'historical_past_2_days',
+                'time_range': None
+            }
+    
+    # Fetch and process data
+    raw_data = weather_service.fetch_weather_data(lat, lon, window)
+    batch = weather_service.process_weather_columns(raw_data, lat, lon)
+    
+    if not len(batch):
+        return None
+    
+    records_written = store_location_rows(lat, lon, batch)
+    db.session.commit()
+    metrics.count_rows_ingested(records_written)
+    
+    return {
+        'message': 'Weather data fetched and stored successfully',
+        'records_processed': len(batch),
+        'records_written': records_written,
+        'latitude': lat,
+        'longitude': lon,
+        'data_type': 'historical_past_2_days',
+        'time_range': f"{batch.timestamps[0].strftime('%Y-%m-%d %H:%M')} to {batch.timestamps[-1].strftime('%Y-%m-%d %H:%M')}"
+    }
+
 
 @main_bp.route('/weather-report', methods=['GET'])
 def weather_report():
@@ -20,72 +141,314 @@ def weather_report():
         if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
             return jsonify({'error': 'Invalid coordinates. Latitude must be between -90 and 90, longitude between -180 and 180'}), 400
         
-        # Fetch and process data
-        weather_service = WeatherService()
-        raw_data = weather_service.fetch_weather_data(lat, lon)
-        processed_data = weather_service.process_weather_data(raw_data, lat, lon)
+        # Concurrent requests for the same grid cell share one fetch and one write
+        location_key = snap_coordinates(lat, lon, current_app.config['COORDINATE_GRID'])
+        result = ingest_flight.do(('weather-report',) + location_key, _ingest_location, lat, lon)
         
-        if not processed_data:
+        if result is None:
             return jsonify({'error': 'No weather data available for the specified location and time period'}), 404
         
-        # Remove existing data for this location to avoid duplicates
-        db.session.query(WeatherData).filter(
-            WeatherData.latitude == lat,
-            WeatherData.longitude == lon
-        ).delete()
-        
-        # Store in database
-        records_added = 0
-        for data in processed_data:
-            weather_record = WeatherData(
-                timestamp=data['timestamp'],
-                temperature=data['temperature'],
-                humidity=data['humidity'],
-                latitude=data['latitude'],
-                longitude=data['longitude'],
-                is_forecast=data.get('is_forecast', False)
-            )
-            db.session.add(weather_record)
-            records_added += 1
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Weather data fetched and stored successfully',
-            'records_processed': records_added,
-            'latitude': lat,
-            'longitude': lon,
-            'data_type': 'historical_past_2_days',
-            'time_range': f"{processed_data[0]['timestamp'].strftime('%Y-%m-%d %H:%M')} to {processed_data[-1]['timestamp'].strftime('%Y-%m-%d %H:%M')}"
-        })
+        # The shared result carries the coordinates of whichever request ran the ingest
+        return jsonify(dict(result, latitude=lat, longitude=lon))
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
     
 
+def _parse_batch_locations():
+    """Read the batch body as a JSON list or NDJSON, one location per item"""
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        items = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+    else:
+        body = request.get_json(silent=True)
+        items = body.get('locations') if isinstance(body, dict) else body
+    
+    if not isinstance(items, list):
+        raise ValueError('Request body must be a JSON list of locations, an object with "locations", or NDJSON')
+    
+    locations = []
+    for item in items:
+        try:
+            if isinstance(item, dict):
+                lat, lon = float(item['lat']), float(item['lon'])
+            else:
+                lat, lon = float(item[0]), float(item[1])
+        except (KeyError, IndexError, TypeError, ValueError):
+            lat, lon = None, None
+        locations.append((lat, lon))
+    return locations
+
+
+@main_bp.route('/weather-report/batch', methods=['POST'])
+def weather_report_batch():
+    try:
+        locations = _parse_batch_locations()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not locations:
+        return jsonify({'error': 'No locations provided'}), 400
+    
+    max_locations = current_app.config['BATCH_MAX_LOCATIONS']
+    if len(locations) > max_locations:
+        return jsonify({'error': f'Too many locations: {len(locations)} (maximum {max_locations})'}), 400
+    
+    # Validate and de-duplicate coordinates
+    results = {}
+    unique = []
+    for lat, lon in locations:
+        if lat is None or not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+            continue
+        if (lat, lon) not in results:
+            results[(lat, lon)] = None
+            unique.append((lat, lon))
+    
+    # Skip locations whose stored hours are all final; fetch only the gaps of the rest
+    windows = {}
+    if current_app.config['INGEST_INCREMENTAL'] and unique:
+        pending = []
+        for location, window in zip(unique, plan_windows(unique)):
+            if window is None:
+                results[location] = {'status': 'up_to_date', 'records_processed': 0, 'records_written': 0}
+            else:
+                windows[location] = window
+                pending.append(location)
+        unique = pending
+    
+    # Group into multi-location upstream requests and fetch them concurrently
+    chunk_size = current_app.config['BATCH_CHUNK_SIZE']
+    chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+    weather_service = get_weather_service()
+    
+    if chunks:
+        max_workers = min(current_app.config['BATCH_MAX_WORKERS'], len(chunks))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    weather_service.fetch_weather_data_batch, chunk, [windows.get(location) for location in chunk]
+                ): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    payloads = future.result()
+                except Exception as e:
+                    results.update({location: {'status': 'error', 'error': str(e)} for location in chunk})
+                    continue
+                results.update(store_batch_chunk(chunk, payloads, weather_service))
+    
+    # Report per-location status in request order
+    statuses = []
+    for lat, lon in locations:
+        entry = {'latitude': lat, 'longitude': lon}
+        if (lat, lon) in results:
+            entry.update(results[(lat, lon)])
+        else:
+            entry.update({'status': 'invalid', 'error': 'Invalid coordinates'})
+        statuses.append(entry)
+    
+    summary = {}
+    for entry in statuses:
+        summary[entry['status']] = summary.get(entry['status'], 0) + 1
+    
+    return jsonify({
+        'message': 'Batch processed',
+        'locations_requested': len(locations),
+        'upstream_requests': len(chunks),
+        'summary': summary,
+        'locations': statuses
+    })
+    
+
+def _parse_export_filters():
+    """Read the shared export filters: hours window and optional lat/lon or location_id"""
+    hours = request.args.get('hours', type=int, default=48)
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    location_id = request.args.get('location_id', type=int)
+    return hours, lat, lon, location_id
+
+
+def _date_arg(name):
+    """Optional YYYY-MM-DD query parameter; raises ValueError naming it when malformed"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a valid date in YYYY-MM-DD format, got {value!r}")
+
+
+def _read_session():
+    """Session on the read-only engine for export queries, closed at request teardown
+    
+    Falls back to the regular session when no read-only engine is configured.
+    """
+    if 'readonly' not in db.engines:
+        return db.session
+    if 'read_session' not in g:
+        g.read_session = Session(db.engines['readonly'])
+    return g.read_session
+
+
+@main_bp.teardown_app_request
+def _close_read_session(exc):
+    read_session = g.pop('read_session', None)
+    if read_session is not None:
+        read_session.close()
+
+
+def _resolve_export_location(session, lat, lon, location_id):
+    """Return (location, found); found is False for a location we have never ingested"""
+    return resolve_export_location(session, lat, lon, location_id, current_app.config['COORDINATE_GRID'])
+
+
+def _query_export_rows(session, hours, location, found, now=None, stream=False):
+    """Return the rows of an export; ``location`` is None for unscoped exports
+    
+    With ``stream=True`` rows is a lazy result fetched ``EXPORT_YIELD_PER``
+    rows at a time instead of a list.
+    """
+    # A location we have never ingested has no rows
+    if not found:
+        return []
+    
+    stmt = build_export_query(WeatherData, hours, location.id if location else None, now)
+    if stream:
+        return session.scalars(stmt.execution_options(yield_per=current_app.config['EXPORT_YIELD_PER']))
+    return session.scalars(stmt).all()
+
+
+def _stream_file(file, mimetype, download_name):
+    """Send a seekable file object in EXPORT_CHUNK_SIZE chunks, closing it afterwards"""
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+    file.seek(0, 2)
+    size = file.tell()
+    file.seek(0)
+    
+    def generate():
+        try:
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            file.close()
+    
+    return Response(generate(), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={download_name}',
+        'Content-Length': str(size),
+    })
+
+
+def _export_location(location):
+    return (location.latitude, location.longitude) if location is not None else None
+
+
+def _export_stats(session, hours, location, found, now):
+    """Summary statistics of an export's rows, from the daily rollups"""
+    if not found:
+        return None
+    with metrics.time_stage('export_stats'):
+        return summarize_window(session, export_window_start(hours, now), location_id=location.id if location else None)
+
+
+def _render_export(kind, session, hours, location, found, now):
+    """Generate an Excel or PDF export and return it as a file object
+    
+    The document states the time its data last changed as its generation
+    time, so renders for one export cache key are byte-identical.
+    """
+    stats = _export_stats(session, hours, location, found, now)
+    generated_at = export_generated_at(session, location) or export_window_start(hours, now)
+    if kind == 'excel':
+        # Stream rows from the database straight into a write-only workbook
+        from app.services.excel_service import ExcelService
+        
+        weather_data = _query_export_rows(session, hours, location, found, now, stream=True)
+        timings = {}
+        file = ExcelService().generate_excel(
+            weather_data, location=_export_location(location), stats=stats, timings=timings, generated_at=generated_at
+        )
+        # Rows are fetched lazily while they are written, so the query is part of excel_rows
+        metrics.observe_stage('excel_rows', timings['rows'])
+        metrics.observe_stage('excel_save', timings['save'])
+        return file
+    # Render in the worker pool from plain columns rather than ORM objects
+    rows = []
+    if found:
+        stmt = build_flat_export_query(WeatherData, hours, location.id if location else None, now)
+        with metrics.time_stage('export_query'):
+            rows = session.execute(stmt).all()
+    columns = ReportColumns.from_rows(rows, location=_export_location(location), stats=stats, generated_at=generated_at)
+    return BytesIO(render_pool.render_pdf(columns))
+
+
+def _export_cache_key(kind, session, hours, lat, lon, location_id, location, found, now):
+    """Export parameters plus the version of the data they cover"""
+    if location is not None:
+        scope = f"location:{location.id}"
+    elif found:
+        scope = 'all'
+    elif location_id is not None:
+        scope = f"missing:{location_id}"
+    else:
+        scope = 'missing:{:.6f},{:.6f}'.format(*snap_coordinates(lat, lon, current_app.config['COORDINATE_GRID']))
+    window = export_window_start(hours, now).isoformat()
+    return f"{kind}|{hours}|{scope}|{window}|{export_data_version(session, location)}"
+
+
+def _cached_export(kind, hours, lat, lon, location_id):
+    """Serve an Excel/PDF export from the export cache, answering If-None-Match with 304"""
+    mimetype, download_name = DOCUMENT_FORMATS[kind]
+    session = _read_session()
+    now = datetime.utcnow()
+    location, found = _resolve_export_location(session, lat, lon, location_id)
+    key = _export_cache_key(kind, session, hours, lat, lon, location_id, location, found, now)
+    
+    # A cached artifact's ETag answers If-None-Match without rendering; after an
+    # eviction the deterministic re-render hashes to the same ETag again
+    file = None
+    artifact = export_cache.get(key)
+    if artifact is None or (artifact.body is None and artifact.etag not in request.if_none_match):
+        file = _render_export(kind, session, hours, location, found, now)
+        artifact = export_cache.store(key, file, mimetype, download_name)
+    
+    if artifact.etag in request.if_none_match:
+        if file is not None:
+            file.close()
+        export_cache.record_not_modified()
+        response = Response(status=304)
+    elif artifact.body is not None:
+        if file is not None:
+            file.close()
+        response = Response(artifact.body, mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename={download_name}',
+        })
+        metrics.count_export_bytes(kind, artifact.size)
+    else:
+        response = _stream_file(file, mimetype, download_name)
+        metrics.count_export_bytes(kind, artifact.size)
+    
+    response.set_etag(artifact.etag)
+    # Always revalidate: the same URL serves new data after the next ingest
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @main_bp.route('/export/excel', methods=['GET'])
 def export_excel():
     try:
-        hours = request.args.get('hours', type=int, default=48)
-        
-        # Get data from database
-        from datetime import datetime, timedelta
-        time_threshold = datetime.utcnow() - timedelta(hours=hours)
-        weather_data = WeatherData.query.filter(
-            WeatherData.timestamp >= time_threshold
-        ).order_by(WeatherData.timestamp).all()
-        
-        # Generate Excel file
-        excel_service = ExcelService()
-        excel_file = excel_service.generate_excel(weather_data)
-        
-        return send_file(
-            excel_file,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name='weather_data.xlsx'
-        )
+        hours, lat, lon, location_id = _parse_export_filters()
+        
+        if (lat is None) != (lon is None):
+            return jsonify({'error': 'Provide both lat and lon to scope the export to one location'}), 400
+        
+        return _cached_export('excel', hours, lat, lon, location_id)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -93,29 +456,291 @@ def export_excel():
 @main_bp.route('/export/pdf', methods=['GET'])
 def export_pdf():
     try:
-        hours = request.args.get('hours', type=int, default=48)
-        
-        # Get data from database
-        from datetime import datetime, timedelta
-        time_threshold = datetime.utcnow() - timedelta(hours=hours)
-        weather_data = WeatherData.query.filter(
-            WeatherData.timestamp >= time_threshold
-        ).order_by(WeatherData.timestamp).all()
-        
-        # Generate PDF using the alternative service
-        pdf_service = PDFService()
-        pdf_file = pdf_service.generate_pdf_report(weather_data)
-        
-        return send_file(
-            pdf_file,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name='weather_report.pdf'
-        )
+        hours, lat, lon, location_id = _parse_export_filters()
+        
+        if (lat is None) != (lon is None):
+            return jsonify({'error': 'Provide both lat and lon to scope the export to one location'}), 400
         
+        return _cached_export('pdf', hours, lat, lon, location_id)
+        
+    except RenderQueueFull as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '5'}
+    except RenderTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _stream_export(format_name):
+    """Stream the export query as CSV, NDJSON or Parquet, one chunk of rows at a time"""
+    hours, lat, lon, location_id = _parse_export_filters()
+    
+    if (lat is None) != (lon is None):
+        return jsonify({'error': 'Provide both lat and lon to scope the export to one location'}), 400
+    
+    write, mimetype, download_name = stream_export.FORMATS[format_name]
+    if format_name == 'parquet' and not stream_export.parquet_available():
+        return jsonify({'error': 'Parquet export requires pyarrow'}), 501
+    
+    session = _read_session()
+    location, found = _resolve_export_location(session, lat, lon, location_id)
+    chunks = []
+    if found:
+        stmt = build_flat_export_query(WeatherData, hours, location.id if location else None)
+        result = session.execute(stmt.execution_options(yield_per=current_app.config['EXPORT_YIELD_PER']))
+        chunks = result.partitions()
+    
+    # stream_with_context keeps the request (and its read session) open until the last chunk
+    return Response(stream_with_context(_count_bytes(format_name, write(chunks))), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={download_name}',
+    })
+
+
+def _count_bytes(format_name, body):
+    """Pass a streamed body through, adding its size to the export byte counter once it is sent"""
+    size = 0
+    try:
+        for chunk in body:
+            size += len(chunk)
+            yield chunk
+    finally:
+        metrics.count_export_bytes(format_name, size)
+
+
+@main_bp.route('/export/csv', methods=['GET'])
+def export_csv():
+    return _stream_export('csv')
+
+
+@main_bp.route('/export/ndjson', methods=['GET'])
+def export_ndjson():
+    return _stream_export('ndjson')
+
+
+@main_bp.route('/export/parquet', methods=['GET'])
+def export_parquet():
+    return _stream_export('parquet')
+
+
+@main_bp.route('/exports', methods=['POST'])
+def submit_export_job():
+    """Queue an export in the background and return its job id right away"""
+    body = request.get_json(silent=True) or {}
+    format_name = body.get('format', request.args.get('format'))
+    if format_name not in JOB_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(JOB_FORMATS)}"}), 400
+    
+    try:
+        params = {
+            'hours': int(body.get('hours', request.args.get('hours', 48))),
+            'lat': _optional_float(body.get('lat', request.args.get('lat'))),
+            'lon': _optional_float(body.get('lon', request.args.get('lon'))),
+            'location_id': _optional_int(body.get('location_id', request.args.get('location_id'))),
+        }
+    except (TypeError, ValueError):
+        return jsonify({'error': 'hours, lat, lon and location_id must be numbers'}), 400
+    if (params['lat'] is None) != (params['lon'] is None):
+        return jsonify({'error': 'Provide both lat and lon to scope the export to one location'}), 400
+    if format_name == 'parquet' and not stream_export.parquet_available():
+        return jsonify({'error': 'Parquet export requires pyarrow'}), 501
+    
+    job = export_jobs.submit(format_name, params)
+    status_url = url_for('main.export_job_status', job_id=job.id)
+    return jsonify(dict(
+        job.to_dict(),
+        status_url=status_url,
+        download_url=url_for('main.export_job_download', job_id=job.id)
+    )), 202, {'Location': status_url}
+
+
+def _optional_float(value):
+    return float(value) if value not in (None, '') else None
+
+
+def _optional_int(value):
+    return int(value) if value not in (None, '') else None
+
+
+@main_bp.route('/exports/<job_id>', methods=['GET'])
+def export_job_status(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown export job'}), 404
+    response = job.to_dict()
+    if job.status == 'succeeded':
+        response['download_url'] = url_for('main.export_job_download', job_id=job.id)
+    return jsonify(response)
+
+
+@main_bp.route('/exports/<job_id>/download', methods=['GET'])
+def export_job_download(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown export job'}), 404
+    if job.status != 'succeeded':
+        return jsonify({'error': f'Export job is {job.status}', 'status': job.status}), 409
+    if not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': 'Export file has expired'}), 410
+    
+    mimetype, download_name = job_file_info(job.format)
+    metrics.count_export_bytes(job.format, os.path.getsize(job.file_path))
+    return send_file(job.file_path, mimetype=mimetype, as_attachment=True, download_name=download_name)
+
+
+@main_bp.route('/stats', methods=['GET'])
+def weather_stats():
+    """Daily and overall temperature/humidity statistics, read from the daily rollups.
+
+    Days are local to each location; without a location the default window ends today in UTC.
+    """
+    try:
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        location_id = request.args.get('location_id', type=int)
+        days = request.args.get('days', type=int, default=7)
+        try:
+            start = _date_arg('start')
+            end = _date_arg('end')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if (lat is None) != (lon is None):
+            return jsonify({'error': 'Provide both lat and lon to scope the stats to one location'}), 400
+        if days < 1:
+            return jsonify({'error': 'days must be at least 1'}), 400
+        
+        session = _read_session()
+        location, found = _resolve_export_location(session, lat, lon, location_id)
+        
+        # start/end (YYYY-MM-DD, inclusive) override the trailing `days` window, which
+        # ends today at the location, or today in UTC when all locations are combined
+        if end is None:
+            end = location_local_now(location).date() if location else datetime.utcnow().date()
+        start = start or end - timedelta(days=days - 1)
+        if start > end:
+            return jsonify({'error': 'start must not be after end'}), 400
+        
+        per_day = daily_stats(session, start, end, location.id if location else None) if found else []
+        
+        summary = WindowStats()
+        for _, stats in per_day:
+            summary.add(stats)
+        
+        return jsonify({
+            'location': location.to_dict() if location else None,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'summary': summary.to_dict(),
+            'days': [dict(stats.to_dict(), date=day.isoformat()) for day, stats in per_day]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @main_bp.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'service': 'weather-service'})
+    return jsonify({
+        'status': 'healthy',
+        'service': 'weather-service',
+        'upstream_pool': http_client.stats(),
+        'upstream_cache': response_cache.stats(),
+        'export_cache': export_cache.stats(),
+        'render_pool': render_pool.stats(),
+        'compaction': compactor.stats(),
+        'prefetch': prefetcher.stats(),
+        'ingest_coalescing': ingest_flight.stats()
+    })
+
+@main_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Request latencies, stage timings and ingest/export counters in the Prometheus text format"""
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@main_bp.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Saved request profiles, newest first, with profiler settings and counters"""
+    if not profiler.enabled:
+        return jsonify({'error': 'Profiling is disabled (set PROFILING_ENABLED=1)'}), 404
+    profiles = profiler.list_profiles()
+    for profile in profiles:
+        profile['download_url'] = url_for('main.download_profile', name=profile['name'])
+    return jsonify({'profiles': profiles, 'profiling': profiler.stats()})
+
+
+@main_bp.route('/admin/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    if not profiler.enabled:
+        return jsonify({'error': 'Profiling is disabled (set PROFILING_ENABLED=1)'}), 404
+    path = profiler.profile_path(name)
+    if path is None:
+        return jsonify({'error': 'Unknown profile'}), 404
+    mimetype = 'text/plain' if name.endswith('.collapsed') else 'application/octet-stream'
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=name)
+
+
+@main_bp.route('/cache', methods=['DELETE'])
+def invalidate_cache():
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    
+    if (lat is None) != (lon is None):
+        return jsonify({'error': 'Provide both lat and lon, or neither to clear the whole cache'}), 400
+    
+    removed = response_cache.invalidate(lat, lon)
+    return jsonify({'message': 'Cache invalidated', 'entries_removed': removed})
+
+
+@main_bp.route('/watched', methods=['GET'])
+def list_watched():
+    """Watched locations with their refresh state, plus prefetch scheduler stats"""
+    entries = db.session.scalars(select(WatchedLocation).order_by(WatchedLocation.next_refresh_at)).all()
+    return jsonify({
+        'locations': [dict(entry.to_dict(), fresh=prefetcher.is_fresh(db.session, entry.location_id)) for entry in entries],
+        'prefetch': prefetcher.stats()
+    })
+
+
+@main_bp.route('/watched', methods=['POST'])
+def watch_locations():
+    """Register locations for background refresh; body as for /weather-report/batch, or lat/lon args"""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is not None and lon is not None:
+        locations = [(lat, lon)]
+    else:
+        try:
+            locations = _parse_batch_locations()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    if not locations:
+        return jsonify({'error': 'No locations provided'}), 400
+    for lat, lon in locations:
+        if lat is None or not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+            return jsonify({'error': f'Invalid coordinates: {lat}, {lon}'}), 400
+    
+    try:
+        entries = prefetcher.watch(locations)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'message': 'Locations watched', 'locations': [entry.to_dict() for entry in entries]}), 201
+
+
+@main_bp.route('/watched', methods=['DELETE'])
+def unwatch_location():
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    location_id = request.args.get('location_id', type=int)
+    
+    if location_id is None:
+        if lat is None or lon is None:
+            return jsonify({'error': 'Provide lat and lon, or location_id'}), 400
+        location = find_locations(db.session, [(lat, lon)], current_app.config['COORDINATE_GRID'])[0]
+        location_id = location.id if location is not None else None
+    
+    if location_id is None or not prefetcher.unwatch(location_id):
+        return jsonify({'error': 'Location is not watched'}), 404
+    return jsonify({'message': 'Location unwatched', 'location_id': location_id})
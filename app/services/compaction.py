@@ -0,0 +1,289 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, cast, delete, func, literal, literal_column, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+logger = logging.getLogger(__name__)
+
+# Ingest re-fetches the last couple of days, so those hours must stay raw:
+# re-ingesting a compacted hour would otherwise be counted twice
+MIN_RAW_DAYS = 3
+
+
+class Compactor:
+    """Background retention for weather_data.
+
+    Hourly rows older than ``raw_days`` are folded into ``bucket_hours``
+    aggregates in weather_data_compacted and deleted. Compacted buckets
+    older than ``compacted_days`` and daily rollups older than
+    ``rollup_days`` are dropped (0 keeps them forever). Work is done in
+    short transactions of about ``batch_rows`` rows with a pause in
+    between, so ingest writers never wait long for the lock. Freed pages
+    are returned to the filesystem with incremental vacuum when the
+    database uses ``auto_vacuum=INCREMENTAL``; a one-off full ``VACUUM``
+    (which converts older files) only runs when ``full_vacuum`` is set.
+    """
+
+    def __init__(self, app=None, **options):
+        self.options = {
+            'raw_days': 90,
+            'compacted_days': 730,
+            'rollup_days': 0,
+            'bucket_hours': 6,
+            'interval': 6 * 3600,
+            'batch_rows': 5000,
+            'pause': 0.05,
+            'vacuum_pages': 1000,
+            'full_vacuum': False,
+        }
+        self.options.update(options)
+        self.app = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._run_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the retention policy from the app config"""
+        config = app.config
+        self.options.update({
+            'raw_days': config.get('RETENTION_RAW_DAYS', self.options['raw_days']),
+            'compacted_days': config.get('RETENTION_COMPACTED_DAYS', self.options['compacted_days']),
+            'rollup_days': config.get('RETENTION_ROLLUP_DAYS', self.options['rollup_days']),
+            'bucket_hours': config.get('COMPACTION_BUCKET_HOURS', self.options['bucket_hours']),
+            'interval': config.get('COMPACTION_INTERVAL', self.options['interval']),
+            'batch_rows': config.get('COMPACTION_BATCH_ROWS', self.options['batch_rows']),
+            'pause': config.get('COMPACTION_PAUSE', self.options['pause']),
+            'vacuum_pages': config.get('COMPACTION_VACUUM_PAGES', self.options['vacuum_pages']),
+            'full_vacuum': config.get('COMPACTION_FULL_VACUUM', self.options['full_vacuum']),
+        })
+        if 24 % self.options['bucket_hours']:
+            raise ValueError('COMPACTION_BUCKET_HOURS must divide 24')
+        self.shutdown()
+        self.app = app
+        self._stopped = threading.Event()
+        self._reset_counters()
+        app.extensions['compactor'] = self
+
+    def start(self):
+        """Run compaction now and then every ``interval`` seconds on a daemon thread"""
+        if self.options['interval'] <= 0:
+            return
+        self._thread = threading.Thread(target=self._loop, name='compactor', daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._stopped.set()
+
+    def run_once(self, now=None):
+        """Apply the retention policy once, inside an app context; returns this run's counts"""
+        from app import db
+
+        with self._run_lock:
+            started = time.perf_counter()
+            run = dict.fromkeys(('rows_compacted', 'buckets_written', 'compacted_expired',
+                                 'rollups_expired', 'bytes_reclaimed'), 0)
+            today = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+            try:
+                if self.options['raw_days'] > 0:
+                    cutoff = today - timedelta(days=max(self.options['raw_days'], MIN_RAW_DAYS))
+                    run['rows_compacted'], run['buckets_written'] = self._compact_raw(db.session, cutoff)
+                if self.options['compacted_days'] > 0:
+                    run['compacted_expired'] = self._expire_compacted(
+                        db.session, today - timedelta(days=self.options['compacted_days'])
+                    )
+                if self.options['rollup_days'] > 0:
+                    run['rollups_expired'] = self._expire_rollups(
+                        db.session, (today - timedelta(days=self.options['rollup_days'])).date()
+                    )
+                run['bytes_reclaimed'], database_bytes = self._vacuum(db.engine)
+            except Exception as e:
+                db.session.rollback()
+                with self._lock:
+                    self._counters['errors'] += 1
+                    self._counters['last_error'] = str(e)
+                raise
+            finally:
+                duration = time.perf_counter() - started
+            with self._lock:
+                self._counters['runs'] += 1
+                for name, value in run.items():
+                    self._counters[name] += value
+                self._counters.update({
+                    'last_run_at': datetime.utcnow().isoformat(),
+                    'last_duration_s': round(duration, 3),
+                    'database_bytes': database_bytes,
+                    'last_error': None,
+                })
+        if any(run.values()):
+            logger.info(f"Compaction finished in {duration:.2f}s: {run}")
+        return run
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        counters.update({
+            'raw_days': self.options['raw_days'],
+            'compacted_days': self.options['compacted_days'],
+            'rollup_days': self.options['rollup_days'],
+            'bucket_hours': self.options['bucket_hours'],
+        })
+        return counters
+
+    def _loop(self):
+        stopped = self._stopped
+        while not stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception:
+                logger.exception("Compaction run failed")
+            stopped.wait(self.options['interval'])
+
+    def _reset_counters(self):
+        with self._lock:
+            self._counters = {
+                'runs': 0, 'batches': 0, 'errors': 0,
+                'rows_compacted': 0, 'buckets_written': 0,
+                'compacted_expired': 0, 'rollups_expired': 0,
+                'bytes_reclaimed': 0, 'database_bytes': None,
+                'last_run_at': None, 'last_duration_s': None, 'last_error': None,
+            }
+
+    def _count_batch(self):
+        with self._lock:
+            self._counters['batches'] += 1
+
+    def _pause(self):
+        # Lets ingest writers take the lock between batches; returns True when shutting down
+        return self._stopped.wait(self.options['pause'])
+
+    # Tiers
+
+    def _compact_raw(self, session, cutoff):
+        """Fold raw rows older than ``cutoff`` into buckets, one location and a few days per transaction"""
+        from app.models import Location, WeatherData
+
+        batch_days = max(self.options['batch_rows'] // 24, 1)
+        rows_compacted = buckets_written = 0
+        while True:
+            # Oldest remaining raw row, found through the timestamp index
+            oldest = session.execute(
+                select(WeatherData.location_id, WeatherData.timestamp)
+                .where(WeatherData.timestamp < cutoff)
+                .order_by(WeatherData.timestamp)
+                .limit(1)
+            ).first()
+            if oldest is None:
+                break
+            location_id, timestamp = oldest
+            start = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+            end = min(start + timedelta(days=batch_days), cutoff)
+            in_batch = (
+                WeatherData.location_id == location_id,
+                WeatherData.timestamp >= start,
+                WeatherData.timestamp < end,
+            )
+
+            buckets_written += session.execute(self._build_compaction_insert(in_batch)).rowcount
+            rows_compacted += session.execute(delete(WeatherData).where(*in_batch)).rowcount
+            # Exports of this location change, so move its export cache version on
+            session.execute(update(Location).where(Location.id == location_id).values(updated_at=datetime.utcnow()))
+            session.commit()
+            self._count_batch()
+            if self._pause():
+                break
+        return rows_compacted, buckets_written
+
+    def _build_compaction_insert(self, criteria):
+        """INSERT ... SELECT bucket aggregates, adding into buckets that already exist"""
+        from app.models import WeatherDailyRollup, WeatherData, WeatherDataCompacted
+        from app.services.rollups import aggregate_columns
+
+        bucket_hours = self.options['bucket_hours']
+        # Start of the bucket, in the same text format SQLAlchemy stores DateTime values in
+        hour = cast(func.strftime('%H', WeatherData.timestamp), Integer)
+        bucket_start = func.strftime(
+            '%Y-%m-%d %H:00:00.000000', WeatherData.timestamp,
+            func.printf('-%d hours', hour % bucket_hours)
+        )
+        rows = (
+            select(WeatherData.location_id, bucket_start, literal(bucket_hours), *aggregate_columns())
+            .where(*criteria)
+            .group_by(WeatherData.location_id, bucket_start)
+        )
+        table = WeatherDataCompacted.__table__
+        columns = ('location_id', 'bucket_start', 'bucket_hours') + WeatherDailyRollup.AGGREGATES
+        stmt = sqlite_insert(table).from_select(columns, rows)
+        existing, new = table.c, stmt.excluded
+        set_ = {'records': existing.records + new.records}
+        for series in ('temperature', 'humidity'):
+            count, total, low, high = (f'{series}_{name}' for name in ('count', 'sum', 'min', 'max'))
+            set_.update({
+                count: existing[count] + new[count],
+                total: func.coalesce(existing[total] + new[total], existing[total], new[total]),
+                low: func.min(func.coalesce(existing[low], new[low]), func.coalesce(new[low], existing[low])),
+                high: func.max(func.coalesce(existing[high], new[high]), func.coalesce(new[high], existing[high])),
+            })
+        return stmt.on_conflict_do_update(index_elements=[existing.location_id, existing.bucket_start], set_=set_)
+
+    def _expire_compacted(self, session, cutoff):
+        from app.models import WeatherDataCompacted
+
+        table = WeatherDataCompacted.__table__
+        return self._delete_in_batches(session, table, table.c.bucket_start < cutoff)
+
+    def _expire_rollups(self, session, cutoff):
+        from app.models import WeatherDailyRollup
+
+        table = WeatherDailyRollup.__table__
+        return self._delete_in_batches(session, table, table.c.day < cutoff)
+
+    def _delete_in_batches(self, session, table, condition):
+        rowid = literal_column('rowid')
+        deleted = 0
+        while True:
+            batch = select(rowid).select_from(table).where(condition).limit(self.options['batch_rows'])
+            count = session.execute(delete(table).where(rowid.in_(batch.scalar_subquery()))).rowcount
+            session.commit()
+            if not count:
+                break
+            deleted += count
+            self._count_batch()
+            if self._pause():
+                break
+        return deleted
+
+    def _vacuum(self, engine):
+        """Return freed pages to the filesystem; returns (bytes reclaimed, database size in bytes)"""
+        if engine.dialect.name != 'sqlite':
+            return 0, None
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            pragma = lambda name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+            page_size = pragma('page_size')
+            pages_before = pragma('page_count')
+            if pragma('auto_vacuum') == 2:
+                # Incremental mode: release free pages a slice at a time. pysqlite's
+                # execute() only steps this pragma once (one page); executescript
+                # runs it to completion
+                while pragma('freelist_count'):
+                    conn.connection.driver_connection.executescript(
+                        f"PRAGMA incremental_vacuum({self.options['vacuum_pages']});"
+                    )
+                    if self._pause():
+                        break
+            elif self.options['full_vacuum'] and pragma('freelist_count'):
+                # Rewrites the whole file under an exclusive lock; also switches
+                # the file to the auto_vacuum mode set on the connection
+                conn.exec_driver_sql('VACUUM')
+            pages_after = pragma('page_count')
+            if pages_after < pages_before and pragma('journal_mode') == 'wal':
+                # Pages only leave the file once the WAL is checkpointed
+                conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        return (pages_before - pages_after) * page_size, pages_after * page_size
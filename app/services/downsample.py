@@ -0,0 +1,79 @@
+"""Largest-Triangle-Three-Buckets downsampling for chart series.
+
+A chart only has a few hundred pixels of width, so plotting weeks of hourly
+rows point by point costs render time without adding detail. ``lttb``
+reduces a series to about ``threshold`` points while keeping its visual
+shape (peaks, troughs and slope changes).
+
+Missing values (NaN) split the series into runs. A gap at least one output
+bucket wide stays visible as a NaN separator, so matplotlib breaks the line
+there. Narrower gaps could not be seen at the output resolution anyway, and
+are bridged.
+"""
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    """Downsample (x, y) to about ``threshold`` points; returns new (x, y) float arrays.
+
+    ``x`` must be increasing. NaNs in ``y`` mark gaps (see module docstring).
+    Series that already fit are returned unchanged, NaNs included.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = ~np.isnan(y)
+    count = int(valid.sum())
+    if threshold <= 0 or count <= threshold:
+        return x, y
+
+    indices = np.flatnonzero(valid)
+    bucket_width = len(y) / threshold
+    # A jump of more than one index is a gap; keep the ones at least a bucket wide
+    breaks = np.flatnonzero(np.diff(indices) - 1 >= bucket_width) + 1
+    runs = np.split(indices, breaks)
+
+    # Share the point budget by run length, leaving room for the separators
+    budget = max(threshold - (len(runs) - 1), len(runs))
+    x_parts, y_parts = [], []
+    for run in runs:
+        if x_parts:
+            x_parts.append(x[run[:1]])
+            y_parts.append(np.array([np.nan]))
+        share = max(int(budget * len(run) / count), 1)
+        selected = run[_lttb_indices(x[run], y[run], share)]
+        x_parts.append(x[selected])
+        y_parts.append(y[selected])
+    return np.concatenate(x_parts), np.concatenate(y_parts)
+
+
+def _lttb_indices(x, y, threshold):
+    """Positions of the points LTTB keeps from one gap-free run"""
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        # Too few points for triangles: keep the extremes, in time order
+        return np.unique([np.argmin(y), np.argmax(y)])[:threshold]
+
+    # First and last points are fixed; the rest fall into threshold - 2 buckets
+    edges = (np.arange(threshold - 1) * (n - 2) // (threshold - 2) + 1).astype(int)
+    sizes = np.diff(edges)
+    x_means = np.add.reduceat(x[1:-1], edges[:-1] - 1) / sizes
+    y_means = np.add.reduceat(y[1:-1], edges[:-1] - 1) / sizes
+    # The bucket after the last one is the final point
+    x_means = np.append(x_means, x[-1])
+    y_means = np.append(y_means, y[-1])
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        cx, cy = x_means[bucket + 1], y_means[bucket + 1]
+        ax, ay = x[a], y[a]
+        # Twice the triangle area (a, candidate, next bucket's mean), vectorised over the bucket
+        areas = np.abs((ax - cx) * (y[start:stop] - ay) - (ax - x[start:stop]) * (cy - ay))
+        a = start + int(np.argmax(areas))
+        selected[bucket + 1] = a
+    return selected
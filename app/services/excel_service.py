@@ -1,191 +1,232 @@
-import pandas as pd
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils.dataframe import dataframe_to_rows
-from io import BytesIO
+from openpyxl.writer.excel import ExcelWriter
 from datetime import datetime
+from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+import os
+import shutil
+import tempfile
+import time
+
+from app.services.rollups import RunningStats
+
+HEADERS = ['timestamp', 'temperature_2m', 'relative_humidity_2m']
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Write-only sheets need column widths before the first row is written, so
+# data columns are sized from the header and the fixed timestamp format
+DATA_COLUMN_WIDTHS = {'A': 21, 'B': 16, 'C': 22}
+MAX_COLUMN_WIDTH = 50
+
+# Exports larger than this spill from memory to a temporary file
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+class ExportSummary:
+    """Everything the metadata sheet needs, gathered while rows stream past
+    
+    With precomputed ``stats`` (a rollups.WindowStats for the same rows)
+    temperature and humidity statistics are taken from it instead of being
+    accumulated row by row.
+    """
+    
+    def __init__(self, stats=None):
+        self.total = 0
+        self.first = None
+        self.last_timestamp = None
+        self.location_ids = set()
+        self.precomputed = stats is not None
+        self.temperature = stats.temperature if stats is not None else RunningStats()
+        self.humidity = stats.humidity if stats is not None else RunningStats()
+    
+    def add(self, data):
+        if self.first is None:
+            self.first = data
+        self.total += 1
+        self.last_timestamp = data.timestamp
+        if not self.precomputed:
+            self.temperature.add(data.temperature)
+            self.humidity.add(data.humidity)
+        # Only need to know whether there is more than one
+        if len(self.location_ids) < 2:
+            self.location_ids.add(data.location_id)
+
+
+class _FixedTimeZipFile(ZipFile):
+    """ZipFile that stamps every member with one time, so equal content gives equal bytes"""
+    
+    def __init__(self, file, date_time):
+        super().__init__(file, 'w', ZIP_DEFLATED, allowZip64=True)
+        self._date_time = date_time
+    
+    def _member(self, name, size=0):
+        info = ZipInfo(name, date_time=self._date_time)
+        info.compress_type = self.compression
+        info.external_attr = 0o600 << 16
+        # Lets open() decide on zip64 up front, as ZipFile.write does
+        info.file_size = size
+        return info
+    
+    def writestr(self, zinfo_or_arcname, data, compress_type=None, compresslevel=None):
+        if not isinstance(zinfo_or_arcname, ZipInfo):
+            zinfo_or_arcname = self._member(zinfo_or_arcname)
+        super().writestr(zinfo_or_arcname, data, compress_type, compresslevel)
+    
+    def write(self, filename, arcname=None, compress_type=None, compresslevel=None):
+        # Write-only sheets are spooled to temporary files and added with write()
+        member = self._member(arcname or os.path.basename(filename), os.path.getsize(filename))
+        with open(filename, 'rb') as source, self.open(member, 'w') as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+
+
+def _save_workbook(wb, file, generated_at):
+    """Save a workbook like ``Workbook.save``, with every timestamp in the file set to ``generated_at``"""
+    wb.properties.created = wb.properties.modified = generated_at
+    ExcelWriter(wb, _FixedTimeZipFile(file, generated_at.timetuple()[:6])).save()
+
 
 class ExcelService:
     def __init__(self):
-        pass
+        self.header_font = Font(bold=True, color="FFFFFF")
+        self.header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        self.header_alignment = Alignment(horizontal="center", vertical="center")
     
-    def generate_excel(self, weather_data):
-        """Generate Excel file with weather data for last 48 hours"""
-        if not weather_data:
-            return self._generate_empty_excel()
-        
-        # Create workbook and worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Weather Data"
-        
-        # Set up headers
-        headers = ['timestamp', 'temperature_2m', 'relative_humidity_2m']
-        ws.append(headers)
-        
-        # Style headers
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Add data rows
+    def generate_excel(self, weather_data, location=None, stats=None, timings=None, generated_at=None):
+        """Generate Excel file with weather data for last 48 hours
+        
+        ``weather_data`` may be any iterable of rows (e.g. a ``yield_per``
+        result) and is consumed in a single pass with a write-only workbook,
+        so memory stays bounded regardless of row count. Returns a file
+        object positioned at the start. ``location`` is the (lat, lon) the
+        export was scoped to, if any; ``stats`` is an optional
+        rollups.WindowStats for the same rows. ``generated_at`` is the time
+        the workbook states it was generated (default: now); the same rows
+        and ``generated_at`` always give the same bytes.
+        
+        If ``timings`` is a dict, seconds spent reading and writing the rows
+        (including fetching them, for a lazy result) and saving the workbook
+        are stored under ``rows`` and ``save``.
+        """
+        rows_started = time.perf_counter()
+        generated_at = (generated_at or datetime.now()).replace(microsecond=0)
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Weather Data")
+        for column_letter, width in DATA_COLUMN_WIDTHS.items():
+            ws.column_dimensions[column_letter].width = width
+        
+        ws.append([self._header_cell(ws, header) for header in HEADERS])
+        
+        summary = ExportSummary(stats)
         for data in weather_data:
-            row_data = [
-                data.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            summary.add(data)
+            ws.append([
+                data.timestamp.strftime(TIMESTAMP_FORMAT),
                 data.temperature if data.temperature is not None else 'N/A',
                 data.humidity if data.humidity is not None else 'N/A'
-            ]
-            ws.append(row_data)
-        
-        # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Add metadata sheet
-        metadata_ws = wb.create_sheet("Metadata")
-        self._add_metadata_sheet(metadata_ws, weather_data)
+            ])
         
-        # Save to buffer
-        buffer = BytesIO()
-        wb.save(buffer)
+        if not summary.total:
+            ws.append(['No data available for the selected time period', '', ''])
+        else:
+            metadata_ws = wb.create_sheet("Metadata")
+            self._add_metadata_sheet(metadata_ws, summary, location, generated_at)
+        
+        # Write-only workbooks serialise the sheets here
+        save_started = time.perf_counter()
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        _save_workbook(wb, buffer, generated_at)
+        if timings is not None:
+            timings['rows'] = save_started - rows_started
+            timings['save'] = time.perf_counter() - save_started
         buffer.seek(0)
         return buffer
     
-    def _add_metadata_sheet(self, ws, weather_data):
+    def _header_cell(self, ws, value):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = self.header_font
+        cell.fill = self.header_fill
+        cell.alignment = self.header_alignment
+        return cell
+    
+    def _resolve_location(self, summary, location):
+        """Return the (lat, lon) all rows belong to, or None if they span several locations"""
+        if location is not None:
+            return location
+        if len(summary.location_ids) == 1:
+            return (summary.first.latitude, summary.first.longitude)
+        return None
+    
+    def _add_metadata_sheet(self, ws, summary, location=None, generated_at=None):
         """Add metadata information to a separate sheet"""
-        if not weather_data:
-            ws.append(["No data available"])
-            return
-        
-        sample = weather_data[0]
-        first_date = weather_data[0].timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        last_date = weather_data[-1].timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Count available data points
-        temp_count = sum(1 for d in weather_data if d.temperature is not None)
-        humidity_count = sum(1 for d in weather_data if d.humidity is not None)
-        
-        # Calculate ranges
-        valid_temps = [d.temperature for d in weather_data if d.temperature is not None]
-        valid_humidities = [d.humidity for d in weather_data if d.humidity is not None]
+        location = self._resolve_location(summary, location)
         
         metadata = [
             ["Report Information", ""],
-            ["Generated At", datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+            ["Generated At", (generated_at or datetime.now()).strftime(TIMESTAMP_FORMAT)],
             ["", ""],
             ["Location Information", ""],
-            ["Latitude", sample.latitude],
-            ["Longitude", sample.longitude],
+        ]
+        
+        if location is not None:
+            metadata.extend([
+                ["Latitude", location[0]],
+                ["Longitude", location[1]],
+            ])
+        else:
+            metadata.append(["Locations", "Multiple (pass lat/lon to scope the export)"])
+        
+        metadata.extend([
             ["", ""],
             ["Data Range", ""],
-            ["Start Date", first_date],
-            ["End Date", last_date],
-            ["Total Records", len(weather_data)],
+            ["Start Date", summary.first.timestamp.strftime(TIMESTAMP_FORMAT)],
+            ["End Date", summary.last_timestamp.strftime(TIMESTAMP_FORMAT)],
+            ["Total Records", summary.total],
             ["", ""],
             ["Data Quality", ""],
-            ["Temperature Records", temp_count],
-            ["Humidity Records", humidity_count],
+            ["Temperature Records", summary.temperature.count],
+            ["Humidity Records", summary.humidity.count],
             ["", ""],
             ["Statistics", ""],
-        ]
+        ])
         
-        if valid_temps:
+        temperature = summary.temperature
+        if temperature.count:
             metadata.extend([
-                ["Min Temperature (°C)", f"{min(valid_temps):.1f}"],
-                ["Max Temperature (°C)", f"{max(valid_temps):.1f}"],
-                ["Avg Temperature (°C)", f"{sum(valid_temps)/len(valid_temps):.1f}"],
+                ["Min Temperature (°C)", f"{temperature.minimum:.1f}"],
+                ["Max Temperature (°C)", f"{temperature.maximum:.1f}"],
+                ["Avg Temperature (°C)", f"{temperature.mean:.1f}"],
             ])
         
-        if valid_humidities:
+        humidity = summary.humidity
+        if humidity.count:
             metadata.extend([
-                ["Min Humidity (%)", f"{min(valid_humidities):.1f}"],
-                ["Max Humidity (%)", f"{max(valid_humidities):.1f}"],
-                ["Avg Humidity (%)", f"{sum(valid_humidities)/len(valid_humidities):.1f}"],
+                ["Min Humidity (%)", f"{humidity.minimum:.1f}"],
+                ["Max Humidity (%)", f"{humidity.maximum:.1f}"],
+                ["Avg Humidity (%)", f"{humidity.mean:.1f}"],
             ])
         
         metadata.extend([
             ["", ""],
             ["Data Source", "Open-Meteo MeteoSwiss API"],
-            ["Data Type", "Historical (Past 2 Days)" if not getattr(sample, 'is_forecast', True) else "Forecast"]
+            ["Data Type", "Historical (Past 2 Days)" if not getattr(summary.first, 'is_forecast', True) else "Forecast"]
         ])
         
-        # Add metadata to sheet
-        for row_data in metadata:
-            ws.append(row_data)
-        
-        # Style the metadata sheet
-        for row in ws.iter_rows():
-            for cell in row:
-                if cell.column == 1 and cell.value and cell.value.endswith("Information"):
-                    cell.font = Font(bold=True, size=12)
-                    cell.fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-                elif cell.column == 1 and cell.value:
-                    cell.font = Font(bold=True)
-        
-        # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-    
-    def _generate_empty_excel(self):
-        """Generate Excel file when no data is available"""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Weather Data"
-        
-        # Add headers
-        headers = ['timestamp', 'temperature_2m', 'relative_humidity_2m']
-        ws.append(headers)
-        
-        # Add empty row with message
-        ws.append(['No data available for the selected time period', '', ''])
-        
-        # Style headers
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        for col_num in range(1, 4):
-            cell = ws.cell(row=1, column=col_num)
-            cell.font = header_font
-            cell.fill = header_fill
-        
-        # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-        return buffer
+        # The metadata sheet is small, so widths come from its own contents
+        for index, column_letter in enumerate(('A', 'B')):
+            width = max(len(str(row[index])) for row in metadata)
+            ws.column_dimensions[column_letter].width = min(width + 2, MAX_COLUMN_WIDTH)
+        
+        section_font = Font(bold=True, size=12)
+        section_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
+        label_font = Font(bold=True)
+        for label, value in metadata:
+            if label:
+                cell = WriteOnlyCell(ws, value=label)
+                if label.endswith("Information"):
+                    cell.font = section_font
+                    cell.fill = section_fill
+                else:
+                    cell.font = label_font
+                label = cell
+            ws.append([label, value])
@@ -0,0 +1,147 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ExportArtifact:
+    """A generated export document and its strong ETag.
+
+    ``body`` is None for artifacts too large to keep in memory; the entry
+    then only remembers the ETag so ``If-None-Match`` can still be answered
+    without regenerating the document.
+    """
+
+    __slots__ = ('etag', 'body', 'size', 'mimetype', 'download_name')
+
+    def __init__(self, etag, body, size, mimetype, download_name):
+        self.etag = etag
+        self.body = body
+        self.size = size
+        self.mimetype = mimetype
+        self.download_name = download_name
+
+
+def file_etag(file, chunk_size=64 * 1024):
+    """SHA-256 of a seekable file's contents; leaves the file at the start"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """In-process LRU of generated Excel/PDF exports, bounded by entries and bytes.
+
+    Keys combine the export parameters with the data version of the rows
+    being exported (see ``storage.export_data_version``), so entries never
+    need explicit invalidation: an ingest changes the version and the old
+    artifact simply ages out. Documents are rendered deterministically for
+    a key (their "generated at" time is the data's ``updated_at``), so an
+    ETag stays valid for the key even after its artifact is evicted.
+    """
+
+    def __init__(self, app=None, **options):
+        self.options = {
+            'enabled': True,
+            'max_entries': 256,
+            'max_bytes': 64 * 1024 * 1024,
+            'max_artifact_bytes': 16 * 1024 * 1024,
+        }
+        self.options.update(options)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'not_modified': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read cache limits from the app config"""
+        config = app.config
+        self.options.update({
+            'enabled': config.get('EXPORT_CACHE_ENABLED', self.options['enabled']),
+            'max_entries': config.get('EXPORT_CACHE_MAX_ENTRIES', self.options['max_entries']),
+            'max_bytes': config.get('EXPORT_CACHE_MAX_BYTES', self.options['max_bytes']),
+            'max_artifact_bytes': config.get('EXPORT_CACHE_MAX_ARTIFACT_BYTES', self.options['max_artifact_bytes']),
+        })
+        self.clear()
+        app.extensions['export_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.options['enabled']
+
+    def get(self, key):
+        """Return the cached ExportArtifact for a key, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            artifact = self._entries.get(key)
+            if artifact is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return artifact
+
+    def store(self, key, file, mimetype, download_name):
+        """Hash a generated export file and cache it; returns the ExportArtifact.
+
+        Files above ``max_artifact_bytes`` keep only their ETag, and the
+        caller streams the file itself.
+        """
+        file.seek(0, 2)
+        size = file.tell()
+        file.seek(0)
+        if size > self.options['max_artifact_bytes'] or size > self.options['max_bytes']:
+            artifact = ExportArtifact(file_etag(file), None, size, mimetype, download_name)
+        else:
+            body = file.read()
+            artifact = ExportArtifact(hashlib.sha256(body).hexdigest(), body, size, mimetype, download_name)
+        if self.enabled:
+            with self._lock:
+                self._store(key, artifact)
+        return artifact
+
+    def record_not_modified(self):
+        with self._lock:
+            self._counters['not_modified'] += 1
+
+    def clear(self):
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+        return removed
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+            size = self._bytes
+        lookups = counters['hits'] + counters['misses']
+        counters.update({
+            'entries': entries,
+            'bytes': size,
+            'hit_ratio': counters['hits'] / lookups if lookups else 0.0,
+        })
+        return counters
+
+    # Callers hold self._lock
+
+    def _store(self, key, artifact):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = artifact
+        self._bytes += len(artifact.body) if artifact.body is not None else 0
+        while (len(self._entries) > self.options['max_entries']
+               or self._bytes > self.options['max_bytes']):
+            self._remove(next(iter(self._entries)))
+            self._counters['evictions'] += 1
+
+    def _remove(self, key):
+        artifact = self._entries.pop(key)
+        if artifact.body is not None:
+            self._bytes -= len(artifact.body)
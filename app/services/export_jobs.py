@@ -0,0 +1,315 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.services import stream_export
+
+logger = logging.getLogger(__name__)
+
+# Excel/PDF documents: (mimetype, download name); flat formats live in stream_export.FORMATS
+DOCUMENT_FORMATS = {
+    'excel': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'weather_data.xlsx'),
+    'pdf': ('application/pdf', 'weather_report.pdf'),
+}
+
+JOB_FORMATS = tuple(DOCUMENT_FORMATS) + tuple(stream_export.FORMATS)
+
+# Minimum seconds between progress writes to the jobs table
+PROGRESS_INTERVAL = 0.5
+
+
+def job_file_info(format_name):
+    """Return (mimetype, download name) for a job format"""
+    if format_name in DOCUMENT_FORMATS:
+        return DOCUMENT_FORMATS[format_name]
+    write, mimetype, download_name = stream_export.FORMATS[format_name]
+    return mimetype, download_name
+
+
+class ExportJobRunner:
+    """Runs exports in the background and keeps their state in the export_jobs table.
+
+    Jobs are executed by an in-process thread pool; PDF rendering still goes
+    through the render process pool. Finished files are written to
+    ``directory`` and removed, together with their rows, ``retention``
+    seconds after they finish. On startup jobs that were queued or running
+    when the process stopped are queued again.
+    """
+
+    def __init__(self, app=None, **options):
+        self.options = {
+            'workers': 2,
+            'directory': None,
+            'retention': 24 * 3600,
+            'sweep_interval': 3600,
+        }
+        self.options.update(options)
+        self.app = None
+        self._executor = None
+        self._stopped = threading.Event()
+        self._sweeper = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read worker count, export directory and retention from the app config"""
+        config = app.config
+        self.options.update({
+            'workers': config.get('EXPORT_JOB_WORKERS', self.options['workers']),
+            'directory': config.get('EXPORT_JOBS_DIR', self.options['directory']),
+            'retention': config.get('EXPORT_JOB_RETENTION', self.options['retention']),
+            'sweep_interval': config.get('EXPORT_JOB_SWEEP_INTERVAL', self.options['sweep_interval']),
+        })
+        self.shutdown()
+        self.app = app
+        self._stopped = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.options['workers'], thread_name_prefix='export-job')
+        app.extensions['export_jobs'] = self
+
+    def start(self):
+        """Sweep expired files, resume unfinished jobs and start the periodic sweep.
+
+        Call once the export_jobs table exists, inside an app context.
+        """
+        os.makedirs(self.options['directory'], exist_ok=True)
+        self.sweep()
+        self.resume()
+        if self.options['sweep_interval'] > 0:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='export-job-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, format_name, params):
+        """Persist a queued job and hand it to the worker pool; returns the ExportJob"""
+        from app import db
+        from app.models import ExportJob
+
+        job = ExportJob(id=uuid.uuid4().hex, format=format_name, params=json.dumps(params), status='queued')
+        db.session.add(job)
+        db.session.commit()
+        self._executor.submit(self._run, job.id)
+        return job
+
+    def resume(self):
+        """Queue jobs left unfinished by a previous process, oldest first"""
+        from app import db
+        from app.models import ExportJob
+
+        interrupted = db.session.scalars(select(ExportJob).where(ExportJob.status == 'running')).all()
+        for job in interrupted:
+            self._remove_file(self._partial_path(job))
+            job.status = 'queued'
+            job.progress = 0.0
+            job.rows_done = 0
+            job.started_at = None
+        db.session.commit()
+
+        queued = db.session.scalars(
+            select(ExportJob.id).where(ExportJob.status == 'queued').order_by(ExportJob.created_at)
+        ).all()
+        for job_id in queued:
+            self._executor.submit(self._run, job_id)
+        if queued:
+            logger.info(f"Resumed {len(queued)} export jobs ({len(interrupted)} were interrupted)")
+        return len(queued)
+
+    def sweep(self):
+        """Delete finished jobs and their files once they are older than the retention period"""
+        from app import db
+        from app.models import ExportJob
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.options['retention'])
+        expired = db.session.scalars(
+            select(ExportJob).where(
+                ExportJob.status.in_(('succeeded', 'failed')),
+                ExportJob.finished_at < cutoff
+            )
+        ).all()
+        for job in expired:
+            self._remove_file(job.file_path)
+            db.session.delete(job)
+        db.session.commit()
+        if expired:
+            logger.info(f"Removed {len(expired)} expired export jobs")
+        return len(expired)
+
+    # Worker side
+
+    def _sweep_loop(self):
+        stopped = self._stopped
+        while not stopped.wait(self.options['sweep_interval']):
+            try:
+                with self.app.app_context():
+                    self.sweep()
+            except Exception:
+                logger.exception("Export job sweep failed")
+
+    def _run(self, job_id):
+        from app import db
+        from app.models import ExportJob
+
+        with self.app.app_context():
+            # Claim atomically so a job is never run twice
+            claimed = db.session.execute(
+                update(ExportJob)
+                .where(ExportJob.id == job_id, ExportJob.status == 'queued')
+                .values(status='running', started_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                return
+
+            job = db.session.get(ExportJob, job_id)
+            partial_path = self._partial_path(job)
+            try:
+                self._export(job, partial_path)
+                path = self._final_path(job)
+                os.replace(partial_path, path)
+                job.status = 'succeeded'
+                job.file_path = path
+                job.size = os.path.getsize(path)
+                job.progress = 1.0
+            except Exception as e:
+                logger.exception(f"Export job {job_id} failed")
+                db.session.rollback()
+                self._remove_file(partial_path)
+                job.status = 'failed'
+                job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+    def _export(self, job, path):
+        """Write one job's export to ``path``, reporting progress as rows are consumed"""
+        from app import db, metrics, render_pool
+        from app.models import WeatherData
+        from app.services.excel_service import ExcelService
+        from app.services.report_columns import ReportColumns
+        from app.services.storage import (
+            build_export_query, build_flat_export_query, export_window_start, resolve_export_location
+        )
+        from app.services.rollups import summarize_window
+
+        params = json.loads(job.params)
+        config = self.app.config
+        engine = db.engines['readonly'] if 'readonly' in db.engines else db.engine
+        with Session(engine) as session:
+            location, found = resolve_export_location(
+                session, params.get('lat'), params.get('lon'), params.get('location_id'), config['COORDINATE_GRID']
+            )
+            location_id = location.id if location else None
+            # The window is relative to submission, so a resumed job exports the same rows
+            now = job.created_at
+            hours = params['hours']
+            location_tuple = (location.latitude, location.longitude) if location else None
+
+            stmt = build_export_query(WeatherData, hours, location_id, now)
+            total = session.scalar(select(func.count()).select_from(stmt.subquery())) if found else 0
+            progress = _ProgressReporter(job, total)
+            yield_per = config['EXPORT_YIELD_PER']
+            stats = None
+            if found and job.format in DOCUMENT_FORMATS:
+                stats = summarize_window(session, export_window_start(hours, now), location_id=location_id)
+
+            if job.format == 'excel':
+                rows = session.scalars(stmt.execution_options(yield_per=yield_per)) if found else []
+                timings = {}
+                excel_file = ExcelService().generate_excel(
+                    progress.rows(rows), location=location_tuple, stats=stats, timings=timings
+                )
+                metrics.observe_stage('excel_rows', timings['rows'])
+                metrics.observe_stage('excel_save', timings['save'])
+                with excel_file, open(path, 'wb') as out:
+                    shutil.copyfileobj(excel_file, out)
+            elif job.format == 'pdf':
+                stmt = build_flat_export_query(WeatherData, hours, location_id, now)
+                rows = session.execute(stmt).all() if found else []
+                progress.update(len(rows))
+                columns = ReportColumns.from_rows(rows, location=location_tuple, stats=stats)
+                with open(path, 'wb') as out:
+                    out.write(_render_pdf_when_free(render_pool, columns))
+            else:
+                write = stream_export.FORMATS[job.format][0]
+                stmt = build_flat_export_query(WeatherData, hours, location_id, now)
+                chunks = session.execute(stmt.execution_options(yield_per=yield_per)).partitions() if found else []
+                with open(path, 'wb') as out:
+                    for data in write(progress.chunks(chunks)):
+                        out.write(data)
+            progress.update(total, force=True)
+
+    def _final_path(self, job):
+        mimetype, download_name = job_file_info(job.format)
+        return os.path.join(self.options['directory'], f"{job.id}{os.path.splitext(download_name)[1]}")
+
+    def _partial_path(self, job):
+        return f"{self._final_path(job)}.part"
+
+    def _remove_file(self, path):
+        if not path:
+            return
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove export file {path}: {e}")
+
+
+class _ProgressReporter:
+    """Writes rows_done/progress to the job row, at most every PROGRESS_INTERVAL seconds"""
+
+    def __init__(self, job, total):
+        from app import db
+
+        self.session = db.session
+        self.job = job
+        self.job.rows_total = total
+        self.done = 0
+        self.last_write = 0.0
+        self.update(0, force=True)
+
+    def update(self, done, force=False):
+        self.done = done
+        now = time.monotonic()
+        if not force and now - self.last_write < PROGRESS_INTERVAL:
+            return
+        self.last_write = now
+        total = self.job.rows_total
+        self.job.rows_done = done
+        # Leave the last step for writing the file
+        self.job.progress = min(done / total, 1.0) * 0.99 if total else 0.0
+        self.session.commit()
+
+    def rows(self, rows):
+        for row in rows:
+            yield row
+            self.update(self.done + 1)
+
+    def chunks(self, chunks):
+        for rows in chunks:
+            yield rows
+            self.update(self.done + len(rows))
+
+
+def _render_pdf_when_free(render_pool, columns, wait=1.0):
+    """Background jobs wait for a render slot instead of failing with 429"""
+    from app.services.render_pool import RenderQueueFull
+
+    while True:
+        try:
+            return render_pool.render_pdf(columns)
+        except RenderQueueFull:
+            time.sleep(wait)
@@ -0,0 +1,11 @@
+def snap_coordinate(value, grid):
+    """Snap a coordinate to the nearest multiple of ``grid`` degrees"""
+    if not grid:
+        return value
+    # Adding 0.0 normalises -0.0 so keys stay stable around the equator/meridian
+    return round(round(value / grid) * grid, 6) + 0.0
+
+
+def snap_coordinates(lat, lon, grid):
+    """Snap a latitude/longitude pair to the configured grid"""
+    return snap_coordinate(lat, grid), snap_coordinate(lon, grid)
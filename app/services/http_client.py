@@ -0,0 +1,120 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class HTTPClient:
+    """Shared keep-alive HTTP session with a bounded connection pool and retries.
+
+    One instance is created per application (see ``create_app``) so that all
+    upstream calls reuse pooled TCP/TLS connections instead of opening a new
+    one per request.
+    """
+
+    def __init__(self, app=None, **options):
+        self.options = {
+            'pool_connections': 10,
+            'pool_maxsize': 10,
+            'pool_block': False,
+            'max_retries': 3,
+            'backoff_factor': 0.5,
+            'connect_timeout': 3.05,
+            'read_timeout': 30,
+        }
+        self.options.update(options)
+        self._session = None
+        self._adapter = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read pool/retry/timeout settings from the app config"""
+        config = app.config
+        self.options.update({
+            'pool_connections': config.get('HTTP_POOL_CONNECTIONS', self.options['pool_connections']),
+            'pool_maxsize': config.get('HTTP_POOL_MAXSIZE', self.options['pool_maxsize']),
+            'pool_block': config.get('HTTP_POOL_BLOCK', self.options['pool_block']),
+            'max_retries': config.get('HTTP_MAX_RETRIES', self.options['max_retries']),
+            'backoff_factor': config.get('HTTP_BACKOFF_FACTOR', self.options['backoff_factor']),
+            'connect_timeout': config.get('HTTP_CONNECT_TIMEOUT', self.options['connect_timeout']),
+            'read_timeout': config.get('HTTP_READ_TIMEOUT', self.options['read_timeout']),
+        })
+        self.close()
+        app.extensions['http_client'] = self
+
+    @property
+    def timeout(self):
+        return (self.options['connect_timeout'], self.options['read_timeout'])
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def _build_session(self):
+        """Create a requests session mounted with a pooled, retrying adapter"""
+        retry = Retry(
+            total=self.options['max_retries'],
+            backoff_factor=self.options['backoff_factor'],
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.options['pool_connections'],
+            pool_maxsize=self.options['pool_maxsize'],
+            pool_block=self.options['pool_block'],
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        self._adapter = adapter
+        return session
+
+    def get(self, url, **kwargs):
+        """GET through the shared session using the configured timeouts"""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def stats(self):
+        """Return connection pool statistics.
+
+        ``hits`` counts requests served over an already-open connection and
+        ``misses`` counts requests that had to open a new one.
+        """
+        requests_sent = 0
+        connections_opened = 0
+        pools = 0
+        if self._adapter is not None:
+            container = self._adapter.poolmanager.pools
+            for key in container.keys():
+                pool = container.get(key)
+                if pool is None:
+                    continue
+                pools += 1
+                requests_sent += pool.num_requests
+                connections_opened += pool.num_connections
+        return {
+            'pools': pools,
+            'requests': requests_sent,
+            'hits': max(requests_sent - connections_opened, 0),
+            'misses': connections_opened,
+            'hit_ratio': (requests_sent - connections_opened) / requests_sent if requests_sent else 0.0,
+        }
+
+    def close(self):
+        """Close the session and drop all pooled connections"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._adapter = None
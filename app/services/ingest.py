@@ -0,0 +1,94 @@
+"""Storing upstream payloads: the write path shared by the ingest endpoints and the prefetcher.
+
+Everything here runs inside an app context and uses the Flask-SQLAlchemy
+session.
+"""
+from datetime import datetime
+
+from flask import current_app
+
+from app import db, metrics
+from app.models import WeatherData
+from app.services.rollups import refresh_daily_rollups
+from app.services.storage import find_locations, get_or_create_location, plan_fetch_windows, upsert_rows
+
+
+def store_location_rows(lat, lon, batch):
+    """Upsert one location's WeatherBatch keyed on (location_id, timestamp); caller commits
+
+    Only hours whose values changed are written, and only then are the
+    daily rollups of the batch's days refreshed. Returns the number of rows
+    inserted or updated.
+    """
+    location = get_or_create_location(db.session, lat, lon, current_app.config['COORDINATE_GRID'])
+    if batch.utc_offset_seconds is not None:
+        # Lets the fetch planner work in the location's local time
+        location.utc_offset_seconds = batch.utc_offset_seconds
+    with metrics.time_stage('db_upsert'):
+        records_written = upsert_rows(
+            db.session,
+            WeatherData.__table__,
+            batch.to_rows(location.id),
+            WeatherData.UPSERT_KEY,
+            WeatherData.UPSERT_VALUES
+        )
+    if records_written:
+        location.updated_at = datetime.utcnow()
+        with metrics.time_stage('rollup_refresh'):
+            refresh_daily_rollups(db.session, location.id, {batch.timestamps[0].date(), batch.timestamps[-1].date()})
+    return records_written
+
+
+def plan_windows(coordinates):
+    """Fetch window per location from what is already stored (see ``plan_fetch_windows``)"""
+    locations = find_locations(db.session, coordinates, current_app.config['COORDINATE_GRID'])
+    windows = plan_fetch_windows(db.session, locations)
+    # Release the read snapshot before the slow upstream call
+    db.session.rollback()
+    return windows
+
+
+def store_batch_chunk(chunk, payloads, weather_service):
+    """Write every location of one upstream chunk in a single transaction"""
+    results = {}
+    try:
+        for (lat, lon), raw_data in zip(chunk, payloads):
+            batch = weather_service.process_weather_columns(raw_data, lat, lon)
+            if not len(batch):
+                results[(lat, lon)] = {'status': 'no_data', 'records_processed': 0}
+                continue
+            records_written = store_location_rows(lat, lon, batch)
+            results[(lat, lon)] = {
+                'status': 'stored',
+                'records_processed': len(batch),
+                'records_written': records_written
+            }
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return {location: {'status': 'error', 'error': str(e)} for location in chunk}
+    metrics.count_rows_ingested(sum(result.get('records_written', 0) for result in results.values()))
+    return results
+
+
+def ingest_locations(coordinates, weather_service):
+    """Fetch and store several locations, skipping those already up to date; returns {(lat, lon): status}
+
+    Used by the prefetcher. Locations sharing a fetch window go upstream in
+    one request and are written in one transaction.
+    """
+    results = {}
+    windows = [None] * len(coordinates)
+    if current_app.config['INGEST_INCREMENTAL']:
+        windows = plan_windows(coordinates)
+    pending = []
+    for location, window in zip(coordinates, windows):
+        if window is None and current_app.config['INGEST_INCREMENTAL']:
+            results[location] = {'status': 'up_to_date', 'records_processed': 0, 'records_written': 0}
+        else:
+            pending.append((location, window))
+    if pending:
+        chunk = [location for location, window in pending]
+        payloads = weather_service.fetch_weather_data_batch(chunk, [window for location, window in pending])
+        results.update(store_batch_chunk(chunk, payloads, weather_service))
+    return results
@@ -0,0 +1,181 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers a cached export (a few ms) up to a slow multi-location ingest
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, one value per label set"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one set of buckets per label set"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        # Counts per bucket (plus +Inf); made cumulative only when rendered
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        bounds = self.buckets + (float('inf'),)
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, [('le', _format_value(bound))])
+                yield f'{self.name}_bucket{label_text} {cumulative}'
+            label_text = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_text} {_format_value(total)}'
+            yield f'{self.name}_count{label_text} {cumulative}'
+
+
+class Metrics:
+    """In-process request and pipeline metrics in the Prometheus text format.
+
+    The blueprint records one latency observation per request, labelled by
+    route pattern rather than URL so the number of series stays bounded.
+    Ingest and export code time their stages (upstream fetch, parsing,
+    upsert, export queries, workbook save, chart and PDF layout) into one
+    histogram labelled by ``stage``. An observation is a bisect and a short
+    locked update, cheap enough to leave enabled. ``render`` produces the
+    ``/metrics`` body; values reset when the process restarts.
+    """
+
+    def __init__(self, app=None, **options):
+        self.options = {
+            'enabled': True,
+            'buckets': DEFAULT_BUCKETS,
+        }
+        self.options.update(options)
+        self._create_metrics()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the enabled flag and latency buckets from the app config"""
+        config = app.config
+        self.options.update({
+            'enabled': config.get('METRICS_ENABLED', self.options['enabled']),
+            'buckets': config.get('METRICS_BUCKETS', self.options['buckets']),
+        })
+        self._create_metrics()
+        app.extensions['metrics'] = self
+
+    @property
+    def enabled(self):
+        return self.options['enabled']
+
+    def observe_request(self, method, route, status, seconds):
+        if self.enabled:
+            self.request_duration.observe(seconds, method, route, str(status))
+
+    def observe_stage(self, stage, seconds):
+        if self.enabled:
+            self.stage_duration.observe(seconds, stage)
+
+    @contextmanager
+    def time_stage(self, stage):
+        """Time the body of a ``with`` block as one observation of ``stage``"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def count_upstream_error(self, kind):
+        if self.enabled:
+            self.upstream_errors.inc(1, kind)
+
+    def count_rows_ingested(self, rows):
+        if self.enabled and rows:
+            self.rows_ingested.inc(rows)
+
+    def count_export_bytes(self, format_name, size):
+        if self.enabled and size:
+            self.export_bytes.inc(size, format_name)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+    def _create_metrics(self):
+        buckets = self.options['buckets']
+        self.request_duration = Histogram(
+            'weather_http_request_duration_seconds', 'Time to produce a response, by route pattern',
+            ('method', 'route', 'status'), buckets
+        )
+        self.stage_duration = Histogram(
+            'weather_stage_duration_seconds', 'Time spent in one stage of ingest or export', ('stage',), buckets
+        )
+        self.upstream_errors = Counter(
+            'weather_upstream_errors_total', 'Failed upstream requests, by kind', ('kind',)
+        )
+        self.rows_ingested = Counter(
+            'weather_rows_ingested_total', 'Hourly rows inserted or updated by ingest'
+        )
+        self.export_bytes = Counter(
+            'weather_export_bytes_total', 'Bytes of export documents sent, by format', ('format',)
+        )
+        self._metrics = (
+            self.request_duration, self.stage_duration, self.upstream_errors, self.rows_ingested, self.export_bytes
+        )
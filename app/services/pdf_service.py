@@ -1,5 +1,4 @@
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+import numpy as np
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -8,22 +7,44 @@ from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from io import BytesIO
 from datetime import datetime
-import tempfile
-import os
+import time
+import logging
+
+from app.services.chart_renderer import get_chart_renderer
+from app.services.report_columns import ReportColumns
+
+logger = logging.getLogger(__name__)
+
 
 class PDFService:
-    def __init__(self):
-        # Set matplotlib to use non-interactive backend
-        plt.switch_backend('Agg')
+    def __init__(self, chart_max_points=None):
+        # Lay out the chart figure template up front (once per thread)
+        get_chart_renderer()
+        self.chart_max_points = chart_max_points
+    
+    def generate_pdf_report(self, weather_data, location=None):
+        """Generate PDF report with chart using ReportLab (Windows compatible)
+        
+        ``location`` is the (lat, lon) the export was scoped to, if any.
+        """
+        return self.render(ReportColumns.from_rows(weather_data, location))
     
-    def generate_pdf_report(self, weather_data):
-        """Generate PDF report with chart using ReportLab (Windows compatible)"""
-        if not weather_data:
-            return self._generate_empty_pdf()
+    def render(self, columns, timings=None):
+        """Render a report from ReportColumns and return it as a BytesIO
+        
+        With ``columns.generated_at`` set the output is reproducible: the
+        same columns always give the same bytes (ReportLab's invariant mode
+        fixes the PDF's internal creation date and document ID).
+        
+        If ``timings`` is a dict, seconds spent drawing the chart and laying
+        out the document are stored under ``chart`` and ``layout``.
+        """
+        if not len(columns):
+            return self._generate_empty_pdf(columns.generated_at)
         
         # Create buffer for PDF
         buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch)
+        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch, invariant=columns.generated_at is not None)
         styles = getSampleStyleSheet()
         
         # Custom styles
@@ -53,13 +74,15 @@ class PDFService:
         story.append(Spacer(1, 20))
         
         # Add metadata
-        metadata_text = self._generate_metadata_text(weather_data)
+        metadata_text = self._generate_metadata_text(columns)
         metadata = Paragraph(metadata_text, styles['Normal'])
         story.append(metadata)
         story.append(Spacer(1, 30))
         
         # Add chart
-        chart_img = self._create_chart_image(weather_data)
+        chart_started = time.perf_counter()
+        chart_img = self._create_chart_image(columns)
+        chart_seconds = time.perf_counter() - chart_started
         if chart_img:
             chart_heading = Paragraph("Temperature and Humidity Trends", heading_style)
             story.append(chart_heading)
@@ -71,7 +94,7 @@ class PDFService:
         story.append(table_heading)
         story.append(Spacer(1, 10))
         
-        table_data = self._create_table_data(weather_data)
+        table_data = self._create_table_data(columns)
         if table_data:
             table = Table(table_data, colWidths=[3*cm, 2.5*cm, 2.5*cm])
             table.setStyle(TableStyle([
@@ -96,135 +119,98 @@ class PDFService:
         story.append(footer)
         
         # Build PDF
+        layout_started = time.perf_counter()
         doc.build(story)
+        if timings is not None:
+            timings['chart'] = chart_seconds
+            timings['layout'] = time.perf_counter() - layout_started
         buffer.seek(0)
         return buffer
 
-    def _generate_metadata_text(self, weather_data):
+    def _generate_metadata_text(self, columns):
         """Generate metadata text for PDF"""
-        if not weather_data:
+        if not len(columns):
             return "No weather data available"
             
-        sample = weather_data[0]
-        first_date = weather_data[0].timestamp.strftime('%Y-%m-%d %H:%M')
-        last_date = weather_data[-1].timestamp.strftime('%Y-%m-%d %H:%M')
-        
-        # Count available data points
-        temp_count = sum(1 for d in weather_data if d.temperature is not None)
-        humidity_count = sum(1 for d in weather_data if d.humidity is not None)
+        location = columns.location
+        if location is not None:
+            location_text = f"Latitude: {location[0]}, Longitude: {location[1]}"
+        else:
+            location_text = "Multiple locations (pass lat/lon to scope the export)"
+        first_date = columns.datetimes(0, 1)[0].strftime('%Y-%m-%d %H:%M')
+        last_date = columns.datetimes(-1)[0].strftime('%Y-%m-%d %H:%M')
         
-        # Calculate temperature and humidity ranges
-        valid_temps = [d.temperature for d in weather_data if d.temperature is not None]
-        valid_humidities = [d.humidity for d in weather_data if d.humidity is not None]
+        # Count available data points and their ranges, from the daily rollups when available
+        temp_count, temp_min, temp_max = self._series_range(columns.temperature, columns.stats and columns.stats.temperature)
+        humidity_count, humidity_min, humidity_max = self._series_range(columns.humidity, columns.stats and columns.stats.humidity)
         
-        temp_range = f"{min(valid_temps):.1f}°C to {max(valid_temps):.1f}°C" if valid_temps else "N/A"
-        humidity_range = f"{min(valid_humidities):.1f}% to {max(valid_humidities):.1f}%" if valid_humidities else "N/A"
+        temp_range = f"{temp_min:.1f}°C to {temp_max:.1f}°C" if temp_count else "N/A"
+        humidity_range = f"{humidity_min:.1f}% to {humidity_max:.1f}%" if humidity_count else "N/A"
         
         metadata_text = f"""
-        <b>Report Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}<br/>
-        <b>Location:</b> Latitude: {sample.latitude}, Longitude: {sample.longitude}<br/>
+        <b>Report Generated:</b> {(columns.generated_at or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')}<br/>
+        <b>Location:</b> {location_text}<br/>
         <b>Date Range:</b> {first_date} to {last_date}<br/>
-        <b>Total Records:</b> {len(weather_data)} hours<br/>
+        <b>Total Records:</b> {len(columns)} hours<br/>
         <b>Temperature Data Points:</b> {temp_count}<br/>
         <b>Humidity Data Points:</b> {humidity_count}<br/>
         <b>Temperature Range:</b> {temp_range}<br/>
         <b>Humidity Range:</b> {humidity_range}<br/>
-        <b>Data Type:</b> {'Historical (Past 2 Days)' if not getattr(sample, 'is_forecast', True) else 'Forecast'}<br/>
+        <b>Data Type:</b> {'Historical (Past 2 Days)' if not columns.is_forecast else 'Forecast'}<br/>
         """
         
         return metadata_text
 
-    def _create_chart_image(self, weather_data):
-        """Create matplotlib chart and return as ReportLab Image"""
+    @staticmethod
+    def _series_range(values, stats=None):
+        """(count, min, max) of a column, taken from RunningStats if given"""
+        if stats is not None:
+            return stats.count, stats.minimum, stats.maximum
+        valid = values[~np.isnan(values)]
+        if not len(valid):
+            return 0, None, None
+        return len(valid), valid.min(), valid.max()
+    
+    def _create_chart_image(self, columns):
+        """Render the chart template to an in-memory PNG and wrap it as a ReportLab Image"""
         try:
-            timestamps = [d.timestamp for d in weather_data]
-            temperatures = [d.temperature for d in weather_data if d.temperature is not None]
-            humidities = [d.humidity for d in weather_data if d.humidity is not None]
-            temp_timestamps = [d.timestamp for d in weather_data if d.temperature is not None]
-            humidity_timestamps = [d.timestamp for d in weather_data if d.humidity is not None]
-            
-            fig, ax1 = plt.subplots(figsize=(10, 6))
-            
-            # Plot temperature
-            color = 'tab:red'
-            ax1.set_xlabel('Time', fontweight='bold')
-            ax1.set_ylabel('Temperature (°C)', color=color, fontweight='bold')
-            line1 = ax1.plot(temp_timestamps, temperatures, color=color, linewidth=2, 
-                           label='Temperature', marker='o', markersize=3)
-            ax1.tick_params(axis='y', labelcolor=color)
-            ax1.grid(True, alpha=0.3)
-            
-            # Plot humidity on second axis
-            ax2 = ax1.twinx()
-            color = 'tab:blue'
-            ax2.set_ylabel('Humidity (%)', color=color, fontweight='bold')
-            line2 = ax2.plot(humidity_timestamps, humidities, color=color, linewidth=2, 
-                           label='Humidity', marker='s', markersize=3)
-            ax2.tick_params(axis='y', labelcolor=color)
-            
-            # Format x-axis dates
-            ax1.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d %H:%M'))
-            ax1.xaxis.set_major_locator(mdates.HourLocator(interval=6))
-            plt.setp(ax1.xaxis.get_majorticklabels(), rotation=45)
-            
-            # Add title
-            plt.title('Temperature and Humidity Trends (Past 48 Hours)', 
-                     fontweight='bold', fontsize=14, pad=20)
-            
-            # Add legend
-            lines = line1 + line2
-            labels = [l.get_label() for l in lines]
-            ax1.legend(lines, labels, loc='upper left', frameon=True, shadow=True)
-            
-            plt.tight_layout()
-            
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-                plt.savefig(tmp_file.name, format='png', dpi=150, bbox_inches='tight', 
-                           facecolor='white', edgecolor='none')
-                plt.close(fig)
-                
-                # Create ReportLab Image
-                chart_img = Image(tmp_file.name, width=6*inch, height=3.6*inch)
-                
-                # Clean up temporary file
-                try:
-                    os.unlink(tmp_file.name)
-                except:
-                    pass  # Ignore cleanup errors
-                
-                return chart_img
+            png = get_chart_renderer().render(
+                columns.timestamps, columns.temperature, columns.humidity, max_points=self.chart_max_points
+            )
+            return Image(png, width=6*inch, height=3.6*inch)
             
         except Exception as e:
-            print(f"Chart creation error: {e}")
+            logger.exception(f"Chart creation error: {e}")
             return None
 
-    def _create_table_data(self, weather_data):
+    def _create_table_data(self, columns):
         """Create table data for PDF"""
         table_data = [
             ['Timestamp', 'Temperature (°C)', 'Humidity (%)']
         ]
         
         # Add sample data (first 20 records)
-        for data in weather_data[:20]:
-            temp_str = f'{data.temperature:.1f}' if data.temperature is not None else 'N/A'
-            humidity_str = f'{data.humidity:.1f}' if data.humidity is not None else 'N/A'
+        for timestamp, temperature, humidity in zip(
+            columns.datetimes(0, 20), columns.temperature[:20].tolist(), columns.humidity[:20].tolist()
+        ):
+            temp_str = f'{temperature:.1f}' if temperature == temperature else 'N/A'
+            humidity_str = f'{humidity:.1f}' if humidity == humidity else 'N/A'
             
             table_data.append([
-                data.timestamp.strftime('%Y-%m-%d %H:%M'),
+                timestamp.strftime('%Y-%m-%d %H:%M'),
                 temp_str,
                 humidity_str
             ])
         
-        if len(weather_data) > 20:
-            table_data.append([f'... and {len(weather_data) - 20} more records', '', ''])
+        if len(columns) > 20:
+            table_data.append([f'... and {len(columns) - 20} more records', '', ''])
         
         return table_data
 
-    def _generate_empty_pdf(self):
+    def _generate_empty_pdf(self, generated_at=None):
         """Generate PDF when no data is available"""
         buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
+        doc = SimpleDocTemplate(buffer, pagesize=A4, invariant=generated_at is not None)
         styles = getSampleStyleSheet()
         
         title_style = ParagraphStyle(
@@ -241,7 +227,7 @@ class PDFService:
             Spacer(1, 20),
             Paragraph("No weather data available for the selected time period.", styles['Normal']),
             Spacer(1, 20),
-            Paragraph(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal'])
+            Paragraph(f"Report Generated: {(generated_at or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal'])
         ]
         
         doc.build(story)
@@ -0,0 +1,328 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+logger = logging.getLogger(__name__)
+
+
+class RateBudget:
+    """Token bucket: on average ``per_minute`` acquisitions a minute, in bursts of at most ``burst``"""
+
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stopped):
+        """Take one token, waiting for it; returns the seconds waited, or None once ``stopped`` is set"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate if self.rate > 0 else 1.0
+            if stopped.wait(delay):
+                return None
+            waited += delay
+
+
+class Prefetcher:
+    """Keeps watched locations fresh ahead of requests.
+
+    Locations registered in watched_locations are refreshed through the
+    normal (incremental) ingest path every ``interval`` seconds, shortened
+    by a random ``jitter`` fraction so refreshes of locations registered
+    together spread out instead of arriving at upstream in waves. A
+    dispatcher thread polls for due locations every ``poll`` seconds and
+    hands them, ``chunk_size`` per upstream request, to at most
+    ``concurrency`` workers. Each chunk takes one token from a rate budget
+    of ``rate_per_minute`` upstream requests. Failed refreshes back off
+    exponentially from ``retry`` seconds up to ``interval``.
+
+    ``/weather-report`` answers from the store without calling upstream
+    while a watched location was refreshed less than ``max_age`` seconds
+    ago.
+    """
+
+    def __init__(self, app=None, **options):
+        self.options = {
+            'enabled': True,
+            'interval': 600,
+            'max_age': 900,
+            'jitter': 0.1,
+            'concurrency': 4,
+            'rate_per_minute': 60,
+            'burst': 5,
+            'chunk_size': 50,
+            'poll': 5,
+            'retry': 60,
+            'max_watched': 1000,
+        }
+        self.options.update(options)
+        self.app = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the refresh policy and limits from the app config"""
+        config = app.config
+        self.options.update({
+            'enabled': config.get('PREFETCH_ENABLED', self.options['enabled']),
+            'interval': config.get('PREFETCH_INTERVAL', self.options['interval']),
+            'max_age': config.get('PREFETCH_MAX_AGE', self.options['max_age']),
+            'jitter': config.get('PREFETCH_JITTER', self.options['jitter']),
+            'concurrency': config.get('PREFETCH_MAX_CONCURRENCY', self.options['concurrency']),
+            'rate_per_minute': config.get('PREFETCH_RATE_PER_MINUTE', self.options['rate_per_minute']),
+            'burst': config.get('PREFETCH_RATE_BURST', self.options['burst']),
+            'chunk_size': config.get('PREFETCH_CHUNK_SIZE', self.options['chunk_size']),
+            'poll': config.get('PREFETCH_POLL', self.options['poll']),
+            'retry': config.get('PREFETCH_RETRY', self.options['retry']),
+            'max_watched': config.get('PREFETCH_MAX_WATCHED', self.options['max_watched']),
+        })
+        self.shutdown()
+        self.app = app
+        self._stopped = threading.Event()
+        self._slots = threading.BoundedSemaphore(max(self.options['concurrency'], 1))
+        self._budget = RateBudget(self.options['rate_per_minute'], self.options['burst'])
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(self.options['concurrency'], 1), thread_name_prefix='prefetch'
+        )
+        with self._lock:
+            self._in_flight = set()
+        self._reset_counters()
+        app.extensions['prefetcher'] = self
+
+    def start(self):
+        """Start the dispatcher thread"""
+        if not self.options['enabled'] or self.options['interval'] <= 0:
+            return
+        self._thread = threading.Thread(target=self._loop, name='prefetch-dispatcher', daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # Registry
+
+    def watch(self, coordinates):
+        """Register locations (creating them if needed); returns their WatchedLocation rows, committed.
+
+        Raises ValueError when the registry would grow past ``max_watched``.
+        """
+        from app import db
+        from app.models import WatchedLocation
+        from app.services.storage import get_or_create_location
+
+        grid = self.app.config['COORDINATE_GRID']
+        now = datetime.utcnow()
+        entries = {}
+        for lat, lon in coordinates:
+            location = get_or_create_location(db.session, lat, lon, grid)
+            entry = db.session.get(WatchedLocation, location.id)
+            if entry is None:
+                # First refresh soon, spread over a jitter window
+                spread = random.uniform(0, self.options['interval'] * self.options['jitter'])
+                entry = WatchedLocation(location_id=location.id, next_refresh_at=now + timedelta(seconds=spread))
+                db.session.add(entry)
+            entries[location.id] = entry
+        db.session.flush()
+        total = db.session.scalar(select(func.count()).select_from(WatchedLocation))
+        if total > self.options['max_watched']:
+            db.session.rollback()
+            raise ValueError(f"Too many watched locations: {total} (maximum {self.options['max_watched']})")
+        db.session.commit()
+        return list(entries.values())
+
+    def unwatch(self, location_id):
+        """Remove a location from the registry; returns False if it was not watched"""
+        from app import db
+        from app.models import WatchedLocation
+
+        entry = db.session.get(WatchedLocation, location_id)
+        if entry is None:
+            return False
+        db.session.delete(entry)
+        db.session.commit()
+        return True
+
+    def is_fresh(self, session, location_id):
+        """True when a watched location was refreshed within ``max_age`` seconds"""
+        from app.models import WatchedLocation
+
+        if not self.options['enabled'] or self.options['max_age'] <= 0:
+            return False
+        refreshed = session.scalar(
+            select(WatchedLocation.last_refreshed_at).where(WatchedLocation.location_id == location_id)
+        )
+        return refreshed is not None and refreshed >= datetime.utcnow() - timedelta(seconds=self.options['max_age'])
+
+    # Scheduling
+
+    def run_once(self, now=None):
+        """Dispatch every location due by ``now``, inside an app context; returns the number dispatched"""
+        from app import db
+        from app.models import Location, WatchedLocation
+
+        now = now or datetime.utcnow()
+        with self._lock:
+            in_flight = set(self._in_flight)
+        due = db.session.execute(
+            select(WatchedLocation.location_id, Location.latitude, Location.longitude, WatchedLocation.next_refresh_at)
+            .join(Location, Location.id == WatchedLocation.location_id)
+            .where(WatchedLocation.next_refresh_at <= now)
+            .order_by(WatchedLocation.next_refresh_at)
+        ).all()
+        db.session.rollback()
+        due = [row for row in due if row.location_id not in in_flight]
+
+        chunk_size = max(self.options['chunk_size'], 1)
+        dispatched = 0
+        for start in range(0, len(due), chunk_size):
+            chunk = due[start:start + chunk_size]
+            if not self._acquire_slot():
+                break
+            waited = self._budget.acquire(self._stopped)
+            if waited is None:
+                self._slots.release()
+                break
+            dispatched_at = datetime.utcnow()
+            lag = max((dispatched_at - min(row.next_refresh_at for row in chunk)).total_seconds(), 0.0)
+            with self._lock:
+                self._in_flight.update(row.location_id for row in chunk)
+                counters = self._counters
+                counters['chunks_dispatched'] += 1
+                counters['rate_limited_s'] += waited
+                counters['last_lag_s'] = round(lag, 3)
+                counters['max_lag_s'] = max(counters['max_lag_s'], round(lag, 3))
+                counters['lag_total_s'] += lag
+            self._executor.submit(self._refresh, chunk)
+            dispatched += len(chunk)
+        return dispatched
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters['in_flight'] = len(self._in_flight)
+        chunks = counters['chunks_dispatched']
+        done = counters['chunks_finished']
+        counters['avg_lag_s'] = round(counters.pop('lag_total_s') / chunks, 3) if chunks else None
+        counters['avg_duration_s'] = round(counters.pop('duration_total_s') / done, 3) if done else None
+        counters['rate_limited_s'] = round(counters['rate_limited_s'], 3)
+        counters.update({
+            'enabled': self.options['enabled'],
+            'interval': self.options['interval'],
+            'max_age': self.options['max_age'],
+            'concurrency': self.options['concurrency'],
+            'rate_per_minute': self.options['rate_per_minute'],
+        })
+        return counters
+
+    def _loop(self):
+        stopped = self._stopped
+        while not stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception:
+                logger.exception("Prefetch dispatch failed")
+            stopped.wait(self.options['poll'])
+
+    def _acquire_slot(self):
+        # Blocks while ``concurrency`` chunks are running; returns False when shutting down
+        while not self._slots.acquire(timeout=self.options['poll']):
+            if self._stopped.is_set():
+                return False
+        return True
+
+    def _refresh(self, chunk):
+        from app import db
+        from app.models import WatchedLocation
+        from app.services.ingest import ingest_locations
+
+        started = time.perf_counter()
+        ids = [row.location_id for row in chunk]
+        try:
+            with self.app.app_context():
+                coordinates = [(row.latitude, row.longitude) for row in chunk]
+                try:
+                    results = ingest_locations(coordinates, self.app.extensions['weather_service'])
+                except Exception as e:
+                    db.session.rollback()
+                    results = {location: {'status': 'error', 'error': str(e)} for location in coordinates}
+                duration = time.perf_counter() - started
+
+                now = datetime.utcnow()
+                failed = 0
+                for row, location in zip(chunk, coordinates):
+                    entry = db.session.get(WatchedLocation, row.location_id)
+                    if entry is None:
+                        # Unwatched while refreshing
+                        continue
+                    result = results.get(location, {'status': 'error', 'error': 'No result'})
+                    entry.last_duration_ms = round(duration * 1000, 1)
+                    if result['status'] == 'error':
+                        failed += 1
+                        entry.failures += 1
+                        entry.last_error = result['error']
+                        delay = min(self.options['retry'] * 2 ** (entry.failures - 1), self.options['interval'])
+                    else:
+                        entry.failures = 0
+                        entry.last_error = None
+                        entry.last_refreshed_at = now
+                        delay = self.options['interval']
+                    # Early by up to ``jitter`` of the delay, so refreshes drift apart
+                    delay *= 1 - random.uniform(0, self.options['jitter'])
+                    entry.next_refresh_at = now + timedelta(seconds=delay)
+                db.session.commit()
+            with self._lock:
+                counters = self._counters
+                counters['chunks_finished'] += 1
+                counters['locations_refreshed'] += len(chunk) - failed
+                counters['failures'] += failed
+                counters['last_duration_s'] = round(duration, 3)
+                counters['max_duration_s'] = max(counters['max_duration_s'], round(duration, 3))
+                counters['duration_total_s'] += duration
+                counters['last_run_at'] = now.isoformat()
+                if failed:
+                    counters['last_error'] = next(
+                        result['error'] for result in results.values() if result['status'] == 'error'
+                    )
+        except Exception as e:
+            logger.exception("Prefetch refresh failed")
+            with self._lock:
+                self._counters['failures'] += len(chunk)
+                self._counters['last_error'] = str(e)
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(ids)
+            self._slots.release()
+
+    def _reset_counters(self):
+        with self._lock:
+            self._counters = {
+                'chunks_dispatched': 0, 'chunks_finished': 0,
+                'locations_refreshed': 0, 'failures': 0,
+                'last_lag_s': None, 'max_lag_s': 0.0, 'lag_total_s': 0.0,
+                'last_duration_s': None, 'max_duration_s': 0.0, 'duration_total_s': 0.0,
+                'rate_limited_s': 0.0, 'last_run_at': None, 'last_error': None,
+            }
@@ -0,0 +1,354 @@
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MODES = ('sample', 'cprofile')
+
+# <UTC time>_<route>_<duration>ms_<reason>.<collapsed|pstats>
+PROFILE_NAME = re.compile(r'^(\d{8}T\d{12})_([\w-]+)_(\d+)ms_(sampled|slow)\.(collapsed|pstats)$')
+
+
+def _frame_label(code):
+    # Definition line rather than current line, so samples of one function aggregate
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame):
+    """A frame's stack as one line of the collapsed-stack format, outermost call first"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stacks of registered threads every ``interval`` seconds from one background thread.
+
+    Sampling reads other threads' frames through ``sys._current_frames``,
+    so profiled code runs unmodified; the cost is one stack walk per
+    registered thread per tick, paid by the sampler thread.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the sampling thread unless it is already running in this process"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name='profile-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def begin(self, thread_id=None):
+        """Start collecting samples of a thread (the calling one by default)"""
+        with self._lock:
+            self._targets[thread_id or threading.get_ident()] = Counter()
+        self._wake.set()
+
+    def end(self, thread_id=None):
+        """Stop sampling a thread; returns its Counter of collapsed stacks"""
+        with self._lock:
+            return self._targets.pop(thread_id or threading.get_ident(), Counter())
+
+    def _loop(self):
+        own_id = threading.get_ident()
+        while not self._stopped.is_set():
+            with self._lock:
+                idle = not self._targets
+                if idle:
+                    self._wake.clear()
+            if idle:
+                # Nothing registered: sleep until a thread is
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != own_id:
+                        stacks[collapse_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class _StatsSnapshot:
+    """Adapter so pstats.Stats can load a stats dict returned from another process"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class RequestProfile:
+    """Profiling state of one request; ``reason`` is 'sampled', or None until the request proves slow"""
+
+    __slots__ = ('mode', 'reason', 'thread_id', 'profile', 'stacks', 'worker_stats')
+
+    def __init__(self, mode, reason):
+        self.mode = mode
+        self.reason = reason
+        self.thread_id = threading.get_ident()
+        self.profile = None
+        self.stacks = None
+        # Stacks or pstats dicts sent back by render workers
+        self.worker_stats = []
+
+    def add_worker_profile(self, data):
+        if data:
+            self.worker_stats.append(data)
+
+
+class RequestProfiler:
+    """Opt-in profiling of slow or randomly sampled requests.
+
+    Requests whose path starts with one of ``paths`` (the Excel and PDF
+    exports by default) are profiled when picked with probability
+    ``sample_rate``. In ``sample`` mode a stack sampler thread records the
+    request's stacks every ``interval`` seconds and writes them in the
+    collapsed-stack format (flamegraph.pl, speedscope). With
+    ``capture_slow`` every matching request is sampled and profiles of
+    requests slower than ``slow_threshold`` seconds are kept as well; this
+    costs every matching request the sampler's stack walks (measured by
+    ``benchmarks.bench_profiler``), so it is off by default. ``cprofile``
+    mode runs the deterministic profiler and writes pstats files; its
+    overhead is too high to run on every request, so only sampled requests
+    are profiled and ``capture_slow`` does not apply.
+
+    The sampler thread starts with the first profiled request rather than
+    in ``init_app``, so it runs in the process serving requests and never
+    exists when the render pool or server workers fork.
+
+    PDF reports rendered in the render pool are profiled inside the worker
+    and merged into the request's profile (in ``sample`` mode under a
+    ``render_worker`` root frame). At most ``max_files`` profiles are kept
+    in ``directory``, oldest removed first.
+    """
+
+    def __init__(self, app=None, **options):
+        self.options = {
+            'enabled': False,
+            'mode': 'sample',
+            'sample_rate': 0.01,
+            'capture_slow': False,
+            'slow_threshold': 2.0,
+            'interval': 0.005,
+            'paths': ('/export/excel', '/export/pdf'),
+            'directory': 'profiles',
+            'max_files': 200,
+        }
+        self.options.update(options)
+        self._sampler = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read the profiling policy from the app config; the sampler thread starts on first use"""
+        config = app.config
+        self.options.update({
+            'enabled': config.get('PROFILING_ENABLED', self.options['enabled']),
+            'mode': config.get('PROFILING_MODE', self.options['mode']),
+            'sample_rate': config.get('PROFILING_SAMPLE_RATE', self.options['sample_rate']),
+            'capture_slow': config.get('PROFILING_SLOW_CAPTURE', self.options['capture_slow']),
+            'slow_threshold': config.get('PROFILING_SLOW_THRESHOLD', self.options['slow_threshold']),
+            'interval': config.get('PROFILING_INTERVAL', self.options['interval']),
+            'paths': tuple(config.get('PROFILING_PATHS', self.options['paths'])),
+            'directory': config.get('PROFILING_DIR', self.options['directory']),
+            'max_files': config.get('PROFILING_MAX_FILES', self.options['max_files']),
+        })
+        if self.options['mode'] not in MODES:
+            raise ValueError(f"PROFILING_MODE must be one of: {', '.join(MODES)}")
+        self.shutdown()
+        self._reset_counters()
+        if self.enabled:
+            os.makedirs(self.options['directory'], exist_ok=True)
+            if self.options['mode'] == 'sample':
+                self._sampler = StackSampler(self.options['interval'])
+        app.extensions['profiler'] = self
+
+    @property
+    def enabled(self):
+        return self.options['enabled']
+
+    def shutdown(self):
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler = None
+
+    # Request hooks
+
+    def begin(self, path):
+        """Start profiling the current request if it is eligible; returns a RequestProfile or None"""
+        if not self.enabled or not path.startswith(self.options['paths']):
+            return None
+        sampled = random.random() < self.options['sample_rate']
+        mode = self.options['mode']
+        if mode == 'cprofile':
+            if not sampled:
+                return None
+            handle = RequestProfile(mode, 'sampled')
+            handle.profile = cProfile.Profile()
+            handle.profile.enable()
+        else:
+            if not sampled and not self._captures_slow():
+                return None
+            handle = RequestProfile(mode, 'sampled' if sampled else None)
+            self._sampler.start()
+            self._sampler.begin(handle.thread_id)
+        self._local.current = handle
+        return handle
+
+    def finish(self, handle, route, duration):
+        """Stop profiling and write the profile if it was sampled or slow; returns the file name or None"""
+        self._local.current = None
+        if handle.mode == 'cprofile':
+            handle.profile.disable()
+        else:
+            handle.stacks = self._sampler.end(handle.thread_id)
+        if handle.reason is None and duration >= self.options['slow_threshold']:
+            handle.reason = 'slow'
+        with self._lock:
+            self._counters['profiled'] += 1
+        if handle.reason is None:
+            return None
+        try:
+            name = self._write(handle, route, duration)
+        except Exception:
+            logger.exception("Writing profile failed")
+            with self._lock:
+                self._counters['errors'] += 1
+            return None
+        with self._lock:
+            self._counters[f'saved_{handle.reason}'] += 1
+        self._prune()
+        return name
+
+    def current(self):
+        """The RequestProfile of the request running on this thread, if it is being profiled"""
+        return getattr(self._local, 'current', None)
+
+    # Stored profiles
+
+    def list_profiles(self):
+        """Saved profiles, newest first, with the metadata encoded in their names"""
+        directory = self.options['directory']
+        if not os.path.isdir(directory):
+            return []
+        profiles = []
+        for name in os.listdir(directory):
+            match = PROFILE_NAME.match(name)
+            if match is None:
+                continue
+            created, route, duration_ms, reason, kind = match.groups()
+            profiles.append({
+                'name': name,
+                'created_at': datetime.strptime(created, '%Y%m%dT%H%M%S%f').isoformat(),
+                'route': route,
+                'duration_ms': int(duration_ms),
+                'reason': reason,
+                'format': kind,
+                'size': os.path.getsize(os.path.join(directory, name)),
+            })
+        profiles.sort(key=lambda profile: profile['name'], reverse=True)
+        return profiles
+
+    def profile_path(self, name):
+        """Absolute path of a saved profile, or None for names that are not profiles"""
+        if PROFILE_NAME.match(name) is None:
+            return None
+        path = os.path.join(self.options['directory'], name)
+        return os.path.abspath(path) if os.path.isfile(path) else None
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        counters.update({
+            'enabled': self.enabled,
+            'mode': self.options['mode'],
+            'sample_rate': self.options['sample_rate'],
+            'capture_slow': self._captures_slow(),
+            'slow_threshold': self.options['slow_threshold'],
+            'paths': list(self.options['paths']),
+        })
+        return counters
+
+    def _captures_slow(self):
+        return self.options['mode'] == 'sample' and self.options['capture_slow'] and self.options['slow_threshold'] > 0
+
+    def _write(self, handle, route, duration):
+        slug = re.sub(r'[^\w]+', '-', route).strip('-') or 'root'
+        extension = 'collapsed' if handle.mode == 'sample' else 'pstats'
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{slug}_{round(duration * 1000)}ms_{handle.reason}.{extension}"
+        path = os.path.join(self.options['directory'], name)
+        if handle.mode == 'sample':
+            stacks = Counter(handle.stacks)
+            for worker_stacks in handle.worker_stats:
+                for stack, count in worker_stacks.items():
+                    stacks[f'render_worker;{stack}'] += count
+            with open(path, 'w') as fh:
+                for stack, count in stacks.most_common():
+                    fh.write(f'{stack} {count}\n')
+        else:
+            stats = pstats.Stats(handle.profile)
+            for worker_stats in handle.worker_stats:
+                stats.add(_StatsSnapshot(worker_stats))
+            stats.dump_stats(path)
+        return name
+
+    def _prune(self):
+        profiles = self.list_profiles()
+        for profile in profiles[self.options['max_files']:]:
+            try:
+                os.remove(os.path.join(self.options['directory'], profile['name']))
+            except OSError:
+                pass
+
+    def _reset_counters(self):
+        with self._lock:
+            self._counters = {'profiled': 0, 'saved_sampled': 0, 'saved_slow': 0, 'errors': 0}
+
+
+def profile_call(mode, interval, fn, *args, **kwargs):
+    """Run ``fn`` under the given profiler mode; returns (result, collapsed stacks or pstats dict)
+
+    Used inside render workers, which have no sampler thread of their own.
+    """
+    if mode == 'cprofile':
+        profile = cProfile.Profile()
+        result = profile.runcall(fn, *args, **kwargs)
+        profile.create_stats()
+        return result, profile.stats
+    sampler = StackSampler(interval)
+    sampler.start()
+    sampler.begin()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        stacks = sampler.end()
+        sampler.stop()
+    return result, dict(stacks)
@@ -0,0 +1,254 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+class RenderQueueFull(Exception):
+    """Raised when the render queue is at its configured depth"""
+
+
+class RenderTimeout(Exception):
+    """Raised when a render job does not finish within the configured timeout"""
+
+
+# Worker side: one PDFService per process, created once by the initializer
+
+_worker_service = None
+
+
+def _init_worker(chart_max_points=None):
+    """Import matplotlib/ReportLab and build the PDF service once per worker"""
+    global _worker_service
+    from app.services.pdf_service import PDFService
+    _worker_service = PDFService(chart_max_points=chart_max_points)
+
+
+def _warm_up(_):
+    return multiprocessing.current_process().pid
+
+
+def _render_pdf_job(columns, profile=None):
+    """Render one report; returns (pdf bytes, worker start time, stage timings, profile data)
+
+    ``profile`` is a (mode, interval) pair when the requesting thread is
+    being profiled (see app.services.profiler); the worker then profiles the
+    render and sends the stacks or pstats back.
+    """
+    started = time.time()
+    timings = {}
+    profile_data = None
+    if profile is None:
+        buffer = _worker_service.render(columns, timings=timings)
+    else:
+        from app.services.profiler import profile_call
+        buffer, profile_data = profile_call(*profile, _worker_service.render, columns, timings=timings)
+    timings['render'] = time.time() - started
+    return buffer.getvalue(), started, timings, profile_data
+
+
+class RenderPool:
+    """Process pool that renders PDF reports off the request thread.
+
+    Workers are forked at startup with matplotlib and ReportLab already
+    imported, so a render never holds the web process's GIL and pyplot's
+    global state is only ever touched by one job per process. At most
+    ``queue_depth`` jobs (queued plus running) are accepted; beyond that
+    ``render_pdf`` raises RenderQueueFull. With ``workers=0`` reports are
+    rendered on the calling thread, one at a time.
+
+    A pool whose worker died (OOM kill, segfault) is broken for good, and
+    a job past ``timeout`` would hold its worker and queue slot until it
+    finished, if ever. In both cases the pool is replaced: a fresh one is
+    forked and warmed, then the old workers are terminated, which fails
+    their pending jobs and frees their slots.
+    """
+
+    STAGES = ('queue', 'chart', 'layout', 'render', 'total')
+
+    # Reported to the metrics extension as pdf_<stage>
+    METRIC_STAGES = ('queue', 'chart', 'layout')
+
+    def __init__(self, app=None, **options):
+        self.options = {
+            'workers': 2,
+            'queue_depth': 8,
+            'timeout': 60,
+            'start_method': None,
+            'chart_max_points': None,
+        }
+        self.options.update(options)
+        self._executor = None
+        self._slots = None
+        self._metrics = None
+        self._profiler = None
+        self._inline_lock = threading.Lock()
+        self._restart_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read pool sizing from the app config and pre-warm the workers"""
+        config = app.config
+        self.options.update({
+            'workers': config.get('RENDER_POOL_WORKERS', self.options['workers']),
+            'queue_depth': config.get('RENDER_QUEUE_DEPTH', self.options['queue_depth']),
+            'timeout': config.get('RENDER_JOB_TIMEOUT', self.options['timeout']),
+            'start_method': config.get('RENDER_POOL_START_METHOD', self.options['start_method']),
+            'chart_max_points': config.get('CHART_MAX_POINTS', self.options['chart_max_points']),
+        })
+        self.shutdown()
+        self._reset_counters()
+        self._metrics = app.extensions.get('metrics')
+        self._profiler = app.extensions.get('profiler')
+        self._slots = threading.BoundedSemaphore(max(self.options['queue_depth'], 1))
+        if self.options['workers'] > 0:
+            self.start()
+        app.extensions['render_pool'] = self
+
+    def start(self):
+        """Create the worker processes and wait until each has finished its imports"""
+        self._executor = self._create_executor()
+
+    def _create_executor(self):
+        start_method = self.options['start_method']
+        if start_method is None:
+            # fork avoids re-importing the entry point (run.py builds the app at import time)
+            start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        executor = ProcessPoolExecutor(
+            max_workers=self.options['workers'],
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(self.options['chart_max_points'],)
+        )
+        started = time.perf_counter()
+        pids = set(executor.map(_warm_up, range(self.options['workers'])))
+        logger.info(f"Render pool ready: {len(pids)} workers in {time.perf_counter() - started:.2f}s")
+        return executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _restart(self, executor, reason):
+        """Replace a broken or stuck executor with a new warmed one; no-op if already replaced"""
+        with self._restart_lock:
+            if self._executor is not executor:
+                return
+            logger.warning(f"Restarting render pool: {reason}")
+            self._executor = self._create_executor()
+            # Not public API, but the only handle on a stuck worker
+            processes = list((executor._processes or {}).values())
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            with self._lock:
+                self._counters['restarts'] += 1
+
+    def render_pdf(self, columns):
+        """Render ReportColumns to PDF bytes, waiting for a free worker"""
+        executor, slots = self._executor, self._slots
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise RenderQueueFull(f"Render queue is full ({self.options['queue_depth']} jobs)")
+
+        submitted = time.time()
+        with self._lock:
+            self._counters['submitted'] += 1
+        try:
+            if executor is None:
+                # Inline renders run on the request thread, which a profiler already sees
+                with self._inline_lock:
+                    body, started, timings, _ = _render_inline(columns, self.options['chart_max_points'])
+            else:
+                request_profile = self._profiler.current() if self._profiler is not None else None
+                profile = None
+                if request_profile is not None:
+                    profile = (request_profile.mode, self._profiler.options['interval'])
+                try:
+                    future = executor.submit(_render_pdf_job, columns, profile)
+                except Exception as e:
+                    slots.release()
+                    if isinstance(e, BrokenProcessPool):
+                        self._restart(executor, 'a worker process died')
+                    raise
+                future.add_done_callback(lambda _: slots.release())
+                try:
+                    body, started, timings, profile_data = future.result(timeout=self.options['timeout'])
+                except FutureTimeoutError:
+                    with self._lock:
+                        self._counters['timeouts'] += 1
+                    # Terminating the stuck worker fails the job, which frees its slot
+                    self._restart(executor, f"render exceeded {self.options['timeout']}s")
+                    raise RenderTimeout(f"PDF render did not finish within {self.options['timeout']}s")
+                except BrokenProcessPool:
+                    self._restart(executor, 'a worker process died')
+                    raise
+                if request_profile is not None:
+                    request_profile.add_worker_profile(profile_data)
+        except RenderTimeout:
+            raise
+        except Exception:
+            with self._lock:
+                self._counters['failed'] += 1
+            raise
+        finally:
+            if executor is None:
+                slots.release()
+
+        timings['queue'] = max(started - submitted, 0.0)
+        timings['total'] = time.time() - submitted
+        self._record(timings)
+        return body
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            stages = {
+                stage: {
+                    'avg_ms': round(total / counters['completed'] * 1000, 2) if counters['completed'] else 0.0,
+                    'max_ms': round(self._max[stage] * 1000, 2),
+                }
+                for stage, total in self._totals.items()
+            }
+        counters.update({
+            'workers': self.options['workers'],
+            'queue_depth': self.options['queue_depth'],
+            'in_flight': counters['submitted'] - counters['completed'] - counters['failed'] - counters['timeouts'],
+            'stages': stages,
+        })
+        return counters
+
+    def _record(self, timings):
+        with self._lock:
+            self._counters['completed'] += 1
+            for stage in self.STAGES:
+                value = timings.get(stage, 0.0)
+                self._totals[stage] += value
+                self._max[stage] = max(self._max[stage], value)
+        if self._metrics is not None:
+            for stage in self.METRIC_STAGES:
+                self._metrics.observe_stage(f'pdf_{stage}', timings.get(stage, 0.0))
+
+    def _reset_counters(self):
+        with self._lock:
+            self._counters = {
+                'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'timeouts': 0, 'restarts': 0,
+            }
+            self._totals = dict.fromkeys(self.STAGES, 0.0)
+            self._max = dict.fromkeys(self.STAGES, 0.0)
+
+
+def _render_inline(columns, chart_max_points):
+    if _worker_service is None or _worker_service.chart_max_points != chart_max_points:
+        _init_worker(chart_max_points)
+    return _render_pdf_job(columns)
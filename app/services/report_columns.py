@@ -0,0 +1,47 @@
+import numpy as np
+
+
+class ReportColumns:
+    """Compact column arrays for one report, cheap to pickle to a render worker.
+    
+    ``timestamps`` is a datetime64[s] array and ``temperature``/``humidity``
+    are float arrays with NaN for missing values. ``location`` is the
+    (lat, lon) every row belongs to, or None for several locations.
+    ``stats`` is an optional rollups.WindowStats for the same rows.
+    ``generated_at`` is the time the report states it was generated
+    (default: when it is rendered).
+    """
+    
+    __slots__ = ('timestamps', 'temperature', 'humidity', 'location', 'is_forecast', 'stats', 'generated_at')
+    
+    def __init__(self, timestamps, temperature, humidity, location=None, is_forecast=False, stats=None,
+                 generated_at=None):
+        self.timestamps = timestamps
+        self.temperature = temperature
+        self.humidity = humidity
+        self.location = location
+        self.is_forecast = is_forecast
+        self.stats = stats
+        self.generated_at = generated_at
+    
+    @classmethod
+    def from_rows(cls, rows, location=None, stats=None, generated_at=None):
+        """Build columns from WeatherData objects or flat export query rows"""
+        rows = list(rows)
+        if location is None and rows and len({row.location_id for row in rows}) == 1:
+            location = (rows[0].latitude, rows[0].longitude)
+        return cls(
+            np.array([row.timestamp for row in rows], dtype='datetime64[s]'),
+            np.array([row.temperature for row in rows], dtype=float),
+            np.array([row.humidity for row in rows], dtype=float),
+            location,
+            bool(getattr(rows[0], 'is_forecast', True)) if rows else False,
+            stats,
+            generated_at
+        )
+    
+    def __len__(self):
+        return len(self.timestamps)
+    
+    def datetimes(self, start=0, stop=None):
+        return self.timestamps[start:stop].tolist()
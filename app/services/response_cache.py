@@ -0,0 +1,283 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from app.services.geo import snap_coordinates
+
+logger = logging.getLogger(__name__)
+
+# Upstream format for start_hour/end_hour
+HOUR_FORMAT = "%Y-%m-%dT%H:%M"
+
+
+def day_segments(span):
+    """Split a (start, end) date or hour span into one span per local day, in order.
+
+    Date spans give ``('2024-01-01', '2024-01-01')`` style days; hour spans
+    are clipped to the span at its first and last day.
+    """
+    start, end = span
+    if "T" not in start:
+        first, last = date.fromisoformat(start), date.fromisoformat(end)
+        return [(day.isoformat(), day.isoformat()) for day in _days(first, last)]
+    first, last = datetime.strptime(start, HOUR_FORMAT), datetime.strptime(end, HOUR_FORMAT)
+    segments = []
+    for day in _days(first.date(), last.date()):
+        day_start = datetime(day.year, day.month, day.day)
+        segments.append((
+            max(first, day_start).strftime(HOUR_FORMAT),
+            min(last, day_start + timedelta(hours=23)).strftime(HOUR_FORMAT),
+        ))
+    return segments
+
+
+def _days(first, last):
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def split_by_day(payload):
+    """Split an Open-Meteo payload into one payload per local day, keyed by 'YYYY-MM-DD'"""
+    hourly = payload.get("hourly") or {}
+    times = hourly.get("time") or []
+    pieces = {}
+    start = 0
+    for index in range(1, len(times) + 1):
+        if index == len(times) or times[index][:10] != times[start][:10]:
+            piece = dict(payload)
+            piece["hourly"] = {name: values[start:index] for name, values in hourly.items()}
+            pieces[times[start][:10]] = piece
+            start = index
+    return pieces
+
+
+def merge_days(pieces):
+    """Join consecutive per-day payloads back into one; top-level fields come from the last"""
+    merged = dict(pieces[-1])
+    merged["hourly"] = {
+        name: [value for piece in pieces for value in piece["hourly"].get(name, [])]
+        for name in pieces[-1]["hourly"]
+    }
+    return merged
+
+
+class ResponseCache:
+    """Two-tier TTL cache for upstream Open-Meteo responses.
+
+    The first tier is an in-process LRU bounded by entry count and payload
+    bytes; the optional second tier stores JSON files on disk so cached
+    history survives restarts. Keys are built from grid-snapped coordinates
+    and a window of at most one local day: callers store each day of a
+    response separately (see ``day_segments``/``split_by_day``), so
+    finished days keep ``past_ttl`` while only the current day expires
+    quickly.
+    """
+
+    def __init__(self, app=None, **options):
+        self.options = {
+            'enabled': True,
+            'max_entries': 1024,
+            'max_bytes': 32 * 1024 * 1024,
+            'disk_dir': None,
+            'grid': 0.01,
+            'past_ttl': 30 * 24 * 3600,
+            'current_ttl': 600,
+        }
+        self.options.update(options)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read cache limits and TTLs from the app config"""
+        config = app.config
+        self.options.update({
+            'enabled': config.get('RESPONSE_CACHE_ENABLED', self.options['enabled']),
+            'max_entries': config.get('RESPONSE_CACHE_MAX_ENTRIES', self.options['max_entries']),
+            'max_bytes': config.get('RESPONSE_CACHE_MAX_BYTES', self.options['max_bytes']),
+            'disk_dir': config.get('RESPONSE_CACHE_DIR', self.options['disk_dir']),
+            'grid': config.get('COORDINATE_GRID', self.options['grid']),
+            'past_ttl': config.get('RESPONSE_CACHE_PAST_TTL', self.options['past_ttl']),
+            'current_ttl': config.get('RESPONSE_CACHE_CURRENT_TTL', self.options['current_ttl']),
+        })
+        self.clear()
+        app.extensions['response_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.options['enabled']
+
+    def snap(self, lat, lon):
+        return snap_coordinates(lat, lon, self.options['grid'])
+
+    def make_key(self, lat, lon, start_date, end_date):
+        """Build a cache key from snapped coordinates and the date window"""
+        lat, lon = self.snap(lat, lon)
+        return f"{lat:.6f}_{lon:.6f}_{start_date}_{end_date}"
+
+    def ttl_for(self, day, local_now=None, settle=timedelta(0)):
+        """Long TTL for a finished local day, short otherwise.
+
+        With the location's current time, a day is finished once it ended
+        ``settle`` ago (upstream may revise the last hours for a while).
+        Without it, server and location dates may differ by a day, so only
+        days before yesterday count as finished.
+        """
+        if isinstance(day, str):
+            day = date.fromisoformat(day[:10])
+        if local_now is None:
+            finished = day < date.today() - timedelta(days=1)
+        else:
+            finished = datetime(day.year, day.month, day.day) + timedelta(days=1) + settle <= local_now
+        return self.options['past_ttl'] if finished else self.options['current_ttl']
+
+    def get(self, key):
+        """Return a cached payload or None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, size, payload = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return payload
+                self._remove(key)
+
+        payload, expires_at = self._disk_get(key, now)
+        with self._lock:
+            if payload is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['disk_hits'] += 1
+            self._store(key, payload, expires_at)
+        return payload
+
+    def set(self, key, payload, ttl):
+        """Store a payload in both tiers"""
+        if not self.enabled or ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._store(key, payload, expires_at)
+        self._disk_set(key, payload, expires_at)
+
+    def invalidate(self, lat=None, lon=None):
+        """Drop cached responses for one location, or everything when no location is given"""
+        if lat is None or lon is None:
+            return self.clear(disk=True)
+        lat, lon = self.snap(lat, lon)
+        prefix = f"{lat:.6f}_{lon:.6f}_"
+        removed = 0
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._remove(key)
+                removed += 1
+        removed += self._disk_remove(prefix)
+        return removed
+
+    def clear(self, disk=False):
+        """Empty the memory tier (and optionally the disk tier)"""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+        if disk:
+            removed += self._disk_remove('')
+        return removed
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+            size = self._bytes
+        lookups = counters['memory_hits'] + counters['disk_hits'] + counters['misses']
+        hits = counters['memory_hits'] + counters['disk_hits']
+        counters.update({
+            'entries': entries,
+            'bytes': size,
+            'hit_ratio': hits / lookups if lookups else 0.0,
+            'memory_hit_ratio': counters['memory_hits'] / lookups if lookups else 0.0,
+        })
+        return counters
+
+    # Memory tier (callers hold self._lock)
+
+    def _store(self, key, payload, expires_at):
+        size = len(json.dumps(payload, separators=(',', ':')))
+        if size > self.options['max_bytes']:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, size, payload)
+        self._bytes += size
+        while (len(self._entries) > self.options['max_entries']
+               or self._bytes > self.options['max_bytes']):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._counters['evictions'] += 1
+
+    def _remove(self, key):
+        expires_at, size, payload = self._entries.pop(key)
+        self._bytes -= size
+
+    # Disk tier
+
+    def _disk_path(self, key):
+        return os.path.join(self.options['disk_dir'], f"{key}.json")
+
+    def _disk_get(self, key, now):
+        if not self.options['disk_dir']:
+            return None, None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as fh:
+                record = json.load(fh)
+        except FileNotFoundError:
+            return None, None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache file {path}: {e}")
+            self._unlink(path)
+            return None, None
+        if record.get('expires_at', 0) <= now:
+            self._unlink(path)
+            return None, None
+        return record['payload'], record['expires_at']
+
+    def _disk_set(self, key, payload, expires_at):
+        if not self.options['disk_dir']:
+            return
+        try:
+            os.makedirs(self.options['disk_dir'], exist_ok=True)
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                json.dump({'expires_at': expires_at, 'payload': payload}, fh)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache file for {key}: {e}")
+
+    def _disk_remove(self, prefix):
+        disk_dir = self.options['disk_dir']
+        if not disk_dir or not os.path.isdir(disk_dir):
+            return 0
+        removed = 0
+        for name in os.listdir(disk_dir):
+            if name.startswith(prefix) and name.endswith('.json'):
+                self._unlink(os.path.join(disk_dir, name))
+                removed += 1
+        return removed
+
+    def _unlink(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,290 @@
+"""Daily rollups of weather_data.
+
+``weather_daily_rollups`` keeps the row count and the count, sum, min and
+max of temperature and humidity per location and day. Ingest refreshes the
+days it wrote in the same transaction, so a summary over a long window
+reads one rollup row per day plus at most two partial days of raw rows.
+
+Check the rollups against the raw rows (exits 1 on any mismatch), or
+rebuild them from scratch::
+
+    python -m app.services.rollups [--rebuild] [instance/weather.db]
+"""
+import argparse
+import logging
+import math
+import sys
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.orm import Session
+
+from app.models import WeatherDailyRollup, WeatherData
+
+logger = logging.getLogger(__name__)
+
+
+class RunningStats:
+    """Count, min, max and mean of a stream of values, ignoring None"""
+
+    __slots__ = ('count', 'minimum', 'maximum', 'total')
+
+    def __init__(self):
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+
+    def add(self, value):
+        if value is None:
+            return
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, count, total, minimum, maximum):
+        """Fold in an aggregate (count, sum, min, max) of more values"""
+        if not count:
+            return
+        self.count += count
+        self.total += total
+        if self.minimum is None or minimum < self.minimum:
+            self.minimum = minimum
+        if self.maximum is None or maximum > self.maximum:
+            self.maximum = maximum
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'min': self.minimum,
+            'max': self.maximum,
+            'avg': round(self.mean, 2) if self.count else None,
+        }
+
+
+class WindowStats:
+    """Row count plus temperature and humidity stats over some set of rows"""
+
+    __slots__ = ('records', 'temperature', 'humidity')
+
+    def __init__(self):
+        self.records = 0
+        self.temperature = RunningStats()
+        self.humidity = RunningStats()
+
+    def merge(self, aggregates):
+        """Fold in one row of ``aggregate_columns``/WeatherDailyRollup.AGGREGATES values"""
+        records, *rest = aggregates
+        if not records:
+            return
+        self.records += records
+        self.temperature.merge(*rest[0:4])
+        self.humidity.merge(*rest[4:8])
+
+    def add(self, other):
+        """Fold in another WindowStats"""
+        self.records += other.records
+        for mine, theirs in ((self.temperature, other.temperature), (self.humidity, other.humidity)):
+            mine.merge(theirs.count, theirs.total, theirs.minimum, theirs.maximum)
+
+    def to_dict(self):
+        return {
+            'records': self.records,
+            'temperature': self.temperature.to_dict(),
+            'humidity': self.humidity.to_dict(),
+        }
+
+
+def aggregate_columns(model=WeatherData):
+    """SQL aggregates of raw rows, in WeatherDailyRollup.AGGREGATES order"""
+    return (
+        func.count(),
+        func.count(model.temperature), func.sum(model.temperature),
+        func.min(model.temperature), func.max(model.temperature),
+        func.count(model.humidity), func.sum(model.humidity),
+        func.min(model.humidity), func.max(model.humidity),
+    )
+
+
+def _combined_rollup_columns():
+    """SQL aggregates that combine several rollup rows"""
+    r = WeatherDailyRollup
+    return (
+        func.sum(r.records),
+        func.sum(r.temperature_count), func.sum(r.temperature_sum),
+        func.min(r.temperature_min), func.max(r.temperature_max),
+        func.sum(r.humidity_count), func.sum(r.humidity_sum),
+        func.min(r.humidity_min), func.max(r.humidity_max),
+    )
+
+
+def _day_start(day):
+    return datetime.combine(day, time.min)
+
+
+def _insert_rollups(session, *criteria):
+    """INSERT ... SELECT the rollups of the raw rows matching ``criteria``"""
+    day = func.date(WeatherData.timestamp)
+    rows = (
+        select(WeatherData.location_id, day, *aggregate_columns())
+        .where(*criteria)
+        .group_by(WeatherData.location_id, day)
+    )
+    columns = ('location_id', 'day') + WeatherDailyRollup.AGGREGATES
+    return session.execute(WeatherDailyRollup.__table__.insert().from_select(columns, rows)).rowcount
+
+
+def refresh_daily_rollups(session, location_id, days):
+    """Recompute one location's rollups for the span of ``days`` from weather_data; caller commits
+
+    Runs in the ingest transaction, so readers never see rows and rollups
+    disagree. Returns the number of rollup rows written.
+    """
+    if not days:
+        return 0
+    first, last = min(days), max(days)
+    table = WeatherDailyRollup.__table__
+    session.execute(delete(table).where(table.c.location_id == location_id, table.c.day.between(first, last)))
+    return _insert_rollups(
+        session,
+        WeatherData.location_id == location_id,
+        WeatherData.timestamp >= _day_start(first),
+        WeatherData.timestamp < _day_start(last + timedelta(days=1))
+    )
+
+
+def rebuild_daily_rollups(session):
+    """Replace every rollup with one computed from weather_data; caller commits"""
+    session.execute(delete(WeatherDailyRollup.__table__))
+    return _insert_rollups(session)
+
+
+def summarize_window(session, start, end=None, location_id=None):
+    """WindowStats for rows with ``start <= timestamp < end`` (no upper bound if ``end`` is None).
+
+    Whole days come from the rollups; only the partial days at either edge
+    are aggregated from raw rows. Without ``location_id`` all locations are
+    combined. Like the raw rows themselves, the result leaves out days that
+    compaction has already removed from weather_data.
+    """
+    stats = WindowStats()
+    earliest = select(func.min(WeatherData.timestamp))
+    if location_id is not None:
+        earliest = earliest.where(WeatherData.location_id == location_id)
+    earliest = session.scalar(earliest)
+    if earliest is None:
+        return stats
+    start = max(start, earliest)
+    first_full_day = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    head_end = _day_start(first_full_day)
+
+    if end is not None and end <= head_end:
+        stats.merge(_raw_aggregates(session, location_id, start, end))
+        return stats
+
+    if start < head_end:
+        stats.merge(_raw_aggregates(session, location_id, start, head_end))
+
+    criteria = [WeatherDailyRollup.day >= first_full_day]
+    if end is not None:
+        criteria.append(WeatherDailyRollup.day < end.date())
+    if location_id is not None:
+        criteria.append(WeatherDailyRollup.location_id == location_id)
+    stats.merge(session.execute(select(*_combined_rollup_columns()).where(*criteria)).one())
+
+    if end is not None and end > _day_start(end.date()):
+        stats.merge(_raw_aggregates(session, location_id, _day_start(end.date()), end))
+    return stats
+
+
+def _raw_aggregates(session, location_id, start, end):
+    stmt = select(*aggregate_columns()).where(WeatherData.timestamp >= start, WeatherData.timestamp < end)
+    if location_id is not None:
+        stmt = stmt.where(WeatherData.location_id == location_id)
+    return session.execute(stmt).one()
+
+
+def daily_stats(session, first_day, last_day, location_id=None):
+    """[(day, WindowStats)] for each day in [first_day, last_day] that has data"""
+    r = WeatherDailyRollup
+    stmt = (
+        select(r.day, *_combined_rollup_columns())
+        .where(r.day.between(first_day, last_day))
+        .group_by(r.day)
+        .order_by(r.day)
+    )
+    if location_id is not None:
+        stmt = stmt.where(r.location_id == location_id)
+    days = []
+    for day, *aggregates in session.execute(stmt):
+        stats = WindowStats()
+        stats.merge(aggregates)
+        days.append((day, stats))
+    return days
+
+
+def verify_rollups(session, location_id=None):
+    """Compare rollups with aggregates of the raw rows; returns a list of mismatches.
+
+    Each mismatch is a dict with ``location_id``, ``day`` and the
+    ``expected`` and ``actual`` aggregate tuples (None when the row is
+    missing). Sums are compared with a small tolerance. Rollups of days
+    before a location's first raw row are history kept after compaction and
+    are not checked.
+    """
+    day = func.date(WeatherData.timestamp)
+    raw = select(WeatherData.location_id, day, *aggregate_columns()).group_by(WeatherData.location_id, day)
+    r = WeatherDailyRollup
+    stored = select(r.location_id, r.day, *(getattr(r, name) for name in r.AGGREGATES))
+    if location_id is not None:
+        raw = raw.where(WeatherData.location_id == location_id)
+        stored = stored.where(r.location_id == location_id)
+
+    expected = {(row[0], row[1]): tuple(row[2:]) for row in session.execute(raw)}
+    actual = {(row[0], row[1].isoformat()): tuple(row[2:]) for row in session.execute(stored)}
+    first_raw_day = {}
+    for location, day_text in expected:
+        first_raw_day[location] = min(day_text, first_raw_day.get(location, day_text))
+
+    mismatches = []
+    for key in sorted(expected.keys() | actual.keys()):
+        want, got = expected.get(key), actual.get(key)
+        if want is None and key[1] < first_raw_day.get(key[0], '9999-12-31'):
+            continue
+        if want is None or got is None or not all(map(_same_value, want, got)):
+            mismatches.append({'location_id': key[0], 'day': key[1], 'expected': want, 'actual': got})
+    return mismatches
+
+
+def _same_value(a, b):
+    if a is None or b is None:
+        return a is b
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+
+
+if __name__ == '__main__':
+    from app.config import DB_PATH
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Verify or rebuild weather_daily_rollups')
+    parser.add_argument('path', nargs='?', default=DB_PATH)
+    parser.add_argument('--rebuild', action='store_true', help='recompute every rollup from weather_data')
+    args = parser.parse_args()
+
+    with Session(create_engine(f"sqlite:///{args.path}")) as session:
+        if args.rebuild:
+            written = rebuild_daily_rollups(session)
+            session.commit()
+            logger.info(f"Rebuilt {written} daily rollups")
+        mismatches = verify_rollups(session)
+    for mismatch in mismatches[:20]:
+        logger.error(f"Rollup mismatch: {mismatch}")
+    logger.info(f"{len(mismatches)} mismatched daily rollups")
+    sys.exit(1 if mismatches else 0)
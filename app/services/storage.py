@@ -0,0 +1,259 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, inspect, or_, select, text, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models import Location, WeatherData
+from app.services.geo import snap_coordinates
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany call; keeps parameter buffers bounded on very large loads
+UPSERT_CHUNK_SIZE = 10000
+
+# Keys per IN (...) list when looking up many locations at once
+LOOKUP_CHUNK_SIZE = 500
+
+# Ingest covers this many past local days plus today
+INGEST_PAST_DAYS = 2
+
+
+def build_upsert(table, key_columns, update_columns):
+    """Build an INSERT ... ON CONFLICT DO UPDATE for SQLite.
+
+    Conflicting rows are only rewritten when one of ``update_columns``
+    actually changed, so re-ingesting identical hours touches no pages.
+    """
+    stmt = sqlite_insert(table)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c[name] for name in key_columns],
+        set_={name: excluded[name] for name in update_columns},
+        where=or_(*[table.c[name].is_distinct_from(excluded[name]) for name in update_columns])
+    )
+
+
+def upsert_rows(session, table, rows, key_columns, update_columns):
+    """Upsert a list of row dicts with executemany; returns rows inserted or changed"""
+    if not rows:
+        return 0
+    stmt = build_upsert(table, key_columns, update_columns)
+    written = 0
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        result = session.execute(stmt, rows[start:start + UPSERT_CHUNK_SIZE])
+        written += max(result.rowcount, 0)
+    return written
+
+
+def ensure_unique_index(engine, table, index_name):
+    """Create a declared unique index on an existing table, dropping later duplicate rows first.
+
+    ``create_all`` only builds indexes together with new tables, so
+    databases created before the index was declared need this once. The
+    first stored row of each key is kept, since that is the one lookups
+    returned before the index existed; the number of rows dropped is logged.
+    """
+    existing = {ix['name'] for ix in inspect(engine).get_indexes(table.name)}
+    if index_name in existing:
+        return False
+
+    index = next(ix for ix in table.indexes if ix.name == index_name)
+    key = ', '.join(column.name for column in index.columns)
+    with engine.begin() as conn:
+        # Keep the first inserted row for each key
+        result = conn.execute(text(
+            f"DELETE FROM {table.name} WHERE id NOT IN "
+            f"(SELECT MIN(id) FROM {table.name} GROUP BY {key})"
+        ))
+        if result.rowcount:
+            logger.warning(
+                "Dropped %d duplicate %s rows before creating %s", result.rowcount, table.name, index_name
+            )
+        index.create(conn)
+    return True
+
+
+def find_location(session, lat, lon, grid):
+    """Return the Location for the grid cell containing (lat, lon), or None"""
+    lat, lon = snap_coordinates(lat, lon, grid)
+    return session.scalars(
+        select(Location).where(Location.latitude == lat, Location.longitude == lon)
+    ).first()
+
+
+def get_or_create_location(session, lat, lon, grid):
+    """Return the Location for (lat, lon), inserting it if this grid cell is new"""
+    location = find_location(session, lat, lon, grid)
+    if location is None:
+        snapped_lat, snapped_lon = snap_coordinates(lat, lon, grid)
+        now = datetime.utcnow()
+        # ON CONFLICT DO NOTHING: a concurrent ingest may have created it meanwhile
+        session.execute(
+            sqlite_insert(Location.__table__)
+            .values(latitude=snapped_lat, longitude=snapped_lon, created_at=now, updated_at=now)
+            .on_conflict_do_nothing(index_elements=['latitude', 'longitude'])
+        )
+        location = find_location(session, lat, lon, grid)
+    return location
+
+
+def find_locations(session, coordinates, grid):
+    """Return the Location (or None) for each (lat, lon), looked up in a few IN queries"""
+    snapped = [snap_coordinates(lat, lon, grid) for lat, lon in coordinates]
+    unique = list(dict.fromkeys(snapped))
+    found = {}
+    for start in range(0, len(unique), LOOKUP_CHUNK_SIZE):
+        chunk = unique[start:start + LOOKUP_CHUNK_SIZE]
+        for location in session.scalars(
+            select(Location).where(tuple_(Location.latitude, Location.longitude).in_(chunk))
+        ):
+            found[(location.latitude, location.longitude)] = location
+    return [found.get(key) for key in snapped]
+
+
+def location_local_now(location, now=None):
+    """Current wall-clock time at a location, in the local time stored timestamps use"""
+    if location is None or location.utc_offset_seconds is None:
+        # Offset not known until the first ingest: use the server clock, as the date window always did
+        return datetime.now()
+    return (now or datetime.utcnow()) + timedelta(seconds=location.utc_offset_seconds)
+
+
+def ingest_window(local_now, past_days=INGEST_PAST_DAYS):
+    """First and last hour (inclusive) ingest covers: ``past_days`` ago at 00:00 to 23:00 today"""
+    today = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=past_days), today + timedelta(hours=23)
+
+
+def plan_fetch_windows(session, locations, now=None):
+    """Hours each location still needs from upstream: a (first, last) hour pair, or None when up to date.
+
+    ``locations`` may contain None for locations never ingested, which need
+    the whole ingest window. An hour is done once it is stored as final
+    (``is_forecast`` False) with both values present; forecast, provisional
+    and missing hours are fetched again. Upstream takes a single
+    ``start_hour``/``end_hour`` per request, so the gaps of one location
+    are covered by one contiguous range.
+    """
+    windows = [ingest_window(location_local_now(location, now)) for location in locations]
+    ids = [location.id for location in locations if location is not None]
+    final = {}
+    if ids:
+        first_hour = min(first for first, last in windows)
+        last_hour = max(last for first, last in windows)
+        for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+            rows = session.execute(
+                select(WeatherData.location_id, WeatherData.timestamp).where(
+                    WeatherData.location_id.in_(ids[start:start + LOOKUP_CHUNK_SIZE]),
+                    WeatherData.timestamp.between(first_hour, last_hour),
+                    WeatherData.is_forecast.is_(False),
+                    WeatherData.temperature.is_not(None),
+                    WeatherData.humidity.is_not(None)
+                )
+            )
+            for location_id, timestamp in rows:
+                final.setdefault(location_id, set()).add(timestamp)
+
+    plans = []
+    for location, (first, last) in zip(locations, windows):
+        done = final.get(location.id, ()) if location is not None else ()
+        hours = (first + timedelta(hours=i) for i in range(int((last - first) / timedelta(hours=1)) + 1))
+        needed = [hour for hour in hours if hour not in done]
+        plans.append((needed[0], needed[-1]) if needed else None)
+    return plans
+
+
+def resolve_export_location(session, lat, lon, location_id, grid):
+    """Return (location, found) for export filters.
+
+    ``location`` is None for unscoped exports; ``found`` is False when the
+    filters name a location that has never been ingested.
+    """
+    location = None
+    if location_id is not None:
+        location = session.get(Location, location_id)
+    elif lat is not None:
+        location = find_location(session, lat, lon, grid)
+    return location, location is not None or (location_id is None and lat is None)
+
+
+def export_window_start(hours, now=None):
+    """Start of an export window: ``hours`` back from now, rounded up to the hour.
+
+    Rows are hourly, so this selects the same rows as the exact threshold
+    while staying constant for the whole hour, which keeps export cache
+    keys stable between ingests.
+    """
+    threshold = (now or datetime.utcnow()) - timedelta(hours=hours)
+    floored = threshold.replace(minute=0, second=0, microsecond=0)
+    return floored if floored == threshold else floored + timedelta(hours=1)
+
+
+def export_data_version(session, location=None):
+    """Cheap token that changes whenever an export's rows may have changed.
+
+    Ingest bumps ``Location.updated_at`` whenever it writes rows, so a
+    scoped export is versioned by its location and an unscoped one by the
+    newest ``updated_at`` and the number of locations.
+    """
+    if location is not None:
+        return f"{location.id}@{location.updated_at.isoformat()}"
+    count, latest = session.execute(
+        select(func.count(Location.id), func.max(Location.updated_at))
+    ).one()
+    return f"{count}@{latest.isoformat() if latest else '-'}"
+
+
+def export_generated_at(session, location=None):
+    """Time shown as an export's generation time: when its data last changed, or None.
+
+    Uses the same ``Location.updated_at`` as ``export_data_version``, so
+    every render of one cache key produces the same bytes.
+    """
+    if location is not None:
+        return location.updated_at
+    return session.scalar(select(func.max(Location.updated_at)))
+
+
+def build_export_query(model, hours, location_id=None, now=None):
+    """Select the rows of the last ``hours`` hours, optionally for one location.
+
+    With a location this is a range scan on the (location_id, timestamp)
+    unique index, already in timestamp order, so other locations' rows are
+    never visited.
+    """
+    time_threshold = export_window_start(hours, now)
+    stmt = select(model)
+    if location_id is not None:
+        stmt = stmt.where(model.location_id == location_id)
+    return stmt.where(model.timestamp >= time_threshold).order_by(model.timestamp)
+
+
+def build_flat_export_query(model, hours, location_id=None, now=None):
+    """Like ``build_export_query`` but selects plain columns plus the location's coordinates.
+
+    Meant for streaming exports: rows come back as tuples, so no ORM objects
+    are built and no per-row lazy load of the location happens.
+    """
+    stmt = build_export_query(model, hours, location_id, now)
+    return stmt.with_only_columns(
+        model.location_id,
+        Location.latitude,
+        Location.longitude,
+        model.timestamp,
+        model.temperature,
+        model.humidity,
+        model.is_forecast,
+    ).join(Location, model.location_id == Location.id)
+
+
+def explain_query_plan(session, stmt):
+    """Return SQLite's EXPLAIN QUERY PLAN detail lines for a statement"""
+    compiled = stmt.compile(bind=session.get_bind())
+    params = tuple(
+        value.isoformat(' ') if isinstance(value, datetime) else value
+        for value in (compiled.params[name] for name in compiled.positiontup)
+    )
+    rows = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [row[-1] for row in rows]
@@ -0,0 +1,134 @@
+"""Row-streaming CSV, NDJSON and Parquet exports.
+
+Each writer takes an iterable of row chunks (``Result.partitions()`` over a
+``build_flat_export_query`` result) and yields encoded bytes one chunk at a
+time, so nothing holds more than one chunk of rows in memory.
+"""
+import csv
+import io
+import json
+
+FIELDS = (
+    'location_id',
+    'latitude',
+    'longitude',
+    'timestamp',
+    'temperature_2m',
+    'relative_humidity_2m',
+    'is_forecast',
+)
+
+TIMESTAMP_INDEX = FIELDS.index('timestamp')
+
+
+def _isoformat_rows(rows):
+    for row in rows:
+        row = list(row)
+        row[TIMESTAMP_INDEX] = row[TIMESTAMP_INDEX].isoformat()
+        yield row
+
+
+def iter_csv(chunks):
+    """Yield a header line, then one block of CSV lines per chunk of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(FIELDS)
+    for rows in chunks:
+        writer.writerows(_isoformat_rows(rows))
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(chunks):
+    """Yield one block of newline-delimited JSON objects per chunk of rows"""
+    for rows in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(FIELDS, row)), separators=(',', ':')) + '\n'
+            for row in _isoformat_rows(rows)
+        ).encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator.
+    
+    Parquet records absolute offsets in its footer, so ``tell`` keeps
+    counting across drains.
+    """
+    
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_schema():
+    import pyarrow as pa
+    
+    return pa.schema([
+        ('location_id', pa.int64()),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('timestamp', pa.timestamp('us')),
+        ('temperature_2m', pa.float64()),
+        ('relative_humidity_2m', pa.float64()),
+        ('is_forecast', pa.bool_()),
+    ])
+
+
+def parquet_available():
+    """pyarrow is optional and only imported once a Parquet export is requested"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def iter_parquet(chunks):
+    """Yield a Parquet file with one row group per chunk of rows"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='snappy')
+    try:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+FORMATS = {
+    'csv': (iter_csv, 'text/csv', 'weather_data.csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson', 'weather_data.ndjson'),
+    'parquet': (iter_parquet, 'application/vnd.apache.parquet', 'weather_data.parquet'),
+}
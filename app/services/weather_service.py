@@ -1,41 +1,164 @@
+import numpy as np
 import requests
 from datetime import datetime, timedelta
 from flask import current_app
 import logging
+from contextlib import nullcontext
+
+from app.services.http_client import HTTPClient
+from app.services.response_cache import day_segments, merge_days, split_by_day
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BASE_URL = "https://api.open-meteo.com/v1/forecast"
+
+# Upstream format for start_hour/end_hour, in the location's local time
+HOUR_FORMAT = "%Y-%m-%dT%H:%M"
+
+
+def get_weather_service():
+    """Return the app-scoped WeatherService created by ``create_app``"""
+    return current_app.extensions['weather_service']
+
+
 class WeatherService:
-    def __init__(self):
+    def __init__(self, http_client=None, base_url=None, cache=None, provisional_hours=6, metrics=None):
         # Use MeteoSwiss API as specified in requirements
-        self.base_url = "https://api.open-meteo.com/v1/forecast"
+        self.base_url = base_url or DEFAULT_BASE_URL
+        self.http_client = http_client or HTTPClient()
+        self.cache = cache
+        # Optional app.services.metrics.Metrics for stage timings and upstream errors
+        self.metrics = metrics
+        # Recent hours upstream may still revise; stored as provisional and fetched again
+        self.provisional_hours = provisional_hours
+    
+    def fetch_weather_data(self, lat, lon, window=None):
+        """Fetch weather data from Open-Meteo MeteoSwiss API for past 2 days, or just ``window``"""
+        return self.fetch_weather_data_batch([(lat, lon)], None if window is None else [window])[0]
     
-    def fetch_weather_data(self, lat, lon):
-        """Fetch weather data from Open-Meteo MeteoSwiss API for past 2 days"""
-        # Calculate date range for past 2 days
+    def fetch_weather_data_batch(self, locations, windows=None):
+        """Fetch the past 2 days for several locations in as few upstream requests as possible
+        
+        Open-Meteo accepts comma-separated coordinates and answers with one
+        payload per location, in request order. Cached locations are served
+        locally and left out of the upstream request.
+        
+        ``windows`` optionally gives each location a (first, last) local hour
+        to fetch instead of the whole date range (None keeps the range), as
+        planned by ``storage.plan_fetch_windows``. Locations sharing a window
+        share one request.
+        
+        The cache holds one entry per local day. Leading days found there
+        are not requested again; the request covers the first missing day to
+        the end of the window, and the cached days are joined back in front.
+        """
+        # Calculate date range for past 2 days, used where no window is given
         end_date = datetime.now().date()
         start_date = end_date - timedelta(days=2)
+        if windows is None:
+            windows = [None] * len(locations)
         
+        payloads = [None] * len(locations)
+        # Per location: cache key of each day still to fetch, and the cached days before them
+        cache_keys = [None] * len(locations)
+        cached_days = [None] * len(locations)
+        coordinates = list(locations)
+        missing = {}
+        
+        for i, (lat, lon) in enumerate(locations):
+            if windows[i] is None:
+                span = (start_date.isoformat(), end_date.isoformat())
+            else:
+                span = tuple(hour.strftime(HOUR_FORMAT) for hour in windows[i])
+            if self.cache is not None and self.cache.enabled:
+                # Request the snapped grid point so cached payloads match their key
+                lat, lon = self.cache.snap(lat, lon)
+                coordinates[i] = (lat, lon)
+                segments = day_segments(span)
+                cached = []
+                for segment in segments:
+                    piece = self.cache.get(self.cache.make_key(lat, lon, *segment))
+                    if piece is None:
+                        break
+                    cached.append(piece)
+                if len(cached) == len(segments):
+                    payloads[i] = merge_days(cached)
+                    continue
+                cached_days[i] = cached
+                cache_keys[i] = {
+                    segment[0][:10]: self.cache.make_key(lat, lon, *segment) for segment in segments[len(cached):]
+                }
+                span = (segments[len(cached)][0], span[1])
+            missing.setdefault(span, []).append(i)
+        
+        for span, indices in missing.items():
+            self._fetch_span(span, indices, coordinates, payloads, cache_keys, cached_days)
+        return payloads
+    
+    def _fetch_span(self, span, indices, coordinates, payloads, cache_keys, cached_days):
+        """One upstream request for the locations at ``indices``, all over the same span"""
         params = {
-            "latitude": lat,
-            "longitude": lon,
+            "latitude": ",".join(str(coordinates[i][0]) for i in indices),
+            "longitude": ",".join(str(coordinates[i][1]) for i in indices),
             "hourly": "temperature_2m,relative_humidity_2m",
-            "start_date": start_date.strftime("%Y-%m-%d"),
-            "end_date": end_date.strftime("%Y-%m-%d"),
             "timezone": "auto"
         }
+        if "T" in span[0]:
+            params.update({"start_hour": span[0], "end_hour": span[1]})
+        else:
+            params.update({"start_date": span[0], "end_date": span[1]})
         
         try:
-            response = requests.get(self.base_url, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            with self._stage('upstream_fetch'):
+                response = self.http_client.get(self.base_url, params=params)
+                response.raise_for_status()
+                fetched = response.json()
         except requests.RequestException as e:
             logger.error(f"API request failed: {e}")
+            # Status errors, unparseable bodies (JSONDecodeError is a ValueError) or connection failures
+            if isinstance(e, requests.HTTPError):
+                self._count_error('http')
+            else:
+                self._count_error('payload' if isinstance(e, ValueError) else 'connection')
             raise Exception(f"Failed to fetch weather data: {str(e)}")
+        
+        # Single-location requests return an object rather than a list
+        if isinstance(fetched, dict):
+            fetched = [fetched]
+        if len(fetched) != len(indices):
+            self._count_error('payload')
+            raise Exception(f"Upstream returned {len(fetched)} locations, expected {len(indices)}")
+        
+        settle = timedelta(hours=self.provisional_hours)
+        for i, payload in zip(indices, fetched):
+            if cache_keys[i] is None:
+                payloads[i] = payload
+                continue
+            utc_offset_seconds = payload.get("utc_offset_seconds")
+            local_now = None if utc_offset_seconds is None else datetime.utcnow() + timedelta(seconds=utc_offset_seconds)
+            for day, piece in split_by_day(payload).items():
+                if day in cache_keys[i]:
+                    self.cache.set(cache_keys[i][day], piece, self.cache.ttl_for(day, local_now, settle))
+            payloads[i] = merge_days(cached_days[i] + [payload]) if cached_days[i] else payload
     
     def process_weather_data(self, raw_data, lat, lon):
-        """Process raw API data into structured format"""
-        processed_data = []
+        """Process raw API data into structured format (list of dicts)"""
+        return self.process_weather_columns(raw_data, lat, lon).to_records()
+    
+    def process_weather_columns(self, raw_data, lat, lon):
+        """Parse the hourly arrays of a raw payload into a WeatherBatch in one vectorized pass
+        
+        Hours from ``provisional_hours`` before the location's current time
+        onwards are flagged ``is_forecast``: upstream may still revise them,
+        so incremental ingest fetches them again on the next poll.
+        """
+        with self._stage('process'):
+            return self._process_columns(raw_data, lat, lon)
+    
+    def _process_columns(self, raw_data, lat, lon):
+        # Imported on first ingest; see app.warmup
+        import pandas as pd
+        
         hourly = raw_data.get("hourly", {})
         
         # Get the arrays for time, temperature, and humidity
@@ -46,25 +169,111 @@ class WeatherService:
         # Ensure all arrays have the same length
         min_length = min(len(times), len(temperatures), len(humidities))
         
-        for i in range(min_length):
-            try:
-                # Parse timestamp - handle different formats
-                timestamp_str = times[i]
-                if 'T' in timestamp_str:
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                else:
-                    timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M")
-                
-                processed_data.append({
-                    "timestamp": timestamp,
-                    "temperature": temperatures[i] if temperatures[i] is not None else None,
-                    "humidity": humidities[i] if humidities[i] is not None else None,
-                    "latitude": lat,
-                    "longitude": lon,
-                    "is_forecast": False  # This is historical data for past 2 days
-                })
-            except (ValueError, IndexError) as e:
-                logger.warning(f"Skipping invalid data point at index {i}: {e}")
-                continue
+        timestamps = self._parse_timestamps(times[:min_length])
+        temperature = pd.to_numeric(pd.Series(temperatures[:min_length], dtype=object), errors='coerce').to_numpy(dtype=float)
+        humidity = pd.to_numeric(pd.Series(humidities[:min_length], dtype=object), errors='coerce').to_numpy(dtype=float)
+        
+        # Drop points whose timestamp could not be parsed
+        valid = ~timestamps.isna()
+        if not valid.all():
+            logger.warning(f"Skipping {int((~valid).sum())} invalid data points")
+            timestamps = timestamps[valid]
+            temperature = temperature[valid]
+            humidity = humidity[valid]
+        
+        utc_offset_seconds = raw_data.get("utc_offset_seconds")
+        if utc_offset_seconds is None:
+            local_now = datetime.now()
+        else:
+            local_now = datetime.utcnow() + timedelta(seconds=utc_offset_seconds)
+        is_forecast = np.asarray(timestamps >= local_now - timedelta(hours=self.provisional_hours), dtype=bool)
+        
+        return WeatherBatch(timestamps, temperature, humidity, lat, lon, is_forecast, utc_offset_seconds)
+    
+    def _stage(self, stage):
+        return self.metrics.time_stage(stage) if self.metrics is not None else nullcontext()
+    
+    def _count_error(self, kind):
+        if self.metrics is not None:
+            self.metrics.count_upstream_error(kind)
+    
+    @staticmethod
+    def _parse_timestamps(times):
+        """Parse ISO-8601 strings ('T' or space separated) into a naive DatetimeIndex; bad values become NaT
         
-        return processed_data
+        Values carrying an offset such as a trailing 'Z' are normalised to
+        naive UTC; Open-Meteo itself returns naive local times.
+        """
+        import pandas as pd
+        
+        timestamps = pd.DatetimeIndex(pd.to_datetime(times, format='ISO8601', errors='coerce', utc=True))
+        return timestamps.tz_localize(None)
+
+
+class WeatherBatch:
+    """Columnar hourly observations for one location.
+    
+    ``timestamps`` is a DatetimeIndex and ``temperature``/``humidity`` are
+    float arrays with NaN where the upstream value was missing.
+    ``utc_offset_seconds`` is the location's offset from UTC, when upstream
+    reported it.
+    """
+    
+    __slots__ = ('timestamps', 'temperature', 'humidity', 'latitude', 'longitude', 'is_forecast',
+                 'utc_offset_seconds')
+    
+    def __init__(self, timestamps, temperature, humidity, latitude, longitude, is_forecast=None,
+                 utc_offset_seconds=None):
+        self.timestamps = timestamps
+        self.temperature = temperature
+        self.humidity = humidity
+        self.latitude = latitude
+        self.longitude = longitude
+        # This is historical data for past 2 days
+        self.is_forecast = is_forecast if is_forecast is not None else np.zeros(len(timestamps), dtype=bool)
+        self.utc_offset_seconds = utc_offset_seconds
+    
+    def __len__(self):
+        return len(self.timestamps)
+    
+    def to_rows(self, location_id):
+        """Rows for the weather_data table, keyed by location id"""
+        return [
+            {
+                "location_id": location_id,
+                "timestamp": timestamp,
+                "temperature": temperature,
+                "humidity": humidity,
+                "is_forecast": is_forecast
+            }
+            for timestamp, temperature, humidity, is_forecast in zip(
+                self.timestamps.to_pydatetime(),
+                _nan_to_none(self.temperature),
+                _nan_to_none(self.humidity),
+                self.is_forecast.tolist()
+            )
+        ]
+    
+    def to_records(self):
+        """Compatibility view: one dict per hour with None for missing values"""
+        return [
+            {
+                "timestamp": timestamp,
+                "temperature": temperature,
+                "humidity": humidity,
+                "latitude": self.latitude,
+                "longitude": self.longitude,
+                "is_forecast": is_forecast
+            }
+            for timestamp, temperature, humidity, is_forecast in zip(
+                self.timestamps.to_pydatetime(),
+                _nan_to_none(self.temperature),
+                _nan_to_none(self.humidity),
+                self.is_forecast.tolist()
+            )
+        ]
+
+
+def _nan_to_none(values):
+    """Convert a float array to a list with None in place of NaN"""
+    return [None if value != value else value for value in values.tolist()]
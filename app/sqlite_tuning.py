@@ -0,0 +1,84 @@
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# Applied to every new connection, in order. WAL lets export reads run
+# alongside ingest writes; synchronous=NORMAL is durable across application
+# crashes in WAL mode and only risks the last commits on power loss.
+# auto_vacuum only takes effect on a new file (before journal_mode writes
+# the header) or at the next VACUUM; it lets compaction hand freed pages
+# back with incremental_vacuum.
+DEFAULT_PRAGMAS = {
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Pragmas that write to the database file or its header
+WRITE_PRAGMAS = ('auto_vacuum', 'journal_mode', 'synchronous')
+
+
+def apply_pragmas(engine, pragmas, read_only=False):
+    """Run ``PRAGMA name=value`` on each new DBAPI connection of a SQLite engine"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    statements = [
+        f"PRAGMA {name}={value}"
+        for name, value in pragmas.items()
+        if value is not None and not (read_only and name in WRITE_PRAGMAS)
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def readonly_url(url):
+    """Turn a file-based SQLite URL into a read-only URI connection URL"""
+    url = make_url(url)
+    database = url.database
+    if url.query.get('uri'):
+        database = database[len('file:'):] if database.startswith('file:') else database
+    return url.set(database=f"file:{database}", query={'mode': 'ro', 'uri': 'true'}).render_as_string(hide_password=False)
+
+
+def is_file_database(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def configure_engines(config):
+    """Fill in engine options and the read-only bind before Flask-SQLAlchemy creates engines.
+
+    Pool sizing only applies to file databases; in-memory SQLite uses a
+    single static connection.
+    """
+    url = config['SQLALCHEMY_DATABASE_URI']
+    if not is_file_database(url):
+        return
+    # Copy so dicts defined on a Config class are not mutated across apps
+    options = config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options.setdefault('pool_size', config['DB_POOL_SIZE'])
+    options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+
+    if config['SQLITE_READONLY_EXPORTS']:
+        binds = config['SQLALCHEMY_BINDS'] = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault('readonly', {
+            'url': readonly_url(url),
+            'pool_size': config['DB_READONLY_POOL_SIZE'],
+            'max_overflow': config['DB_READONLY_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+        })
@@ -0,0 +1,54 @@
+"""Preloading of the heavy export dependencies.
+
+The web process imports pandas, openpyxl, matplotlib and ReportLab on first
+use only, which keeps cold start and idle worker memory down. When workers
+are forked from a parent (gunicorn's master, the PDF render pool), importing
+them once in the parent before the fork lets every worker share the loaded
+modules copy-on-write instead of importing its own copy. ``gunicorn.conf.py``
+calls ``preload`` from the master; ``create_app`` calls it before forking
+the render pool when PRELOAD_EXPORT_LIBS is set.
+"""
+import gc
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Behind ingest (pandas) and the Excel/PDF exports
+HEAVY_MODULES = (
+    'pandas',
+    'openpyxl',
+    'matplotlib.figure',
+    'matplotlib.backends.backend_agg',
+    'reportlab.platypus',
+    'app.services.excel_service',
+    'app.services.chart_renderer',
+    'app.services.pdf_service',
+)
+
+# Loaded only when installed
+OPTIONAL_MODULES = ('pyarrow', 'pyarrow.parquet')
+
+
+def preload(freeze=False):
+    """Import the heavy modules now; returns {module: seconds}.
+
+    With ``freeze`` the loaded objects are moved to the garbage collector's
+    permanent generation, so collections in the children do not write to
+    (and so un-share) the parent's pages.
+    """
+    timings = {}
+    for name in HEAVY_MODULES + OPTIONAL_MODULES:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            if name not in OPTIONAL_MODULES:
+                raise
+            continue
+        timings[name] = round(time.perf_counter() - started, 4)
+    if freeze:
+        gc.freeze()
+    logger.info(f"Preloaded export dependencies in {sum(timings.values()):.2f}s")
+    return timings
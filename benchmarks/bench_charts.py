@@ -0,0 +1,102 @@
+"""Per-chart render time: the previous pyplot path vs. the reusable figure template.
+
+* ``pyplot_tempfile`` - the old ``PDFService._create_chart_image``: build a
+  twin-axis figure through pyplot, ``tight_layout``, save a 150 dpi PNG
+  with ``bbox_inches='tight'`` to a temp file and read it back.
+* ``template_png`` / ``template_svg`` - ``ChartRenderer.render`` on a
+  figure laid out once, drawing into memory, with LTTB downsampling to
+  ``--max-points``.
+* ``template_png_full`` - the same without downsampling.
+
+Usage: python -m benchmarks.bench_charts [--points 48,720,5000,50000] [--repeat 10] [--max-points 500]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import numpy as np
+
+from app.services.chart_renderer import ChartRenderer
+
+
+def make_series(points):
+    timestamps = np.datetime64('2024-01-01T00:00:00') + np.arange(points) * np.timedelta64(1, 'h')
+    hours = np.arange(points)
+    temperature = 10 + 5 * np.sin(hours / 24 * 2 * np.pi)
+    humidity = 60 + 15 * np.cos(hours / 24 * 2 * np.pi)
+    temperature[::37] = np.nan
+    return timestamps, temperature, humidity
+
+
+def pyplot_tempfile(timestamps, temperature, humidity):
+    temp_mask = ~np.isnan(temperature)
+    humidity_mask = ~np.isnan(humidity)
+    fig, ax1 = plt.subplots(figsize=(10, 6))
+    line1 = ax1.plot(timestamps[temp_mask], temperature[temp_mask], color='tab:red', linewidth=2,
+                     label='Temperature', marker='o', markersize=3)
+    ax1.grid(True, alpha=0.3)
+    ax2 = ax1.twinx()
+    line2 = ax2.plot(timestamps[humidity_mask], humidity[humidity_mask], color='tab:blue', linewidth=2,
+                     label='Humidity', marker='s', markersize=3)
+    ax1.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d %H:%M'))
+    # The old HourLocator(interval=6) explodes the tick count on long windows
+    ax1.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=4, maxticks=10))
+    plt.setp(ax1.xaxis.get_majorticklabels(), rotation=45)
+    plt.title('Temperature and Humidity Trends (Past 48 Hours)', fontweight='bold', fontsize=14, pad=20)
+    lines = line1 + line2
+    ax1.legend(lines, [l.get_label() for l in lines], loc='upper left', frameon=True, shadow=True)
+    plt.tight_layout()
+    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
+        plt.savefig(tmp_file.name, format='png', dpi=150, bbox_inches='tight', facecolor='white', edgecolor='none')
+    plt.close(fig)
+    with open(tmp_file.name, 'rb') as fh:
+        data = fh.read()
+    os.unlink(tmp_file.name)
+    return data
+
+
+def time_strategy(fn, series, repeat):
+    fn(*series)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(fn(*series))
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'median_ms': round(timings[len(timings) // 2] * 1000, 1),
+        'min_ms': round(timings[0] * 1000, 1),
+        'bytes': size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', default='48,720,5000,50000')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--max-points', type=int, default=500)
+    args = parser.parse_args()
+
+    renderer = ChartRenderer()
+    strategies = {
+        'pyplot_tempfile': pyplot_tempfile,
+        'template_png': lambda *series: renderer.render(*series, max_points=args.max_points).getvalue(),
+        'template_svg': lambda *series: renderer.render(*series, format='svg', max_points=args.max_points).getvalue(),
+        'template_png_full': lambda *series: renderer.render(*series, max_points=0).getvalue(),
+    }
+    results = []
+    for points in (int(p) for p in args.points.split(',')):
+        series = make_series(points)
+        for name, fn in strategies.items():
+            results.append(dict(strategy=name, points=points, **time_strategy(fn, series, args.repeat)))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Compare export formats: rows/s and peak RSS for excel, csv, ndjson and parquet.
+
+A scratch database is populated once; each format is then exported through
+the Flask test client in its own subprocess. RSS is sampled from
+/proc/self/statm while the export runs; ``peak_rss_delta_mb`` is the peak
+growth over the RSS just before the request.
+
+Usage: python -m benchmarks.bench_exports [--rows 200000] [--locations 20] [--formats excel,csv,ndjson,parquet]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+FORMATS = ('excel', 'csv', 'ndjson', 'parquet')
+
+
+def make_app(db_path):
+    from app import create_app
+    from app.config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        RESPONSE_CACHE_DIR = None
+
+    return create_app(BenchConfig)
+
+
+def populate(db_path, rows, locations):
+    from app import db
+    from app.models import Location, WeatherData
+    from app.services.storage import upsert_rows
+
+    app = make_app(db_path)
+    hours = rows // locations
+    start = datetime.utcnow() - timedelta(hours=hours)
+    with app.app_context():
+        for i in range(locations):
+            db.session.add(Location(latitude=40.0 + i * 0.1, longitude=8.0))
+        db.session.flush()
+        for location_id in range(1, locations + 1):
+            upsert_rows(db.session, WeatherData.__table__, [
+                {
+                    'location_id': location_id,
+                    'timestamp': start + timedelta(hours=h),
+                    'temperature': 10.0 + (h % 24) / 2,
+                    'humidity': 60.0 + (h % 12),
+                    'is_forecast': False,
+                }
+                for h in range(hours)
+            ], WeatherData.UPSERT_KEY, WeatherData.UPSERT_VALUES)
+        db.session.commit()
+    return hours
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        # No procfs: fall back to the high-water mark (KiB on Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss_mb()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, rss_mb())
+
+
+def run_child(format_name, db_path, hours, rows):
+    """Export once and print one JSON result line"""
+    app = make_app(db_path)
+    client = app.test_client()
+    baseline = rss_mb()
+    sampler = RSSSampler()
+    sampler.start()
+    start = time.perf_counter()
+    response = client.get(f'/export/{format_name}?hours={hours + 1}', buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    elapsed = time.perf_counter() - start
+    sampler.stopped.set()
+    sampler.join()
+    print(json.dumps({
+        'format': format_name,
+        'status': response.status_code,
+        'rows': rows,
+        'bytes': size,
+        'seconds': round(elapsed, 3),
+        'rows_per_s': round(rows / elapsed),
+        'peak_rss_mb': round(sampler.peak, 1),
+        'peak_rss_delta_mb': round(sampler.peak - baseline, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--locations', type=int, default=20)
+    parser.add_argument('--formats', default=','.join(FORMATS))
+    parser.add_argument('--child', nargs=4, metavar=('FORMAT', 'DB', 'HOURS', 'ROWS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        format_name, db_path, hours, rows = args.child
+        run_child(format_name, db_path, int(hours), int(rows))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        hours = populate(db_path, args.rows, args.locations)
+        rows = hours * args.locations
+        for format_name in args.formats.split(','):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_exports', '--child', format_name, db_path, str(hours), str(rows)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
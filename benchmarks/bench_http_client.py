@@ -0,0 +1,53 @@
+"""Compare per-call ``requests.get`` against the pooled HTTPClient.
+
+Usage: python -m benchmarks.bench_http_client [--requests 500]
+"""
+import argparse
+import json
+import time
+
+import requests
+
+from app.services.http_client import HTTPClient
+from app.services.weather_service import WeatherService
+from benchmarks.stub_server import StubServer
+
+
+def run(n_requests):
+    results = {}
+    with StubServer() as server:
+        params = {"latitude": 47.37, "longitude": 8.55, "hourly": "temperature_2m,relative_humidity_2m"}
+
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            requests.get(server.url, params=params, timeout=30).json()
+        results["requests_get_s"] = time.perf_counter() - start
+
+        client = HTTPClient()
+        service = WeatherService(http_client=client, base_url=server.url)
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            service.fetch_weather_data(47.37, 8.55)
+        results["pooled_client_s"] = time.perf_counter() - start
+        results["pool"] = client.stats()
+        client.close()
+
+    with StubServer(fail_first=2) as server:
+        client = HTTPClient(backoff_factor=0.01)
+        WeatherService(http_client=client, base_url=server.url).fetch_weather_data(47.37, 8.55)
+        results["retry_upstream_requests"] = server.request_count
+        client.close()
+
+    results["requests"] = n_requests
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Load test of the FastAPI app (main.py): previous sync version vs. the async one.
+
+* ``legacy`` - the previous main.py: sync export handlers, ``requests.get``
+  per ingest without a shared session or timeout, ``SessionLocal()``
+  opened by hand, and exports written to fixed files in the working
+  directory.
+* ``async`` - the current main.py: shared ``httpx.AsyncClient``, aiosqlite
+  sessions, export rendering in a process pool, documents served from
+  memory.
+
+Each version runs under uvicorn in a subprocess against a fresh database
+and the local stub upstream (``--latency`` seconds per call). For each
+endpoint, ``--concurrency`` clients send requests back to back for
+``--duration`` seconds. Ingest requests use distinct coordinates so they
+are not coalesced. Prints requests/s, p50 and p99 latency and error counts
+as JSON.
+
+Usage: python -m benchmarks.bench_main_load [--concurrency 32] [--duration 10] [--latency 0.1]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.stub_server import StubServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ('/weather-report', '/export/excel')
+
+
+def create_legacy_app():
+    """The previous main.py, kept here as the baseline (uvicorn --factory)"""
+    from datetime import datetime, timedelta
+
+    import openpyxl
+    import requests
+    from fastapi import FastAPI, Query
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.responses import FileResponse
+
+    from app.config import Config
+    from app.services.singleflight import AsyncSingleFlight
+    from db import SessionLocal, WeatherData, init_db
+    from utils import save_weather_data
+
+    app = FastAPI()
+    ingest_flight = AsyncSingleFlight()
+    init_db()
+
+    def _ingest(lat, lon):
+        end = datetime.utcnow()
+        start = end - timedelta(days=2)
+        url = (
+            f"{Config.WEATHER_API_BASE_URL}?"
+            f"latitude={lat}&longitude={lon}"
+            f"&hourly=temperature_2m,relative_humidity_2m"
+            f"&start={start.strftime('%Y-%m-%dT%H:%M')}"
+            f"&end={end.strftime('%Y-%m-%dT%H:%M')}"
+            f"&timezone=UTC"
+        )
+        resp = requests.get(url)
+        data = resp.json()
+        session = SessionLocal()
+        save_weather_data(session, data)
+        session.close()
+        return {"status": "success", "count": len(data.get("hourly", {}).get("time", []))}
+
+    @app.get("/weather-report")
+    async def weather_report(lat: float = Query(...), lon: float = Query(...)):
+        return await ingest_flight.do((lat, lon), run_in_threadpool, _ingest, lat, lon)
+
+    @app.get("/export/excel")
+    def export_excel():
+        session = SessionLocal()
+        start = datetime.utcnow() - timedelta(hours=48)
+        rows = session.query(WeatherData).filter(WeatherData.timestamp >= start).order_by(WeatherData.timestamp).all()
+        session.close()
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(["timestamp", "temperature_2m", "relative_humidity_2m"])
+        for r in rows:
+            ws.append([r.timestamp.strftime("%Y-%m-%d %H:%M"), r.temperature_2m, r.relative_humidity_2m])
+        wb.save("weather_data.xlsx")
+        return FileResponse("weather_data.xlsx", filename="weather_data.xlsx")
+
+    return app
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(target, factory, workdir, upstream_url):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO_DIR,
+        FASTAPI_DB_PATH=os.path.join(workdir, 'bench.db'),
+        WEATHER_API_BASE_URL=upstream_url,
+    )
+    command = [sys.executable, '-m', 'uvicorn', target, '--port', str(port), '--log-level', 'warning']
+    if factory:
+        command.append('--factory')
+    process = subprocess.Popen(command, cwd=workdir, env=env)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f'{url}/docs', timeout=1)
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{target} did not start')
+
+
+async def run_load(url, path, concurrency, duration):
+    counter = itertools.count()
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            params = None
+            if path == '/weather-report':
+                i = next(counter)
+                params = {'lat': round(40 + (i % 100000) * 0.0001, 4), 'lon': 8.0}
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'req_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p99_ms': round(latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--latency', type=float, default=0.1, help='simulated upstream latency in seconds')
+    args = parser.parse_args()
+
+    versions = (
+        ('legacy', 'benchmarks.bench_main_load:create_legacy_app', True),
+        ('async', 'main:app', False),
+    )
+    results = []
+    with StubServer(latency=args.latency) as upstream:
+        for name, target, factory in versions:
+            with tempfile.TemporaryDirectory() as workdir:
+                process, url = start_server(target, factory, workdir, upstream.url)
+                try:
+                    # Ingest first so the export has 48 hours of rows to render
+                    for path in ENDPOINTS:
+                        stats = asyncio.run(run_load(url, path, args.concurrency, args.duration))
+                        results.append(dict(version=name, endpoint=path, concurrency=args.concurrency, **stats))
+                finally:
+                    process.terminate()
+                    process.wait()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
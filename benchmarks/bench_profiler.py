@@ -0,0 +1,101 @@
+"""Measure what request profiling costs the requests it watches.
+
+Exports the same Excel workbook repeatedly through the Flask test client,
+with the export cache off so every request renders, under three settings:
+
+- ``off``: profiling disabled
+- ``unsampled``: profiling enabled, but the request was not picked
+  (``sample_rate`` 0, no slow capture); the price every request pays
+  for having profiling on
+- ``slow_capture``: every request is stack-sampled in case it turns out
+  slow (``PROFILING_SLOW_CAPTURE=1``), with a threshold no request reaches
+  so nothing is written
+
+Settings are run in rounds so drift on the machine affects them equally.
+Prints the median request time per setting and its overhead over ``off``.
+
+Usage: python -m benchmarks.bench_profiler [--rows 20000] [--requests 30] [--interval 0.005]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_exports import populate
+
+SETTINGS = {
+    'off': {'PROFILING_ENABLED': False},
+    'unsampled': {'PROFILING_ENABLED': True, 'PROFILING_SAMPLE_RATE': 0.0, 'PROFILING_SLOW_CAPTURE': False},
+    'slow_capture': {
+        'PROFILING_ENABLED': True, 'PROFILING_SAMPLE_RATE': 0.0, 'PROFILING_SLOW_CAPTURE': True,
+        'PROFILING_SLOW_THRESHOLD': 3600.0,
+    },
+}
+
+
+def make_app(db_path, profile_dir, interval, settings):
+    from app import create_app
+    from app.config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        RESPONSE_CACHE_DIR = None
+        EXPORT_CACHE_ENABLED = False
+        RENDER_POOL_WORKERS = 0
+        PROFILING_DIR = profile_dir
+        PROFILING_INTERVAL = interval
+
+    for name, value in settings.items():
+        setattr(BenchConfig, name, value)
+    return create_app(BenchConfig)
+
+
+def time_requests(client, url, count):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--locations', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--interval', type=float, default=0.005)
+    args = parser.parse_args()
+
+    timings = {name: [] for name in SETTINGS}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        hours = populate(db_path, args.rows, args.locations)
+        url = f'/export/excel?hours={hours + 1}'
+        for _ in range(args.rounds):
+            for name, settings in SETTINGS.items():
+                client = make_app(db_path, os.path.join(tmp, 'profiles'), args.interval, settings).test_client()
+                # Untimed: first request pays lazy imports and the sampler thread start
+                time_requests(client, url, 1)
+                timings[name].extend(time_requests(client, url, args.requests // args.rounds or 1))
+
+    baseline = statistics.median(timings['off'])
+    results = []
+    for name, values in timings.items():
+        median = statistics.median(values)
+        results.append({
+            'setting': name,
+            'requests': len(values),
+            'median_ms': round(median * 1000, 2),
+            'overhead_ms': round((median - baseline) * 1000, 2),
+            'overhead_pct': round((median / baseline - 1) * 100, 1),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
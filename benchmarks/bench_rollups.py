@@ -0,0 +1,121 @@
+"""Summary statistics over long windows: raw rows vs. daily rollups.
+
+* ``python_rows`` - the previous exporter path: fetch every row in the
+  window and fold it into RunningStats in Python.
+* ``sql_raw`` - one aggregate query over the raw hourly rows.
+* ``rollups`` - ``rollups.summarize_window``: whole days from
+  weather_daily_rollups, partial edge days from raw rows.
+
+Also times ``refresh_daily_rollups`` for one 3-day ingest batch, which is
+the cost ingest pays to keep the rollups current.
+
+Usage: python -m benchmarks.bench_rollups [--days 30,365] [--locations 10] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.models import Location, WeatherData
+from app.services.rollups import (
+    RunningStats, aggregate_columns, rebuild_daily_rollups, refresh_daily_rollups, summarize_window
+)
+from app.services.storage import upsert_rows
+
+END = datetime(2025, 1, 1)
+
+
+def load(session, days, locations):
+    from app import db
+
+    db.metadata.create_all(session.get_bind())
+    session.add_all(Location(latitude=float(i), longitude=8.0) for i in range(locations))
+    session.flush()
+    start = END - timedelta(days=days)
+    for location_id in range(1, locations + 1):
+        rows = [
+            {
+                'location_id': location_id,
+                'timestamp': start + timedelta(hours=hour),
+                'temperature': None if hour % 37 == 0 else 10.0 + (hour % 24) / 2,
+                'humidity': 60.0 + (hour % 12),
+                'is_forecast': False,
+            }
+            for hour in range(days * 24)
+        ]
+        upsert_rows(session, WeatherData.__table__, rows, WeatherData.UPSERT_KEY, WeatherData.UPSERT_VALUES)
+    rebuild_daily_rollups(session)
+    session.commit()
+
+
+def python_rows(session, start, location_id):
+    temperature, humidity = RunningStats(), RunningStats()
+    stmt = select(WeatherData.temperature, WeatherData.humidity).where(
+        WeatherData.location_id == location_id, WeatherData.timestamp >= start
+    )
+    for t, h in session.execute(stmt):
+        temperature.add(t)
+        humidity.add(h)
+    return temperature.count
+
+
+def sql_raw(session, start, location_id):
+    return session.execute(select(*aggregate_columns()).where(
+        WeatherData.location_id == location_id, WeatherData.timestamp >= start
+    )).one()[1]
+
+
+def rollups(session, start, location_id):
+    return summarize_window(session, start, location_id=location_id).temperature.count
+
+
+def refresh(session, start, location_id):
+    days = {(END - timedelta(days=3)).date(), (END - timedelta(days=1)).date()}
+    written = refresh_daily_rollups(session, location_id, days)
+    session.rollback()
+    return written
+
+
+def time_strategy(fn, args, repeat):
+    fn(*args)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return result, round(timings[len(timings) // 2] * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', default='30,365')
+    parser.add_argument('--locations', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for days in (int(d) for d in args.days.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            with Session(engine) as session:
+                load(session, days, args.locations)
+                # Window starts mid-day so both edge paths are exercised
+                start = END - timedelta(days=days) + timedelta(hours=5)
+                counts = {}
+                for name, fn in (('python_rows', python_rows), ('sql_raw', sql_raw), ('rollups', rollups),
+                                 ('refresh_3_days', refresh)):
+                    counts[name], median_ms = time_strategy(fn, (session, start, 1), args.repeat)
+                    results.append({'strategy': name, 'days': days, 'median_ms': median_ms})
+                assert counts['python_rows'] == counts['sql_raw'] == counts['rollups'], counts
+            engine.dispose()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Concurrent ingest writes vs. long export reads, default vs. tuned SQLite.
+
+Writers repeatedly upsert one location's 72 hours with changed values and
+commit; readers repeatedly run the unscoped export query (every row of the
+window). The ``default`` profile is SQLite's rollback journal with stock
+settings; ``tuned`` applies Config.SQLITE_PRAGMAS (WAL etc.) and reads
+through a separate read-only engine, as the Flask app does.
+
+Usage: python -m benchmarks.bench_sqlite_concurrency [--seconds 5] [--writers 2] [--readers 4]
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.config import Config
+from app.models import Location, WeatherData
+from app.services.storage import build_export_query, upsert_rows
+from app.sqlite_tuning import apply_pragmas, readonly_url
+
+LOCATIONS = 20
+HOURS = 2000
+
+
+def rows_for(location_id, offset=0.0, hours=HOURS):
+    start = datetime.utcnow() - timedelta(hours=hours)
+    return [
+        {
+            'location_id': location_id,
+            'timestamp': start + timedelta(hours=h),
+            'temperature': 10.0 + (h % 24) / 2 + offset,
+            'humidity': 60.0,
+            'is_forecast': False,
+        }
+        for h in range(hours)
+    ]
+
+
+def populate(engine):
+    Location.__table__.create(engine)
+    WeatherData.__table__.create(engine)
+    with Session(engine) as session:
+        for i in range(LOCATIONS):
+            session.add(Location(id=i + 1, latitude=40.0 + i, longitude=8.0))
+        session.flush()
+        for i in range(LOCATIONS):
+            upsert_rows(session, WeatherData.__table__, rows_for(i + 1), WeatherData.UPSERT_KEY, WeatherData.UPSERT_VALUES)
+        session.commit()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 2)
+
+
+def run_profile(name, seconds, writers, readers):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        write_engine = create_engine(url, pool_size=writers + 1)
+        read_engine = write_engine
+        if name == 'tuned':
+            apply_pragmas(write_engine, Config.SQLITE_PRAGMAS)
+        populate(write_engine)
+        if name == 'tuned':
+            read_engine = create_engine(readonly_url(url), pool_size=readers + 1)
+            apply_pragmas(read_engine, Config.SQLITE_PRAGMAS, read_only=True)
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        stats = {'write_latencies': [], 'read_latencies': [], 'write_errors': 0, 'read_errors': 0}
+
+        def writer(worker):
+            n = 0
+            while not stop.is_set():
+                n += 1
+                location_id = (worker + n) % LOCATIONS + 1
+                start = time.perf_counter()
+                try:
+                    with Session(write_engine) as session:
+                        upsert_rows(session, WeatherData.__table__, rows_for(location_id, offset=n % 7, hours=72),
+                                    WeatherData.UPSERT_KEY, WeatherData.UPSERT_VALUES)
+                        session.commit()
+                    with lock:
+                        stats['write_latencies'].append(time.perf_counter() - start)
+                except OperationalError:
+                    with lock:
+                        stats['write_errors'] += 1
+
+        def reader():
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    with Session(read_engine) as session:
+                        session.scalars(build_export_query(WeatherData, HOURS)).all()
+                    with lock:
+                        stats['read_latencies'].append(time.perf_counter() - start)
+                except OperationalError:
+                    with lock:
+                        stats['read_errors'] += 1
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        threads += [threading.Thread(target=reader) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        write_engine.dispose()
+        read_engine.dispose()
+
+    return {
+        'profile': name,
+        'writes_per_s': round(len(stats['write_latencies']) / seconds, 1),
+        'write_p50_ms': percentile(stats['write_latencies'], 50),
+        'write_p99_ms': percentile(stats['write_latencies'], 99),
+        'write_errors': stats['write_errors'],
+        'reads_per_s': round(len(stats['read_latencies']) / seconds, 1),
+        'read_p50_ms': percentile(stats['read_latencies'], 50),
+        'read_p99_ms': percentile(stats['read_latencies'], 99),
+        'read_errors': stats['read_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--readers', type=int, default=4)
+    args = parser.parse_args()
+    results = [run_profile(name, args.seconds, args.writers, args.readers) for name in ('default', 'tuned')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Cold-start cost of the app factory, measured with ``python -X importtime``.
+
+Each scenario runs in a fresh interpreter against a temporary database:
+
+* ``flask_lazy`` - ``create_app`` with export libraries loaded on first use.
+* ``flask_preload`` - the same with PRELOAD_EXPORT_LIBS, as a gunicorn
+  master or render-pool parent would run it.
+* ``fastapi`` - ``import main`` (the async app; lifespan not started).
+
+Reports wall time to a ready app, total import time, peak RSS, which heavy
+libraries ended up loaded and the slowest top-level imports (medians over
+``--repeat`` runs). ``--output FILE`` appends one JSON line per run with
+the commit hash, so results can be tracked over time.
+
+Usage: python -m benchmarks.bench_startup [--repeat 5] [--top 8] [--output startup.jsonl]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ('pandas', 'numpy', 'openpyxl', 'matplotlib', 'reportlab', 'pyarrow')
+
+CHILD_PRELUDE = """
+import json, resource, sys, time
+started = time.perf_counter()
+"""
+
+CHILD_REPORT = """
+print(json.dumps({
+    'wall_ms': (time.perf_counter() - started) * 1000,
+    'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': sorted(name for name in %r if name in sys.modules),
+}))
+""" % (HEAVY,)
+
+FLASK_APP = """
+from app import create_app
+from app.config import Config
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///{workdir}/startup.db'
+    EXPORT_JOBS_DIR = '{workdir}/exports'
+    RENDER_POOL_WORKERS = 0
+    COMPACTION_INTERVAL = 0
+    PREFETCH_ENABLED = False
+    EXPORT_JOB_SWEEP_INTERVAL = 0
+    PRELOAD_EXPORT_LIBS = {preload}
+
+create_app(BenchConfig)
+"""
+
+SCENARIOS = {
+    'flask_lazy': FLASK_APP.replace('{preload}', 'False'),
+    'flask_preload': FLASK_APP.replace('{preload}', 'True'),
+    'fastapi': 'import main\n',
+}
+
+
+def parse_importtime(stderr):
+    """{top-level module: cumulative microseconds} from -X importtime output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented below their parent
+        if name.startswith('  '):
+            continue
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def run_scenario(code, workdir):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, FASTAPI_DB_PATH=os.path.join(workdir, 'fastapi.db'))
+    source = CHILD_PRELUDE + code.replace('{workdir}', workdir) + CHILD_REPORT
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', source],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['imports'] = parse_importtime(result.stderr)
+    return report
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8)
+    parser.add_argument('--output', help='append results as one JSON line to this file')
+    args = parser.parse_args()
+
+    results = []
+    for name, code in SCENARIOS.items():
+        runs = []
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as workdir:
+                runs.append(run_scenario(code, workdir))
+        modules = {module for run in runs for module in run['imports']}
+        imports = {module: median([run['imports'].get(module, 0) for run in runs]) for module in modules}
+        results.append({
+            'scenario': name,
+            'wall_ms': round(median([run['wall_ms'] for run in runs]), 1),
+            'import_ms': round(median([sum(run['imports'].values()) for run in runs]) / 1000, 1),
+            'maxrss_mb': round(median([run['maxrss_mb'] for run in runs]), 1),
+            'loaded': runs[-1]['loaded'],
+            'slowest_imports_ms': {
+                module: round(micros / 1000, 1)
+                for module, micros in sorted(imports.items(), key=lambda item: -item[1])[:args.top]
+            },
+        })
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+        with open(args.output, 'a') as fh:
+            fh.write(json.dumps({'at': datetime.utcnow().isoformat(), 'commit': commit, 'results': results}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Compare the set-based upsert with the previous ingest paths.
+
+* ``route_delete_insert`` - the old ``routes.weather_report``: delete all rows
+  for the location, then ``session.add`` once per hour (run against the
+  current schema so only the write strategy differs).
+* ``utils_select_per_row`` - the old ``utils.save_weather_data``: one SELECT
+  per hour before each insert (N+1).
+* ``upsert`` - ``INSERT ... ON CONFLICT DO UPDATE`` via executemany.
+
+Each strategy loads N rows into an empty table, then re-ingests the same
+rows with 1% of values changed (the common polling case).
+
+Usage: python -m benchmarks.bench_upsert [--sizes 1000,100000,1000000] [--legacy-max 100000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+import db as fastapi_db
+from app.models import WeatherData
+from app.services.storage import upsert_rows
+
+HOURS_PER_LOCATION = 72
+
+
+def make_rows(n, changed_every=None):
+    """Rows for n/72 locations x 72 hours, optionally perturbing every k-th value"""
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(n):
+        loc, hour = divmod(i, HOURS_PER_LOCATION)
+        temperature = 10.0 + (hour % 24) / 2
+        if changed_every and i % changed_every == 0:
+            temperature += 0.5
+        rows.append({
+            'timestamp': start + timedelta(hours=hour),
+            'temperature': temperature,
+            'humidity': 60.0 + (hour % 12),
+            'location_id': loc + 1,
+            'is_forecast': False,
+        })
+    return rows
+
+
+def group_by_location(rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['location_id'], []).append(row)
+    return groups
+
+
+def route_delete_insert(session, rows):
+    for location_id, location_rows in group_by_location(rows).items():
+        session.query(WeatherData).filter(
+            WeatherData.location_id == location_id
+        ).delete()
+        for data in location_rows:
+            session.add(WeatherData(**data))
+        session.commit()
+
+
+def utils_select_per_row(session, rows):
+    for row in rows:
+        exists = session.execute(
+            select(fastapi_db.WeatherData.id).where(fastapi_db.WeatherData.timestamp == row['timestamp'])
+        ).first()
+        if not exists:
+            session.add(fastapi_db.WeatherData(
+                timestamp=row['timestamp'],
+                temperature_2m=row['temperature'],
+                relative_humidity_2m=row['humidity']
+            ))
+    session.commit()
+
+
+def upsert(session, rows):
+    for location_rows in group_by_location(rows).values():
+        upsert_rows(session, WeatherData.__table__, location_rows, WeatherData.UPSERT_KEY, WeatherData.UPSERT_VALUES)
+        session.commit()
+
+
+def utils_rows(rows):
+    """The FastAPI table is keyed on timestamp only, so give every row its own hour"""
+    start = datetime(2000, 1, 1)
+    return [dict(row, timestamp=start + timedelta(hours=i)) for i, row in enumerate(rows)]
+
+
+def run_strategy(name, fn, table, first_rows, second_rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        table.create(engine)
+        with Session(engine) as session:
+            start = time.perf_counter()
+            fn(session, first_rows)
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            fn(session, second_rows)
+            second = time.perf_counter() - start
+        engine.dispose()
+    return {
+        'strategy': name,
+        'rows': len(first_rows),
+        'initial_load_s': round(first, 4),
+        'reingest_s': round(second, 4),
+        'initial_rows_per_s': round(len(first_rows) / first) if first else None,
+    }
+
+
+def run(sizes, legacy_max):
+    results = []
+    for n in sizes:
+        first, second = make_rows(n), make_rows(n, changed_every=100)
+        results.append(run_strategy('upsert', upsert, WeatherData.__table__, first, second))
+        if n <= legacy_max:
+            results.append(run_strategy('route_delete_insert', route_delete_insert, WeatherData.__table__, first, second))
+            results.append(run_strategy('utils_select_per_row', utils_select_per_row,
+                                        fastapi_db.WeatherData.__table__, utils_rows(first), utils_rows(second)))
+        else:
+            results.append({'strategy': 'legacy', 'rows': n, 'skipped': f'above --legacy-max {legacy_max}'})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,100000,1000000')
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help='largest size to run the slow legacy paths at')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print(json.dumps(run(sizes, args.legacy_max), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Assert that location-scoped export queries are index range scans.
+
+Runs EXPLAIN QUERY PLAN for the location-scoped query behind /export/* on a
+populated scratch database and fails (exit code 1) unless the plan is
+exactly one SEARCH of the (location_id, timestamp) index, constrained on both
+columns: no table scan, no temp B-tree for ORDER BY, no other index.
+
+The plan is a range scan ``USING INDEX``, not ``USING COVERING INDEX``:
+exports read temperature and humidity, which are not in the index, so
+each row in the window costs one rowid lookup in the table. The range
+already limits those lookups to the rows being exported; covering them
+would mean copying the value columns into the index and writing them
+twice on every upsert.
+
+Usage: python -m benchmarks.check_export_plan
+   or: python benchmarks/check_export_plan.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+if not __package__:
+    # Run as a script: make the repository root importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.models import Location, WeatherData
+from app.services.storage import build_export_query, explain_query_plan, upsert_rows
+
+EXPECTED_PLAN = [
+    'SEARCH weather_data USING INDEX uq_weather_data_location_time (location_id=? AND timestamp>?)',
+]
+
+
+def populate(session, locations=50, hours=24 * 14):
+    start = datetime.utcnow() - timedelta(hours=hours)
+    rows = [
+        {
+            'timestamp': start + timedelta(hours=h),
+            'temperature': 10.0,
+            'humidity': 50.0,
+            'location_id': i + 1,
+            'is_forecast': False,
+        }
+        for i in range(locations) for h in range(hours)
+    ]
+    upsert_rows(session, WeatherData.__table__, rows, WeatherData.UPSERT_KEY, WeatherData.UPSERT_VALUES)
+    session.commit()
+    session.execute(text('ANALYZE'))
+
+
+def check(plan):
+    problems = []
+    if any(line.startswith('SCAN') for line in plan):
+        problems.append('query scans a table or index')
+    if any('TEMP B-TREE' in line for line in plan):
+        problems.append('ORDER BY is not satisfied by the index')
+    if plan != EXPECTED_PLAN:
+        problems.append(f'expected the plan {EXPECTED_PLAN}')
+    return problems
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'plan.db')}")
+        Location.__table__.create(engine)
+        WeatherData.__table__.create(engine)
+        with Session(engine) as session:
+            populate(session)
+            plan = explain_query_plan(session, build_export_query(WeatherData, 48, location_id=11))
+        engine.dispose()
+
+    print('\n'.join(plan))
+    problems = check(plan)
+    for problem in problems:
+        print(f'FAIL: {problem}')
+    if problems:
+        sys.exit(1)
+    print('OK: location-scoped export is a range scan on the (location_id, timestamp) index')
+
+
+if __name__ == '__main__':
+    main()
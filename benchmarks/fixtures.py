@@ -0,0 +1,71 @@
+"""Synthetic Open-Meteo fixtures at a configurable scale (locations x hours).
+
+Payloads have the shape of the real ``hourly`` response: a daily
+temperature and humidity cycle plus seeded noise, with an optional
+fraction of missing (null) values. The same seed, coordinates and window
+always give the same payload, so runs on different commits see identical
+input::
+
+    locations = synthetic_locations(20)
+    payload = synthetic_payload(*locations[0], start=datetime(2024, 1, 1), hours=72)
+
+``stub_builder`` adapts the generator to ``StubServer(payload_builder=...)``.
+"""
+import math
+import random
+from datetime import datetime, timedelta
+
+HOUR_FORMAT = "%Y-%m-%dT%H:%M"
+
+
+def synthetic_locations(count, seed=0):
+    """``count`` distinct (lat, lon) points on a 0.1 degree grid over Europe"""
+    rng = random.Random(seed)
+    points = set()
+    while len(points) < count:
+        points.add((round(rng.uniform(36, 60), 1), round(rng.uniform(-9, 30), 1)))
+    return sorted(points)
+
+
+def synthetic_payload(lat, lon, start, hours, seed=0, missing=0.0, utc_offset_seconds=0):
+    """Open-Meteo style response for ``hours`` hours from ``start`` (a naive local datetime)"""
+    rng = random.Random(f"{seed}:{lat}:{lon}:{start.isoformat()}")
+    times, temperatures, humidities = [], [], []
+    for i in range(hours):
+        ts = start + timedelta(hours=i)
+        phase = (ts.hour - 9) / 24 * 2 * math.pi
+        times.append(ts.strftime(HOUR_FORMAT))
+        temperature = round(25 - lat / 3 + 6 * math.sin(phase) + rng.gauss(0, 1.5), 1)
+        humidity = round(min(max(65 - 20 * math.sin(phase) + rng.gauss(0, 5), 5), 100), 1)
+        temperatures.append(None if rng.random() < missing else temperature)
+        humidities.append(None if rng.random() < missing else humidity)
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "utc_offset_seconds": utc_offset_seconds,
+        "timezone": "GMT",
+        "hourly_units": {"time": "iso8601", "temperature_2m": "°C", "relative_humidity_2m": "%"},
+        "hourly": {
+            "time": times,
+            "temperature_2m": temperatures,
+            "relative_humidity_2m": humidities,
+        },
+    }
+
+
+def stub_builder(hours=None, seed=0, missing=0.0):
+    """Payload builder for StubServer: the requested window, or its last ``hours`` hours if given"""
+
+    def build(lat, lon, start_date, end_date):
+        if "T" in start_date:
+            start = datetime.strptime(start_date, HOUR_FORMAT)
+            end = datetime.strptime(end_date, HOUR_FORMAT) + timedelta(hours=1)
+        else:
+            start = datetime.strptime(start_date, "%Y-%m-%d")
+            end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+        count = int((end - start).total_seconds() // 3600)
+        if hours is not None:
+            start, count = end - timedelta(hours=hours), hours
+        return synthetic_payload(lat, lon, start, count, seed=seed, missing=missing)
+
+    return build
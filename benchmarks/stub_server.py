@@ -0,0 +1,133 @@
+"""Local stand-in for the Open-Meteo forecast API.
+
+Serves synthetic ``hourly`` payloads over HTTP/1.1 keep-alive so the
+upstream client can be exercised without network access::
+
+    server = StubServer(fail_first=2, latency=0.05).start()
+    WeatherService(base_url=server.url).fetch_weather_data(47.37, 8.55)
+    server.stop()
+"""
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def build_hourly_payload(lat, lon, start_date, end_date):
+    """Build an Open-Meteo style response for one location
+
+    ``start_date``/``end_date`` are dates, or hours ("2024-01-01T06:00")
+    like the ``start_hour``/``end_hour`` parameters; both ends are inclusive.
+    """
+    if "T" in start_date:
+        start = datetime.strptime(start_date, "%Y-%m-%dT%H:%M")
+        end = datetime.strptime(end_date, "%Y-%m-%dT%H:%M") + timedelta(hours=1)
+    else:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    hours = int((end - start).total_seconds() // 3600)
+    times, temperatures, humidities = [], [], []
+    for i in range(hours):
+        ts = start + timedelta(hours=i)
+        times.append(ts.strftime("%Y-%m-%dT%H:%M"))
+        temperatures.append(round(10 + 8 * math.sin((ts.hour - 9) / 24 * 2 * math.pi) + lat / 10, 1))
+        humidities.append(round(70 - 20 * math.sin((ts.hour - 9) / 24 * 2 * math.pi), 1))
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "utc_offset_seconds": 0,
+        "timezone": "GMT",
+        "hourly_units": {"time": "iso8601", "temperature_2m": "°C", "relative_humidity_2m": "%"},
+        "hourly": {
+            "time": times,
+            "temperature_2m": temperatures,
+            "relative_humidity_2m": humidities,
+        },
+    }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            should_fail = server.request_count <= server.fail_first
+        if server.latency:
+            # Simulated upstream round trip
+            time.sleep(server.latency)
+        if should_fail:
+            self._send(server.fail_status, {"error": True, "reason": "stubbed failure"})
+            return
+
+        query = parse_qs(urlparse(self.path).query)
+        today = datetime.utcnow().date()
+        start_date = query.get("start_date", [(today - timedelta(days=2)).isoformat()])[0]
+        end_date = query.get("end_date", [today.isoformat()])[0]
+        if "start_hour" in query:
+            start_date, end_date = query["start_hour"][0], query["end_hour"][0]
+        lats = [float(v) for v in query.get("latitude", ["0"])[0].split(",")]
+        lons = [float(v) for v in query.get("longitude", ["0"])[0].split(",")]
+
+        payloads = [server.payload_builder(lat, lon, start_date, end_date) for lat, lon in zip(lats, lons)]
+        self._send(200, payloads if len(payloads) > 1 else payloads[0])
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubServer:
+    """Threaded stub server bound to an ephemeral localhost port
+
+    ``payload_builder(lat, lon, start, end)`` replaces the default payload,
+    e.g. with ``benchmarks.fixtures.stub_builder``.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, fail_first=0, fail_status=503, latency=0.0, payload_builder=None):
+        self.httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.request_count = 0
+        self.httpd.fail_first = fail_first
+        self.httpd.fail_status = fail_status
+        self.httpd.latency = latency
+        # Resolved per request, so patching build_hourly_payload still takes effect
+        self.httpd.payload_builder = payload_builder or (lambda *args: build_hourly_payload(*args))
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/forecast"
+
+    @property
+    def request_count(self):
+        return self.httpd.request_count
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
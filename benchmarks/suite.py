@@ -0,0 +1,357 @@
+"""End-to-end pipeline benchmarks on synthetic Open-Meteo fixtures.
+
+Cases, each run in a fresh subprocess against a scratch database:
+
+* ``process_weather_data`` - ``WeatherService.process_weather_data`` on one
+  location's payload.
+* ``ingest_route`` - ``GET /weather-report`` through the Flask test client,
+  fetching from the local stub server (incremental ingest and the response
+  cache off, so every request fetches, parses and upserts the full window).
+* ``save_weather_data`` - ``utils.save_weather_data`` into the FastAPI
+  variant's single-table schema.
+* ``excel_export`` - one location's rows queried and written with
+  ``ExcelService.generate_excel``.
+* ``pdf_report`` - one location's rows queried and rendered with
+  ``PDFService.generate_pdf_report`` (in-process, no render pool).
+
+Payloads come from ``benchmarks.fixtures`` at ``--locations`` x ``--hours``
+with seeded noise and ``--missing`` null values, so every run sees the
+same input. Each case runs one untimed warm-up operation, then one
+operation per location, ``--repeat`` times. It reports operations and
+rows per second, latency percentiles and peak RSS during the timed phase.
+
+Results are printed as JSON and written to ``--output``. The run fails
+(exit status 1) when a check fails:
+
+* ``--baseline FILE``: a previous ``--output`` at the same scale. A case
+  fails if rows/s drops, or p90 latency or peak RSS grows, by more than
+  ``--max-regression`` (default 0.25); latency may always grow by 1 ms.
+* ``--thresholds FILE``: absolute limits per case, as in
+  ``benchmarks/thresholds.json``. Keys are ``min_<metric>`` or
+  ``max_<metric>`` for any reported metric.
+
+Usage: python -m benchmarks.suite [--locations 10] [--hours 72] [--repeat 3] [--cases ...]
+                                  [--output results.json] [--baseline old.json] [--thresholds benchmarks/thresholds.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.bench_exports import RSSSampler, rss_mb
+from benchmarks.fixtures import stub_builder, synthetic_locations, synthetic_payload
+from benchmarks.stub_server import StubServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fixed start for payloads built in-process, so their content does not depend on the date
+FIXTURE_START = datetime(2024, 1, 1)
+
+# Compared against --baseline: metric -> +1 if higher is better, -1 if lower is better. p90
+# rather than p99: with a few dozen operations p99 is the single slowest one
+BASELINE_METRICS = {'rows_per_s': 1, 'p90_ms': -1, 'peak_rss_mb': -1}
+
+# Latency changes below this are timer and scheduler noise for millisecond-scale operations
+LATENCY_SLACK_MS = 1.0
+
+
+def make_app(workdir, **overrides):
+    from app import create_app
+    from app.config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{workdir}/bench.db"
+        EXPORT_JOBS_DIR = f"{workdir}/exports"
+        RENDER_POOL_WORKERS = 0
+        COMPACTION_INTERVAL = 0
+        EXPORT_JOB_SWEEP_INTERVAL = 0
+        PREFETCH_ENABLED = False
+        RESPONSE_CACHE_ENABLED = False
+        INGEST_INCREMENTAL = False
+        # Old fixture dates must not be expired as soon as they are written
+        RETENTION_RAW_DAYS = 0
+
+    for key, value in overrides.items():
+        setattr(BenchConfig, key, value)
+    return create_app(BenchConfig)
+
+
+def fixture_payloads(scale):
+    return [
+        ((lat, lon), synthetic_payload(lat, lon, FIXTURE_START, scale['hours'], scale['seed'], scale['missing']))
+        for lat, lon in synthetic_locations(scale['locations'], scale['seed'])
+    ]
+
+
+def populate(app, scale):
+    """Store every fixture location through the ingest write path"""
+    from app import db
+    from app.services.ingest import store_location_rows
+
+    weather_service = app.extensions['weather_service']
+    with app.app_context():
+        for (lat, lon), payload in fixture_payloads(scale):
+            store_location_rows(lat, lon, weather_service.process_weather_columns(payload, lat, lon))
+        db.session.commit()
+
+
+# Cases: set up, then return one callable per timed operation (returning rows handled)
+
+def case_process_weather_data(scale, workdir, upstream_url):
+    from app.services.weather_service import WeatherService
+
+    service = WeatherService()
+    payloads = fixture_payloads(scale)
+    return [
+        lambda location=location, payload=payload: len(service.process_weather_data(payload, *location))
+        for location, payload in payloads
+    ]
+
+
+def case_ingest_route(scale, workdir, upstream_url):
+    client = make_app(workdir, WEATHER_API_BASE_URL=upstream_url).test_client()
+
+    def ingest(lat, lon):
+        response = client.get(f'/weather-report?lat={lat}&lon={lon}')
+        if response.status_code != 200:
+            raise RuntimeError(f"/weather-report returned {response.status_code}: {response.get_data(as_text=True)}")
+        return response.get_json()['records_processed']
+
+    return [
+        lambda location=location: ingest(*location)
+        for location in synthetic_locations(scale['locations'], scale['seed'])
+    ]
+
+
+def case_save_weather_data(scale, workdir, upstream_url):
+    # db.py reads its path at import time
+    os.environ['FASTAPI_DB_PATH'] = os.path.join(workdir, 'fastapi.db')
+    from db import SessionLocal, init_db
+    from utils import save_weather_data
+
+    init_db()
+
+    def save(payload):
+        with SessionLocal() as session:
+            save_weather_data(session, payload)
+        return len(payload['hourly']['time'])
+
+    return [lambda payload=payload: save(payload) for _, payload in fixture_payloads(scale)]
+
+
+def _location_rows(app, lat, lon):
+    from app import db
+    from app.models import WeatherData
+    from app.services.storage import find_locations
+
+    location = find_locations(db.session, [(lat, lon)], app.config['COORDINATE_GRID'])[0]
+    return db.session.query(WeatherData).filter(
+        WeatherData.location_id == location.id
+    ).order_by(WeatherData.timestamp).all()
+
+
+def case_excel_export(scale, workdir, upstream_url):
+    from app.services.excel_service import ExcelService
+
+    app = make_app(workdir)
+    populate(app, scale)
+    service = ExcelService()
+
+    def export(lat, lon):
+        with app.app_context():
+            rows = _location_rows(app, lat, lon)
+            with service.generate_excel(rows, location=(lat, lon)):
+                return len(rows)
+
+    return [
+        lambda location=location: export(*location)
+        for location in synthetic_locations(scale['locations'], scale['seed'])
+    ]
+
+
+def case_pdf_report(scale, workdir, upstream_url):
+    from app.services.pdf_service import PDFService
+
+    app = make_app(workdir)
+    populate(app, scale)
+    service = PDFService(chart_max_points=app.config['CHART_MAX_POINTS'])
+
+    def report(lat, lon):
+        with app.app_context():
+            rows = _location_rows(app, lat, lon)
+            service.generate_pdf_report(rows, location=(lat, lon)).close()
+            return len(rows)
+
+    return [
+        lambda location=location: report(*location)
+        for location in synthetic_locations(scale['locations'], scale['seed'])
+    ]
+
+
+CASES = {
+    'process_weather_data': case_process_weather_data,
+    'ingest_route': case_ingest_route,
+    'save_weather_data': case_save_weather_data,
+    'excel_export': case_excel_export,
+    'pdf_report': case_pdf_report,
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def run_child(name, scale, workdir, upstream_url):
+    """Run one case and print its result as one JSON line"""
+    ops = CASES[name](scale, workdir, upstream_url)
+    # Untimed, so lazily imported libraries and first-use caches are not measured
+    ops[0]()
+    baseline = rss_mb()
+    sampler = RSSSampler()
+    sampler.start()
+    latencies, rows = [], 0
+    started = time.perf_counter()
+    for _ in range(scale['repeat']):
+        for op in ops:
+            op_started = time.perf_counter()
+            rows += op()
+            latencies.append(time.perf_counter() - op_started)
+    elapsed = time.perf_counter() - started
+    sampler.stopped.set()
+    sampler.join()
+
+    latencies.sort()
+    print(json.dumps({
+        'ops': len(latencies),
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'ops_per_s': round(len(latencies) / elapsed, 1),
+        'rows_per_s': round(rows / elapsed),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 0.9) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+        'peak_rss_mb': round(sampler.peak, 1),
+        'rss_delta_mb': round(sampler.peak - baseline, 1),
+    }))
+
+
+def check_thresholds(results, thresholds):
+    """Absolute limits: {"cases": {case: {"min_<metric>" | "max_<metric>": limit}}}"""
+    checks = []
+    for name, limits in thresholds.get('cases', {}).items():
+        if name not in results:
+            continue
+        for key, limit in limits.items():
+            bound, metric = key.split('_', 1)
+            value = results[name][metric]
+            ok = value >= limit if bound == 'min' else value <= limit
+            checks.append({'case': name, 'check': key, 'value': value, 'limit': limit, 'ok': ok})
+    return checks
+
+
+def check_baseline(results, baseline, max_regression):
+    """Relative limits against a previous run: at most ``max_regression`` worse per metric"""
+    checks = []
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        for metric, direction in BASELINE_METRICS.items():
+            if direction > 0:
+                limit = previous[metric] * (1 - max_regression)
+                ok = result[metric] >= limit
+            else:
+                limit = previous[metric] * (1 + max_regression)
+                if metric.endswith('_ms'):
+                    limit = max(limit, previous[metric] + LATENCY_SLACK_MS)
+                ok = result[metric] <= limit
+            checks.append({
+                'case': name, 'check': f'baseline_{metric}', 'value': result[metric],
+                'baseline': previous[metric], 'limit': round(limit, 2), 'ok': ok
+            })
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=10)
+    parser.add_argument('--hours', type=int, default=72)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--missing', type=float, default=0.02, help='fraction of null values in the fixtures')
+    parser.add_argument('--cases', default=','.join(CASES))
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='previous --output to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25)
+    parser.add_argument('--thresholds', help='JSON file of absolute per-case limits')
+    parser.add_argument('--child', nargs=4, metavar=('CASE', 'SCALE', 'WORKDIR', 'UPSTREAM'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        name, scale, workdir, upstream_url = args.child
+        run_child(name, json.loads(scale), workdir, upstream_url)
+        return
+
+    scale = {
+        'locations': args.locations, 'hours': args.hours, 'repeat': args.repeat,
+        'seed': args.seed, 'missing': args.missing,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        if baseline['scale'] != scale:
+            parser.error(f"baseline was run at a different scale: {baseline['scale']}")
+
+    results = {}
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    with StubServer(payload_builder=stub_builder(args.hours, args.seed, args.missing)) as upstream:
+        for name in args.cases.split(','):
+            if name not in CASES:
+                parser.error(f"unknown case {name!r}; choose from {', '.join(CASES)}")
+            with tempfile.TemporaryDirectory() as workdir:
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.suite', '--child', name, json.dumps(scale), workdir, upstream.url],
+                    cwd=workdir, env=env, check=True, capture_output=True, text=True
+                ).stdout
+            results[name] = json.loads(output.strip().splitlines()[-1])
+
+    checks = []
+    if args.thresholds:
+        with open(args.thresholds) as fh:
+            checks.extend(check_thresholds(results, json.load(fh)))
+    if baseline is not None:
+        checks.extend(check_baseline(results, baseline, args.max_regression))
+
+    commit = subprocess.run(
+        ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True
+    ).stdout.strip() or None
+    report = {
+        'at': datetime.utcnow().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'scale': scale,
+        'results': results,
+        'checks': checks,
+        'passed': all(check['ok'] for check in checks),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+    for check in checks:
+        if not check['ok']:
+            print(f"FAIL {check['case']} {check['check']}: {check['value']} (limit {check['limit']})", file=sys.stderr)
+    if not report['passed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
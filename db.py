@@ -1,19 +1,51 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, Float, DateTime
+from sqlalchemy import create_engine, Column, Integer, Float, DateTime, Index
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import Config
+from app.services.storage import ensure_unique_index
+from app.sqlite_tuning import apply_pragmas
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, "..", "instance", "weather.db")
+DB_PATH = os.path.abspath(os.environ.get("FASTAPI_DB_PATH", os.path.join(BASE_DIR, "..", "instance", "weather.db")))
 
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.abspath(DB_PATH)}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=Config.DB_POOL_SIZE,
+    max_overflow=Config.DB_MAX_OVERFLOW,
+    pool_timeout=Config.DB_POOL_TIMEOUT,
+)
+apply_pragmas(engine, Config.SQLITE_PRAGMAS)
 SessionLocal = sessionmaker(bind=engine)
+
+# Same database through aiosqlite, for the async FastAPI app (main.py). The
+# dialect defaults to NullPool; pooling keeps each connection's worker thread
+async_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{DB_PATH}",
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=Config.DB_POOL_SIZE,
+    max_overflow=Config.DB_MAX_OVERFLOW,
+    pool_timeout=Config.DB_POOL_TIMEOUT,
+)
+apply_pragmas(async_engine.sync_engine, Config.SQLITE_PRAGMAS)
+# expire_on_commit=False: attributes stay readable after commit without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 Base = declarative_base()
 
 class WeatherData(Base):
     __tablename__ = "weather_data"
+    __table_args__ = (Index("uq_weather_data_timestamp", "timestamp", unique=True),)
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, index=True)
     temperature_2m = Column(Float)
     relative_humidity_2m = Column(Float)
+
+def init_db():
+    """Create missing tables and the unique timestamp index; blocking, run once at startup"""
+    Base.metadata.create_all(bind=engine)
+    ensure_unique_index(engine, WeatherData.__table__, "uq_weather_data_timestamp")
@@ -0,0 +1,19 @@
+"""gunicorn settings: gunicorn -c gunicorn.conf.py run:app
+
+The app is still created in each worker (it starts background threads and
+its own render pool, which do not survive a fork), but the heavy export
+libraries are imported once in the master so all workers share them.
+"""
+import os
+
+from app.config import Config
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+preload_app = False
+
+
+def on_starting(server):
+    if Config.PRELOAD_EXPORT_LIBS:
+        from app.warmup import preload
+        preload(freeze=True)
@@ -1,52 +1,152 @@
-from fastapi import FastAPI, Query, Response
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-import requests
-import os
+from multiprocessing import get_context
 
-from db import SessionLocal, Base, engine, WeatherData
-from utils import save_weather_data, create_excel, create_pdf
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-app = FastAPI()
+from app.config import Config
+from app.services.http_client import RETRY_STATUS_CODES
+from db import AsyncSessionLocal, WeatherData, async_engine, engine, init_db
+from utils import create_excel, create_pdf, parse_weather_rows, pdf_available, upsert_weather_rows
+from app.services.singleflight import AsyncSingleFlight
 
-Base.metadata.create_all(bind=engine)
+ingest_flight = AsyncSingleFlight()
 
-@app.get("/weather-report")
-def weather_report(lat: float = Query(...), lon: float = Query(...)):
+@asynccontextmanager
+async def lifespan(app):
+    # Export rendering is CPU-bound; fork its workers before any thread or connection exists
+    workers = Config.RENDER_POOL_WORKERS
+    app.state.render_pool = None
+    if workers > 0:
+        app.state.render_pool = ProcessPoolExecutor(workers, mp_context=get_context("fork"))
+        # With fork, the first submit starts every worker
+        app.state.render_pool.submit(int).result()
+    await run_in_threadpool(init_db)
+    # The schema is in place; requests only use the async engine
+    engine.dispose()
+    # One keep-alive client for all upstream calls
+    app.state.http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(Config.HTTP_READ_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=Config.HTTP_POOL_MAXSIZE, max_keepalive_connections=Config.HTTP_POOL_MAXSIZE),
+    )
+    try:
+        yield
+    finally:
+        await app.state.http_client.aclose()
+        if app.state.render_pool is not None:
+            app.state.render_pool.shutdown(cancel_futures=True)
+        await async_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+
+# Dependencies
+
+async def get_session():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+def get_session_factory():
+    # Coalesced ingests outlive the request that started them, so they open their own session
+    return AsyncSessionLocal
+
+def get_http_client(request: Request):
+    return request.app.state.http_client
+
+def _retry_delay(resp, attempt):
+    # A numeric Retry-After wins; otherwise exponential backoff as in the sync client
+    retry_after = resp.headers.get("Retry-After") if resp is not None else None
+    if retry_after is not None and retry_after.strip().isdigit():
+        return float(retry_after)
+    return Config.HTTP_BACKOFF_FACTOR * 2 ** attempt
+
+async def _fetch_weather(http_client, params):
+    """GET the upstream API, retrying transport errors and 429/5xx up to HTTP_MAX_RETRIES times"""
+    for attempt in range(Config.HTTP_MAX_RETRIES + 1):
+        resp = None
+        try:
+            resp = await http_client.get(Config.WEATHER_API_BASE_URL, params=params)
+        except httpx.TransportError:
+            if attempt == Config.HTTP_MAX_RETRIES:
+                raise
+        else:
+            if resp.status_code not in RETRY_STATUS_CODES or attempt == Config.HTTP_MAX_RETRIES:
+                resp.raise_for_status()
+                return resp
+        await asyncio.sleep(_retry_delay(resp, attempt))
+
+async def _ingest(http_client, session_factory, lat, lon):
     end = datetime.utcnow()
     start = end - timedelta(days=2)
-    url = (
-        f"https://api.open-meteo.com/v1/meteoswiss?"
-        f"latitude={lat}&longitude={lon}"
-        f"&hourly=temperature_2m,relative_humidity_2m"
-        f"&start={start.strftime('%Y-%m-%dT%H:%M')}"
-        f"&end={end.strftime('%Y-%m-%dT%H:%M')}"
-        f"&timezone=UTC"
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": "temperature_2m,relative_humidity_2m",
+        "start_hour": start.strftime("%Y-%m-%dT%H:%M"),
+        "end_hour": end.strftime("%Y-%m-%dT%H:%M"),
+        "timezone": "UTC",
+    }
+    try:
+        resp = await _fetch_weather(http_client, params)
+        payload = resp.json()
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch weather data: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=502, detail=f"Invalid response from weather API: {e}")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=502, detail="Invalid response from weather API: expected a JSON object")
+    rows = parse_weather_rows(payload)
+    async with session_factory() as session:
+        await session.run_sync(upsert_weather_rows, rows)
+        await session.commit()
+    return {"status": "success", "count": len(rows)}
+
+@app.get("/weather-report")
+async def weather_report(
+    lat: float = Query(...),
+    lon: float = Query(...),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+    session_factory=Depends(get_session_factory),
+):
+    # Concurrent requests for the same location await one shared fetch and write
+    return await ingest_flight.do((lat, lon), _ingest, http_client, session_factory, lat, lon)
+
+@app.get("/stats/coalescing")
+async def coalescing_stats():
+    return ingest_flight.stats()
+
+async def _recent_rows(session):
+    start = datetime.utcnow() - timedelta(hours=48)
+    result = await session.execute(
+        select(WeatherData.timestamp, WeatherData.temperature_2m, WeatherData.relative_humidity_2m)
+        .where(WeatherData.timestamp >= start)
+        .order_by(WeatherData.timestamp)
     )
-    resp = requests.get(url)
-    data = resp.json()
-    session = SessionLocal()
-    save_weather_data(session, data)
-    session.close()
-    return {"status": "success", "count": len(data.get("hourly", {}).get("time", []))}
+    # Plain tuples pickle cheaply to the render workers
+    return [tuple(row) for row in result]
+
+async def _render(request, fn, rows):
+    # None runs on the default thread pool when no render workers are configured
+    return await asyncio.get_running_loop().run_in_executor(request.app.state.render_pool, fn, rows)
+
+def _attachment(content, media_type, filename):
+    return Response(content, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @app.get("/export/excel")
-def export_excel():
-    session = SessionLocal()
-    end = datetime.utcnow()
-    start = end - timedelta(hours=48)
-    rows = session.query(WeatherData).filter(WeatherData.timestamp >= start).order_by(WeatherData.timestamp).all()
-    session.close()
-    file_path = create_excel(rows)
-    return FileResponse(file_path, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", filename="weather_data.xlsx")
+async def export_excel(request: Request, session: AsyncSession = Depends(get_session)):
+    rows = await _recent_rows(session)
+    content = await _render(request, create_excel, rows)
+    return _attachment(content, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "weather_data.xlsx")
 
 @app.get("/export/pdf")
-def export_pdf():
-    session = SessionLocal()
-    end = datetime.utcnow()
-    start = end - timedelta(hours=48)
-    rows = session.query(WeatherData).filter(WeatherData.timestamp >= start).order_by(WeatherData.timestamp).all()
-    session.close()
-    file_path = create_pdf(rows)
-    return FileResponse(file_path, media_type="application/pdf", filename="weather_report.pdf")
+async def export_pdf(request: Request, session: AsyncSession = Depends(get_session)):
+    if not pdf_available():
+        raise HTTPException(status_code=501, detail="PDF export requires weasyprint")
+    rows = await _recent_rows(session)
+    content = await _render(request, create_pdf, rows)
+    return _attachment(content, "application/pdf", "weather_report.pdf")
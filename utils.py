@@ -1,56 +1,63 @@
-import os
+import base64
+import importlib.util
 from datetime import datetime
+from io import BytesIO
 from db import WeatherData
-import openpyxl
-import matplotlib.pyplot as plt
-from weasyprint import HTML
+from app.services.storage import upsert_rows
 
-def save_weather_data(session, data):
+def parse_weather_rows(data):
+    """weather_data rows from an Open-Meteo payload"""
     times = data.get("hourly", {}).get("time", [])
     temps = data.get("hourly", {}).get("temperature_2m", [])
     hums = data.get("hourly", {}).get("relative_humidity_2m", [])
-    for t, temp, hum in zip(times, temps, hums):
-        dt = datetime.fromisoformat(t)
-        exists = session.query(WeatherData).filter(WeatherData.timestamp == dt).first()
-        if not exists:
-            wd = WeatherData(timestamp=dt, temperature_2m=temp, relative_humidity_2m=hum)
-            session.add(wd)
+    return [
+        {"timestamp": datetime.fromisoformat(t), "temperature_2m": temp, "relative_humidity_2m": hum}
+        for t, temp, hum in zip(times, temps, hums)
+    ]
+
+def upsert_weather_rows(session, rows):
+    # One set-based upsert instead of a SELECT per hour
+    return upsert_rows(session, WeatherData.__table__, rows, ("timestamp",), ("temperature_2m", "relative_humidity_2m"))
+
+def save_weather_data(session, data):
+    upsert_weather_rows(session, parse_weather_rows(data))
     session.commit()
 
+# Exports take (timestamp, temperature_2m, relative_humidity_2m) tuples and
+# return the document as bytes, so they can run in a worker process
+
 def create_excel(rows):
-    wb = openpyxl.Workbook()
-    ws = wb.active
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
     ws.append(["timestamp", "temperature_2m", "relative_humidity_2m"])
-    for r in rows:
-        ws.append([r.timestamp.strftime("%Y-%m-%d %H:%M"), r.temperature_2m, r.relative_humidity_2m])
-    file_path = "weather_data.xlsx"
-    wb.save(file_path)
-    return file_path
+    for timestamp, temperature, humidity in rows:
+        ws.append([timestamp.strftime("%Y-%m-%d %H:%M"), temperature, humidity])
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def pdf_available():
+    return importlib.util.find_spec("weasyprint") is not None
 
 def create_pdf(rows):
-    times = [r.timestamp for r in rows]
-    temps = [r.temperature_2m for r in rows]
-    hums = [r.relative_humidity_2m for r in rows]
-    plt.figure(figsize=(10,5))
-    plt.plot(times, temps, label="Temperature (°C)")
-    plt.plot(times, hums, label="Humidity (%)")
-    plt.xlabel("Time")
-    plt.ylabel("Value")
-    plt.title("Temperature & Humidity (Last 48h)")
-    plt.legend()
-    chart_path = "chart.png"
-    plt.tight_layout()
-    plt.savefig(chart_path)
-    plt.close()
+    from weasyprint import HTML
+    from app.services.chart_renderer import get_chart_renderer
+
+    times = [r[0] for r in rows]
+    temps = [r[1] for r in rows]
+    hums = [r[2] for r in rows]
+    # Chart goes into the HTML as a data URI; no chart.png in the working directory
+    chart = get_chart_renderer().render(times, temps, hums, title="Temperature & Humidity (Last 48h)")
+    chart_uri = "data:image/png;base64," + base64.b64encode(chart.getvalue()).decode("ascii")
     start = times[0].strftime("%Y-%m-%d %H:%M") if times else ""
     end = times[-1].strftime("%Y-%m-%d %H:%M") if times else ""
     html = f"""
     <h1>Weather Report</h1>
     <p>Location: Provided</p>
     <p>Date Range: {start} - {end}</p>
-    <img src="{chart_path}" width="800">
+    <img src="{chart_uri}" width="800">
     """
-    pdf_path = "weather_report.pdf"
-    HTML(string=html, base_url='.').write_pdf(pdf_path)
-    os.remove(chart_path)
-    return pdf_path
+    # No target: write_pdf returns the document instead of writing a shared file
+    return HTML(string=html, base_url='.').write_pdf()